@@ -0,0 +1,369 @@
+"""Offline benchmarks for the bot.
+
+Usage:
+    python benchmark.py load --users 2000 --problems 2000 --ops 5000
+    python benchmark.py load --baseline benchmark_baseline.json    # Fail on regressions
+    python benchmark.py load --save-baseline benchmark_baseline.json
+    python benchmark.py memory --users 100000 --problems 5000 --completed 40
+
+The load benchmark drives Handlers and Scheduler against the fakes in
+fakes.py, so it needs no credentials or network access.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from deck import UserDecks
+from delivery import DeliveryPipeline, percentile
+from fakes import FakeBot, FakeFailures, FakeSheetsValues, fake_context, fake_update, make_rows
+from models import Problem, new_problem_id
+from problem_index import ProblemIndex
+from progress import ProblemBitset, RecentWindow, interner
+
+FIRST_USER_ID = 100000000
+# Fractions of the burst phase spent on each action
+BURST_MIX = (('today', 0.4), ('another', 0.3), ('click', 0.3))
+
+
+def measure(build: Callable[[], object]) -> Dict[str, float]:
+    """Build a structure under tracemalloc and report its footprint."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'bytes': current, 'peak_bytes': peak, 'seconds': elapsed}
+
+
+def memory_benchmark(users: int, problems: int, completed: int, recent: int, seed: int) -> None:
+    """Compare per-user progress stored as sets/lists vs bitsets/ring buffers, plus deck state."""
+    rng = random.Random(seed)
+    problem_ids = [f"{1700000000000 + i}_{rng.getrandbits(24):06x}" for i in range(problems)]
+    for problem_id in problem_ids:
+        interner.intern(problem_id)
+    histories: List[List[str]] = [
+        rng.sample(problem_ids, completed + recent) for _ in range(users)
+    ]
+
+    def build_sets():
+        done = {user_id: set(history[:completed]) for user_id, history in enumerate(histories)}
+        sent = {user_id: history[completed:][-20:] for user_id, history in enumerate(histories)}
+        return done, sent
+
+    def build_bitsets():
+        done = {user_id: ProblemBitset(history[:completed]) for user_id, history in enumerate(histories)}
+        sent = {user_id: RecentWindow(history[completed:]) for user_id, history in enumerate(histories)}
+        return done, sent
+
+    # Each user's decks after one daily pick in their preferred difficulty
+    index = ProblemIndex([Problem(problem_id, *row[1:]) for problem_id, row in zip(problem_ids, make_rows(problems, seed))])
+    preferences = [rng.choice((None, 'easy', 'medium', 'hard')) for _ in range(users)]
+    done_sets = [set(history[:completed]) for history in histories]
+
+    def build_decks():
+        decks = {}
+        for user_id, history in enumerate(histories):
+            decks[user_id] = UserDecks(user_id)
+            decks[user_id].draw(index, preferences[user_id], done_sets[user_id], history[completed:])
+        return decks
+
+    print(f"{users} users, {problems} problems, {completed} completed and {recent} sent per user")
+    baseline = None
+    for name, build in (('set + list', build_sets), ('bitset + ring', build_bitsets)):
+        stats = measure(build)
+        baseline = baseline or stats['bytes']
+        print(
+            f"  {name:<14} {stats['bytes'] / 2**20:8.1f} MiB "
+            f"({stats['bytes'] / users:6.0f} B/user, peak {stats['peak_bytes'] / 2**20:.1f} MiB, "
+            f"{stats['seconds']:.2f}s) x{baseline / stats['bytes']:.1f}"
+        )
+    stats = measure(build_decks)
+    print(
+        f"  {'user_decks':<14} {stats['bytes'] / 2**20:8.1f} MiB "
+        f"({stats['bytes'] / users:6.0f} B/user, peak {stats['peak_bytes'] / 2**20:.1f} MiB, "
+        f"{stats['seconds']:.2f}s)"
+    )
+
+
+def summarize(latencies: List[float], seconds: float, errors: int) -> Dict[str, float]:
+    """Throughput and latency percentiles for one phase."""
+    latencies = sorted(latencies)
+    return {
+        'ops': len(latencies),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput': round(len(latencies) / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run_phase(jobs: List[Tuple[str, Callable[[], Awaitable]]], concurrency: int) -> Dict[str, Dict]:
+    """Run (kind, job) pairs with bounded concurrency, timing each job.
+
+    Returns the overall summary under 'all' plus one summary per kind.
+    """
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    queue = list(reversed(jobs))
+
+    async def worker() -> None:
+        while queue:
+            kind, job = queue.pop()
+            started = time.perf_counter()
+            try:
+                await job()
+            except Exception:
+                errors[kind] += 1
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(jobs)))))
+    seconds = time.perf_counter() - started
+
+    summaries = {'all': summarize([x for values in latencies.values() for x in values], seconds, sum(errors.values()))}
+    if len(latencies) > 1:
+        for kind, values in latencies.items():
+            summaries[kind] = summarize(values, seconds, errors[kind])
+    return summaries
+
+
+async def load_benchmark(args: argparse.Namespace) -> Dict:
+    """Drive the handlers and scheduler with synthetic load and collect results."""
+    # Keep the benchmark self-contained: no snapshot file, in-memory state
+    Config.CATALOG_SNAPSHOT_PATH = ''
+    Config.SHEETS_MAX_CONCURRENCY = args.sheets_concurrency
+
+    from handlers import Handlers, user_recent_problems
+    from scheduler import Scheduler, time_to_slot
+    from sheets import AsyncSheetsService, SheetsService
+    from storage import MemoryStateStore
+
+    rng = random.Random(args.seed)
+    values = FakeSheetsValues(
+        make_rows(args.problems, args.seed),
+        Config.GOOGLE_SHEETS_RANGE,
+        FakeFailures(args.sheets_latency, args.sheets_latency / 2, args.sheets_error_rate,
+                     args.sheets_throttle_rate, args.seed)
+    )
+    bot = FakeBot(
+        FakeFailures(args.bot_latency, args.bot_latency / 2, args.bot_error_rate,
+                     args.bot_throttle_rate, args.seed + 1),
+        rate_limit=args.bot_rate_limit
+    )
+    sheets_service = SheetsService(service_factory=values.resource)
+    delivery = DeliveryPipeline(rate=args.send_rate, per_chat_interval=0, concurrency=args.concurrency)
+    handlers = Handlers(AsyncSheetsService(sheets_service), MemoryStateStore(), delivery)
+    scheduler = Scheduler(handlers)
+    scheduler.application = SimpleNamespace(bot=bot)
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+    phases: Dict[str, Dict] = {}
+
+    def command(name: str, user_id: int) -> Callable[[], Awaitable]:
+        return lambda: getattr(handlers, name)(fake_update(bot, user_id, f"/{name}"), fake_context())
+
+    def click(user_id: int) -> Callable[[], Awaitable]:
+        async def run() -> None:
+            # Press a button on one of the user's recent problems (fetching one first if needed)
+            recent = list(user_recent_problems.get(user_id, ()))
+            if not recent:
+                await command('today', user_id)()
+                recent = list(user_recent_problems.get(user_id, ()))
+            if recent:
+                data = f"problem_{rng.choice(['done', 'later', 'discard'])}_{rng.choice(recent)}"
+                await handlers.handle_problem_action(fake_update(bot, user_id, callback_data=data), fake_context())
+        return run
+
+    # Every user runs /start, which also places them in the schedule
+    phases['start'] = (await run_phase(
+        [('start', command('start', user_id)) for user_id in user_ids], args.concurrency
+    ))['all']
+
+    # Bursts of /today, /another and button clicks from random users
+    kinds, weights = zip(*BURST_MIX)
+    jobs = []
+    for kind in rng.choices(kinds, weights, k=args.ops):
+        user_id = rng.choice(user_ids)
+        jobs.append((kind, click(user_id) if kind == 'click' else command(kind, user_id)))
+    for kind, summary in (await run_phase(jobs, args.concurrency)).items():
+        phases['burst' if kind == 'all' else f'burst.{kind}'] = summary
+
+    # Catalog syncs against the fake sheet, a few at a time
+    loop = asyncio.get_running_loop()
+    refresh = lambda: loop.run_in_executor(None, sheets_service.catalog.refresh)
+    phases['catalog_refresh'] = (await run_phase(
+        [('refresh', refresh) for _ in range(args.refreshes)], 4
+    ))['all']
+
+    # Concurrent problem submissions, batched by the write queue
+    def add() -> Callable[[], Awaitable]:
+        number = rng.getrandbits(32)
+        problem = Problem(new_problem_id(), f"Added {number}", 'easy', 'Arrays', f"https://example.com/added/{number}")
+        return lambda: handlers.sheets.add_problem(problem)
+    phases['sheet_writes'] = (await run_phase(
+        [('add', add()) for _ in range(args.writes)], args.concurrency
+    ))['all']
+
+    # Off-peak planning followed by the daily fan-out of one slot
+    started = time.perf_counter()
+    await handlers.precompute_daily_problems()
+    phases['precompute'] = summarize([time.perf_counter() - started], time.perf_counter() - started, 0)
+
+    sends: List[float] = []
+    send_user = scheduler._send_user_daily_problem
+
+    async def timed_send(user_id: int) -> bool:
+        send_started = time.perf_counter()
+        try:
+            return await send_user(user_id)
+        finally:
+            sends.append(time.perf_counter() - send_started)
+
+    scheduler._send_user_daily_problem = timed_send
+    failed_before = delivery.failed
+    started = time.perf_counter()
+    await scheduler._send_slot(time_to_slot(Config.SCHEDULE_TIME))
+    phases['fanout'] = summarize(sends, time.perf_counter() - started, delivery.failed - failed_before)
+
+    handlers.sheets.shutdown()
+    return {
+        'params': {name: getattr(args, name) for name in LOAD_PARAMS},
+        'phases': phases,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'telegram': {
+            'sent': delivery.sent, 'failed': delivery.failed,
+            'retries': delivery.retries, 'rate_limited': delivery.rate_limited,
+        },
+        'sheets_calls': {f"{method} {outcome}": count for (method, outcome), count in sorted(values.calls.items())},
+    }
+
+
+def print_results(results: Dict) -> None:
+    print(f"{'phase':<18} {'ops':>7} {'errors':>7} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, stats in results['phases'].items():
+        print(
+            f"{name:<18} {stats['ops']:>7} {stats['errors']:>7} {stats['throughput']:>9.1f} "
+            f"{stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+        )
+    print(f"Max RSS: {results['max_rss_mb']} MiB")
+    print(f"Telegram: {results['telegram']}")
+    print(f"Sheets calls: {results['sheets_calls']}")
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Compare results to a stored baseline; returns one line per regression.
+
+    Throughput may drop and p99 latency and memory may grow by the tolerance
+    fraction. Latency changes under one millisecond are ignored as noise.
+    """
+    regressions = []
+    for name, before in baseline['phases'].items():
+        after = results['phases'].get(name)
+        if after is None:
+            continue
+        if after['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']} -> {after['throughput']} ops/s")
+        if after['p99_ms'] > before['p99_ms'] * (1 + tolerance) and after['p99_ms'] - before['p99_ms'] > 1.0:
+            regressions.append(f"{name}: p99 {before['p99_ms']} -> {after['p99_ms']} ms")
+        if after['errors'] > before['errors']:
+            regressions.append(f"{name}: errors {before['errors']} -> {after['errors']}")
+    if results['max_rss_mb'] > baseline['max_rss_mb'] * (1 + tolerance):
+        regressions.append(f"memory: max RSS {baseline['max_rss_mb']} -> {results['max_rss_mb']} MiB")
+    return regressions
+
+
+def run_load(args: argparse.Namespace) -> int:
+    results = asyncio.run(load_benchmark(args))
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}")
+            return 1
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != results['params']:
+            print("Warning: baseline was recorded with different parameters")
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+# Arguments that define a load run; baselines are only comparable when these match
+LOAD_PARAMS = (
+    'users', 'problems', 'ops', 'writes', 'refreshes', 'concurrency', 'seed',
+    'sheets_latency', 'sheets_error_rate', 'sheets_throttle_rate', 'sheets_concurrency',
+    'bot_latency', 'bot_error_rate', 'bot_throttle_rate', 'bot_rate_limit', 'send_rate',
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    memory = commands.add_parser('memory', help='Per-user progress memory footprint')
+    memory.add_argument('--users', type=int, default=100000)
+    memory.add_argument('--problems', type=int, default=5000)
+    memory.add_argument('--completed', type=int, default=40)
+    memory.add_argument('--recent', type=int, default=20)
+    memory.add_argument('--seed', type=int, default=1)
+
+    load = commands.add_parser('load', help='Throughput and latency under synthetic load')
+    load.add_argument('--users', type=int, default=2000)
+    load.add_argument('--problems', type=int, default=2000)
+    load.add_argument('--ops', type=int, default=5000, help='Actions in the burst phase')
+    load.add_argument('--writes', type=int, default=500, help='Problems added in the write phase')
+    load.add_argument('--refreshes', type=int, default=20, help='Catalog syncs in the refresh phase')
+    load.add_argument('--concurrency', type=int, default=50)
+    load.add_argument('--seed', type=int, default=1)
+    load.add_argument('--sheets-latency', type=float, default=0.05, help='Seconds per Sheets call')
+    load.add_argument('--sheets-error-rate', type=float, default=0.0)
+    load.add_argument('--sheets-throttle-rate', type=float, default=0.0, help='Fraction of Sheets calls answered 429')
+    load.add_argument('--sheets-concurrency', type=int, default=Config.SHEETS_MAX_CONCURRENCY)
+    load.add_argument('--bot-latency', type=float, default=0.02, help='Seconds per Bot API call')
+    load.add_argument('--bot-error-rate', type=float, default=0.0)
+    load.add_argument('--bot-throttle-rate', type=float, default=0.0, help='Fraction of Bot API calls answered 429')
+    load.add_argument('--bot-rate-limit', type=float, default=None, help='Messages/s before the fake Bot API answers 429')
+    load.add_argument('--send-rate', type=float, default=1000.0, help='Delivery pipeline rate limit (messages/s)')
+    load.add_argument('--baseline', help='Compare against this baseline JSON and fail on regressions')
+    load.add_argument('--save-baseline', help='Write the results to this baseline JSON')
+    load.add_argument('--tolerance', type=float, default=0.25, help='Allowed fractional regression')
+    load.add_argument('--verbose', action='store_true', help='Show the bot\'s own log output')
+
+    args = parser.parse_args()
+    if args.command == 'memory':
+        memory_benchmark(args.users, args.problems, args.completed, args.recent, args.seed)
+    elif args.command == 'load':
+        logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+        sys.exit(run_load(args))
+
+
+if __name__ == '__main__':
+    main()
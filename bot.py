@@ -1,26 +1,64 @@
 """Main entry point for the DSA Telegram bot."""
 
+import asyncio
 import logging
 import sys
+from typing import Optional
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
 from telegram.ext import CallbackQueryHandler
 
 from config import Config
+from delivery import DeliveryPipeline
 from handlers import Handlers
+import logging_setup
+from metrics import REGISTRY, MetricsServer
 from scheduler import Scheduler
-from sheets import SheetsService
+from sharding import run_coordinator, run_shard_worker
+from sheets import AsyncSheetsService, SheetsService
+from storage import create_state_store
+from webhook import run_webhook
 
-# Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 
+def register_metrics(handlers: Handlers, sheets_service: SheetsService) -> None:
+    """Expose existing service counters and cache ages as scrape-time metrics."""
+    from handlers import user_prefs
+    
+    catalog = sheets_service.catalog
+    delivery = handlers.delivery
+    REGISTRY.gauge_func("dsa_bot_catalog_age_seconds", "Seconds since the cached catalog was fetched.", catalog.age)
+    REGISTRY.gauge_func("dsa_bot_catalog_snapshot_file_age_seconds", "Seconds since the on-disk catalog was fetched.",
+                        sheets_service.snapshot_file.age if sheets_service.snapshot_file else lambda: None)
+    REGISTRY.gauge_func("dsa_bot_catalog_problems", "Problems in the cached catalog.",
+                        lambda: len(catalog.get().problems) if catalog.version else None)
+    REGISTRY.counter_func("dsa_bot_catalog_refreshes_total", "Successful catalog refreshes.", lambda: catalog.refreshes)
+    REGISTRY.counter_func("dsa_bot_catalog_refresh_failures_total", "Failed catalog refreshes.",
+                          lambda: catalog.refresh_failures)
+    REGISTRY.counter_func("dsa_bot_telegram_sent_total", "Messages sent through the delivery pipeline.",
+                          lambda: delivery.sent)
+    REGISTRY.counter_func("dsa_bot_telegram_failed_total", "Messages the delivery pipeline gave up on.",
+                          lambda: delivery.failed)
+    REGISTRY.counter_func("dsa_bot_telegram_retries_total", "Send retries after transient errors.",
+                          lambda: delivery.retries)
+    REGISTRY.counter_func("dsa_bot_telegram_rate_limited_total", "RetryAfter responses from Telegram.",
+                          lambda: delivery.rate_limited)
+    REGISTRY.counter_func("dsa_bot_render_cache_hits_total", "Rendered message cache hits.",
+                          lambda: handlers.renderer.hits)
+    REGISTRY.counter_func("dsa_bot_render_cache_misses_total", "Rendered message cache misses.",
+                          lambda: handlers.renderer.misses)
+    REGISTRY.gauge_func("dsa_bot_users", "Users with stored preferences.", lambda: len(user_prefs))
+    REGISTRY.counter_func("dsa_bot_log_records_dropped_total", "Log records dropped because the log queue was full.",
+                          lambda: logging_setup.queue_handler.dropped if logging_setup.queue_handler else None)
+    REGISTRY.counter_func("dsa_bot_log_records_sampled_total", "Repetitive info log lines suppressed by sampling.",
+                          lambda: logging_setup.sampler.suppressed if logging_setup.sampler else None)
+
+
 def main() -> None:
     """Main function to start the bot."""
+    logging_setup.configure_logging()
+    
     # Validate configuration
     try:
         Config.validate()
@@ -28,10 +66,27 @@ def main() -> None:
         logger.error(str(e))
         sys.exit(1)
     
+    # In sharded mode this process only supervises the workers and routes updates
+    sharded = Config.SHARD_COUNT > 1
+    if sharded and Config.SHARD_INDEX < 0:
+        logger.info(f"Starting coordinator for {Config.SHARD_COUNT} shards...")
+        run_coordinator(Config.SHARD_COUNT)
+        return
+    
     # Initialize services
     try:
-        sheets_service = SheetsService()
-        handlers = Handlers(sheets_service)
+        # Only shard 0 polls Google Sheets and writes the shared snapshot file
+        sheets_service = SheetsService(owns_snapshot=Config.SHARD_INDEX <= 0)
+        if not sheets_service.load_snapshot():
+            logger.info("No local catalog snapshot; first request will fetch from Google Sheets")
+        store = create_state_store(Config.STATE_BACKEND, Config.STATE_DB_PATH, Config.STATE_FLUSH_INTERVAL)
+        # Shards split Telegram's bot-wide rate limit between them
+        delivery = DeliveryPipeline(rate=Config.TELEGRAM_RATE_LIMIT / Config.SHARD_COUNT)
+        handlers = Handlers(AsyncSheetsService(sheets_service), store, delivery)
+        if sharded:
+            handlers.restore_state(Config.SHARD_INDEX, Config.SHARD_COUNT)
+        else:
+            handlers.restore_state()
     except Exception as e:
         logger.error(f"Failed to initialize services: {e}")
         sys.exit(1)
@@ -45,7 +100,18 @@ def main() -> None:
     application.add_handler(CommandHandler("another", handlers.another))
     application.add_handler(CommandHandler("level", handlers.level))
     application.add_handler(CommandHandler("settime", handlers.settime))
+    application.add_handler(CommandHandler("topic", handlers.topic))
+    application.add_handler(CommandHandler("search", handlers.search))
     application.add_handler(handlers.get_conversation_handler())
+    application.add_handler(CommandHandler("import", handlers.import_problems))
+    application.add_handler(CommandHandler("profile", handlers.profile))
+    # Channels send commands as channel posts
+    subscription_updates = filters.UpdateType.MESSAGE | filters.UpdateType.CHANNEL_POST
+    application.add_handler(CommandHandler("subscribe", handlers.subscribe, filters=subscription_updates))
+    application.add_handler(CommandHandler("unsubscribe", handlers.unsubscribe, filters=subscription_updates))
+    application.add_handler(MessageHandler(
+        filters.Document.ALL & filters.CaptionRegex(r'^/import'), handlers.import_problems
+    ))
     
     # Register callback query handler for problem action buttons
     application.add_handler(CallbackQueryHandler(handlers.handle_problem_action, pattern="^problem_"))
@@ -53,16 +119,58 @@ def main() -> None:
     # Initialize and start scheduler
     scheduler = Scheduler(handlers)
     
+    # Background task that keeps the problem catalog fresh
+    refresh_task: Optional[asyncio.Task] = None
+    
+    # Prometheus endpoint; each shard worker gets its own port
+    metrics_server: Optional[MetricsServer] = None
+    if Config.METRICS_PORT:
+        register_metrics(handlers, sheets_service)
+        metrics_server = MetricsServer(port=Config.METRICS_PORT + max(Config.SHARD_INDEX, 0))
+    
     # Start the scheduler after application initializes
     async def post_init(app: Application) -> None:
         """Initialize scheduler after application is ready."""
+        nonlocal refresh_task
         scheduler.start(app)
+        if sheets_service.owns_snapshot or sheets_service.snapshot_file is None:
+            refresh_task = asyncio.create_task(sheets_service.catalog.run_refresh_loop())
+        else:
+            refresh_task = asyncio.create_task(sheets_service.run_follow_loop())
+        handlers.profiler.install_signal_handlers(handlers.state_for_profiling)
+        if metrics_server:
+            try:
+                await metrics_server.start()
+            except OSError as e:
+                logger.error(f"Could not start metrics server: {e}")
+    
+    async def post_stop(app: Application) -> None:
+        """Stop background tasks once the application has stopped."""
+        if refresh_task:
+            refresh_task.cancel()
+        handlers.profiler.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        handlers.sheets.shutdown()
+        handlers.store.close()
     
     application.post_init = post_init
+    application.post_stop = post_stop
     
     # Start the bot
-    logger.info("Starting bot...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if sharded:
+        logger.info(f"Starting shard {Config.SHARD_INDEX} of {Config.SHARD_COUNT}...")
+        run_shard_worker(application, Config.SHARD_INDEX)
+    elif Config.BOT_MODE == "webhook":
+        logger.info("Starting bot in webhook mode...")
+        run_webhook(
+            application,
+            readiness=lambda: sheets_service.catalog.version > 0,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        logger.info("Starting bot...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 """Configuration management for the DSA Telegram bot."""
 
 import os
-from typing import Optional
+from typing import Optional, Set
 
 
 class Config:
@@ -10,14 +10,89 @@ class Config:
     # Telegram Bot Token
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     
+    # Telegram user IDs allowed to run admin commands (comma-separated)
+    ADMIN_USER_IDS: Set[int] = {
+        int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+    }
+    
     # Google Sheets Configuration
     GOOGLE_SHEETS_ID: str = os.getenv("GOOGLE_SHEETS_ID", "")
     GOOGLE_SHEETS_RANGE: str = os.getenv("GOOGLE_SHEETS_RANGE", "Sheet1!A2:E")  # Skip header row
     GOOGLE_CREDENTIALS_FILE: str = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
     
+    # Problem catalog cache (seconds before a background refresh is due)
+    CATALOG_TTL_SECONDS: int = int(os.getenv("CATALOG_TTL_SECONDS", "300"))
+    # Seconds between full re-reads of the sheet; syncs in between only read appended rows
+    CATALOG_FULL_SYNC_SECONDS: int = int(os.getenv("CATALOG_FULL_SYNC_SECONDS", "3600"))
+    # Local catalog copy loaded at startup and served during Sheets outages (empty disables)
+    CATALOG_SNAPSHOT_PATH: str = os.getenv("CATALOG_SNAPSHOT_PATH", "catalog_snapshot.jsonl")
+    
+    # Rendered problem messages kept in the LRU render cache
+    RENDER_CACHE_SIZE: int = int(os.getenv("RENDER_CACHE_SIZE", "2048"))
+    
+    # Google Sheets call limits (worker threads and per-call timeout in seconds)
+    SHEETS_MAX_CONCURRENCY: int = int(os.getenv("SHEETS_MAX_CONCURRENCY", "4"))
+    SHEETS_TIMEOUT_SECONDS: float = float(os.getenv("SHEETS_TIMEOUT_SECONDS", "15"))
+    SHEETS_WRITE_FLUSH_INTERVAL: float = float(os.getenv("SHEETS_WRITE_FLUSH_INTERVAL", "0.5"))  # Seconds to batch new rows
+    SHEETS_WRITE_BATCH_SIZE: int = int(os.getenv("SHEETS_WRITE_BATCH_SIZE", "500"))
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))  # Rows per /import write
+    
+    # User state persistence ('sqlite' or 'memory')
+    STATE_BACKEND: str = os.getenv("STATE_BACKEND", "sqlite")
+    STATE_DB_PATH: str = os.getenv("STATE_DB_PATH", "bot_state.db")
+    STATE_FLUSH_INTERVAL: float = float(os.getenv("STATE_FLUSH_INTERVAL", "1.0"))  # Seconds between batched writes
+    
+    # Telegram delivery limits
+    TELEGRAM_RATE_LIMIT: float = float(os.getenv("TELEGRAM_RATE_LIMIT", "30"))  # Messages per second, bot-wide
+    TELEGRAM_PER_CHAT_INTERVAL: float = float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", "1.0"))  # Seconds between messages to one chat
+    DELIVERY_CONCURRENCY: int = int(os.getenv("DELIVERY_CONCURRENCY", "30"))
+    DELIVERY_MAX_RETRIES: int = int(os.getenv("DELIVERY_MAX_RETRIES", "3"))
+    
+    # How updates are received ('polling' or 'webhook')
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    
+    # Webhook server (BOT_MODE=webhook); WEBHOOK_URL is the public base URL Telegram posts to
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "").rstrip("/")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/telegram")
+    WEBHOOK_SECRET_TOKEN: str = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+    WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # Updates queued before answering 503
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "16"))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))  # Telegram-side connection limit
+    
+    # Sharded mode: SHARD_COUNT > 1 runs a coordinator plus one worker process per shard
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", "1"))
+    SHARD_INDEX: int = int(os.getenv("SHARD_INDEX", "-1"))  # Set by the coordinator for each worker
+    SHARD_SOCKET_DIR: str = os.getenv("SHARD_SOCKET_DIR", "shards")  # Unix sockets between coordinator and workers
+    
+    # Prometheus metrics endpoint (0 disables); shard workers use METRICS_PORT + SHARD_INDEX
+    METRICS_LISTEN: str = os.getenv("METRICS_LISTEN", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9464"))
+    
+    # On-demand profiling (/profile and SIGUSR1/SIGUSR2); output goes to PROFILE_DIR
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_DEFAULT_SECONDS: float = float(os.getenv("PROFILE_DEFAULT_SECONDS", "30"))
+    PROFILE_MAX_SECONDS: float = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # Seconds between stack samples
+    
+    # Logging: written by a background thread; LOG_FILE (empty logs to stderr) rotates in-process
+    LOG_FILE: str = os.getenv("LOG_FILE", "")
+    LOG_MAX_BYTES: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Rotate at this size
+    LOG_KEEP: int = int(os.getenv("LOG_KEEP", "5"))  # Rotated files kept (bot.log.1 ... bot.log.N)
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").lower()  # "text" or "json"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Records buffered before dropping
+    # Similar info lines (differing only in numbers) let through per interval; 0 disables sampling
+    LOG_SAMPLE_BURST: int = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+    LOG_SAMPLE_INTERVAL: float = float(os.getenv("LOG_SAMPLE_INTERVAL", "60"))
+    
     # Scheduler Configuration
     SCHEDULE_TIME: str = "11:00"  # 11:00 AM IST
     TIMEZONE: str = "Asia/Kolkata"
+    PRECOMPUTE_TIME: str = os.getenv("PRECOMPUTE_TIME", "03:00")  # Off-peak time to pick next daily problems
+    # Slots missed while the bot was down are sent on restart if at most this many minutes late
+    SCHEDULE_CATCHUP_MINUTES: int = int(os.getenv("SCHEDULE_CATCHUP_MINUTES", "30"))
     
     @classmethod
     def validate(cls) -> None:
@@ -29,6 +104,19 @@ class Config:
             missing.append("GOOGLE_SHEETS_ID")
         if not os.path.exists(cls.GOOGLE_CREDENTIALS_FILE):
             missing.append(f"GOOGLE_CREDENTIALS_FILE ({cls.GOOGLE_CREDENTIALS_FILE})")
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            raise ValueError(f"Invalid BOT_MODE: {cls.BOT_MODE} (expected 'polling' or 'webhook')")
+        if cls.LOG_FORMAT not in ("text", "json"):
+            raise ValueError(f"Invalid LOG_FORMAT: {cls.LOG_FORMAT} (expected 'text' or 'json')")
+        if cls.SHARD_COUNT < 1:
+            raise ValueError(f"Invalid SHARD_COUNT: {cls.SHARD_COUNT} (expected 1 or more)")
+        if cls.SHARD_COUNT > 1 and cls.STATE_BACKEND != "sqlite":
+            raise ValueError("SHARD_COUNT > 1 needs STATE_BACKEND=sqlite so shards share user state")
+        if cls.BOT_MODE == "webhook":
+            if not cls.WEBHOOK_URL:
+                missing.append("WEBHOOK_URL")
+            if not cls.WEBHOOK_SECRET_TOKEN:
+                missing.append("WEBHOOK_SECRET_TOKEN")
         
         if missing:
             raise ValueError(
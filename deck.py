@@ -0,0 +1,296 @@
+"""Per-user shuffled problem decks for repeat-free selection."""
+
+import hashlib
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+from models import Problem
+from problem_index import ProblemIndex
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+# Feistel rounds per permutation step
+_ROUNDS = 4
+
+
+def _mix(value: int) -> int:
+    """Scramble a 64-bit integer (splitmix64 finalizer)."""
+    value &= _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def _seed_key(seed: str) -> int:
+    return int.from_bytes(hashlib.blake2b(seed.encode(), digest_size=8).digest(), 'big')
+
+
+def _recent_marker(recent: Collection[str]) -> Tuple[int, Optional[str]]:
+    """Size and newest entry of a recent window, which change whenever it does."""
+    newest = None
+    for newest in recent:
+        pass
+    return len(recent), newest
+
+
+def permute(index: int, size: int, key: int) -> int:
+    """Position of index in a keyed pseudo-random permutation of range(size).
+
+    A balanced Feistel network over the smallest even number of bits that
+    covers size, cycle-walked back into range, so nothing is allocated.
+    """
+    if size <= 1:
+        return index
+    half = ((size - 1).bit_length() + 1) // 2
+    mask = (1 << half) - 1
+    value = index
+    while True:
+        left, right = value >> half, value & mask
+        for round_number in range(_ROUNDS):
+            left, right = right, left ^ (_mix(key + round_number * _GOLDEN + right) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+class Deck:
+    """A seeded lazy shuffle over one bucket, consumed by cursors.
+
+    Nothing is materialised: the deal order is a keyed permutation of bucket
+    indices, so a deck is a few integers no matter how big the bucket is.
+    Rows appended to the bucket become a new segment (its own permutation)
+    that is interleaved at random with what is still undealt, so a catalog
+    that only grows never reshuffles what the user has already seen.
+    """
+
+    __slots__ = ('filters', 'key', 'segments', 'round', 'dealt', 'known', 'lineage', 'exhausted')
+
+    def __init__(self, seed: str, filters: Tuple[Optional[str], Optional[str]] = (None, None)):
+        """Create an empty deck.
+
+        Args:
+            seed: Deterministic shuffle seed
+            filters: (topic, difficulty) selecting the deck's bucket
+        """
+        self.filters = filters
+        self.key = _seed_key(seed)
+        # [first bucket index, size, permutation key, cursor] per undealt range
+        self.segments: List[List[int]] = []
+        self.round = 0
+        self.dealt = 0  # Cards turned this round, drives the interleaving
+        self.known = 0  # Bucket entries covered by segments
+        self.lineage: Optional[object] = None
+        # (bucket size, completed count, recent marker) when a fresh round had nothing to deal
+        self.exhausted: Optional[Tuple] = None
+
+    def sync(self, index: ProblemIndex, bucket: Sequence[int]) -> None:
+        """Bring the deck in line with the bucket of the given index.
+
+        When rows were edited or removed (a new lineage) the cursors are kept
+        as they are: positions past the end of the bucket are skipped and
+        completed or recent problems are filtered when dealt.
+        """
+        if self.lineage is None:
+            self._new_round(len(bucket))
+        elif len(bucket) > self.known:
+            self._add_segment(self.known, len(bucket) - self.known)
+        self.known = max(self.known, len(bucket))
+        self.lineage = index.lineage
+
+    def _add_segment(self, start: int, size: int) -> None:
+        key = _mix(self.key ^ _mix(self.round * _GOLDEN + start))
+        self.segments.append([start, size, key, 0])
+
+    def _new_round(self, size: int) -> None:
+        self.round += 1
+        self.dealt = 0
+        self.segments = []
+        self.known = size
+        if size:
+            self._add_segment(0, size)
+
+    def _segment(self) -> Optional[List[int]]:
+        """The segment the next card comes from, weighted by undealt cards."""
+        segments = self.segments
+        if any(cursor >= size for _, size, _, cursor in segments):
+            segments = self.segments = [segment for segment in segments if segment[3] < segment[1]]
+        if len(segments) <= 1:
+            return segments[0] if segments else None
+        remaining = sum(size - cursor for _, size, _, cursor in segments)
+        pick = _mix(self.key ^ _mix(self.round * _GOLDEN + self.dealt)) % remaining
+        for segment in segments:
+            pick -= segment[1] - segment[3]
+            if pick < 0:
+                return segment
+        return segments[-1]
+
+    def _turn(self, bucket: Sequence[int]) -> Optional[Tuple[List[int], Optional[int]]]:
+        """Turn the next card: its segment and catalog position (None past the bucket end)."""
+        segment = self._segment()
+        if segment is None:
+            return None
+        start, size, key, cursor = segment
+        segment[3] += 1
+        self.dealt += 1
+        offset = start + permute(cursor, size, key)
+        return segment, bucket[offset] if offset < len(bucket) else None
+
+    def _unturn(self, segment: List[int]) -> None:
+        segment[3] -= 1
+        self.dealt -= 1
+
+    def draw(self, index: ProblemIndex, bucket: Sequence[int], completed: Collection[str],
+             recent: Collection[str], consume: bool = True) -> Optional[Problem]:
+        """Deal the next problem that is neither completed nor recent.
+
+        When the deck runs out a new round starts over the whole bucket
+        (completed problems are still skipped) before giving up. A deck found
+        exhausted returns None right away until the bucket, the completed set
+        or the recent window changes. With consume=False the problem is left
+        on top of the deck (a peek), and a finished round is not restarted:
+        None is returned and only a real draw starts the next round.
+        """
+        state = (len(bucket), len(completed), _recent_marker(recent))
+        if self.exhausted == state:
+            return None
+        self.exhausted = None
+        turned = self._advance(index, bucket, completed, recent)
+        if turned is None and self.dealt:
+            if not consume:
+                return None
+            self._new_round(len(bucket))
+            turned = self._advance(index, bucket, completed, recent)
+        if turned is None:
+            self.exhausted = state
+            return None
+        segment, problem = turned
+        if not consume:
+            self._unturn(segment)
+        return problem
+
+    def commit(self, bucket: Sequence[int], position: int) -> bool:
+        """Deal a previously peeked problem if it is still on top of the deck."""
+        turned = self._turn(bucket)
+        if turned is None:
+            return False
+        segment, top = turned
+        if top != position:
+            self._unturn(segment)
+            return False
+        return True
+
+    def _advance(self, index: ProblemIndex, bucket: Sequence[int], completed: Collection[str],
+                 recent: Collection[str]) -> Optional[Tuple[List[int], Problem]]:
+        """Turn cards until an eligible problem comes up."""
+        while True:
+            turned = self._turn(bucket)
+            if turned is None:
+                return None
+            segment, position = turned
+            if position is None:
+                continue
+            problem = index.problems[position]
+            if problem.id in completed or problem.id in recent:
+                continue
+            return segment, problem
+
+
+class UserDecks:
+    """All decks of a single user, one per difficulty (and topic) bucket."""
+
+    __slots__ = ('user_id', 'decks')
+
+    # Bucket key for "any difficulty"
+    ALL = 'all'
+
+    def __init__(self, user_id: int):
+        """Initialize with no decks; they are generated lazily on first use."""
+        self.user_id = user_id
+        self.decks: Dict[str, Deck] = {}
+
+    def draw(self, index: ProblemIndex, difficulty: Optional[str],
+             completed: Collection[str], recent: Collection[str],
+             topic: Optional[str] = None) -> Optional[Problem]:
+        """Deal the next problem, preferring the given difficulty and topic.
+
+        Falls back to the topic at any difficulty, then to the difficulty at
+        any topic, then to anything when the preferred buckets are exhausted.
+
+        Args:
+            index: Index of the current catalog snapshot
+            difficulty: Optional difficulty filter ('easy', 'medium', 'hard')
+            completed: IDs the user marked done or discarded
+            recent: IDs recently sent to the user
+            topic: Optional topic filter (case-insensitive)
+        """
+        for key, filters in self._buckets(difficulty, topic):
+            bucket = self._bucket(index, filters)
+            if not bucket:
+                continue
+            problem = self._deck(key, filters, index, bucket).draw(index, bucket, completed, recent)
+            if problem:
+                return problem
+        return None
+
+    def peek(self, index: ProblemIndex, difficulty: Optional[str], completed: Collection[str],
+             recent: Collection[str], topic: Optional[str] = None) -> Optional[Tuple[str, Problem]]:
+        """Find the next problem without dealing it.
+
+        Returns None when the preferred deck has finished its round, since
+        only a real draw may start the next one.
+
+        Returns:
+            The bucket key the problem came from and the problem, or None
+        """
+        for key, filters in self._buckets(difficulty, topic):
+            bucket = self._bucket(index, filters)
+            if not bucket:
+                continue
+            deck = self._deck(key, filters, index, bucket)
+            problem = deck.draw(index, bucket, completed, recent, consume=False)
+            if problem:
+                return key, problem
+            if deck.exhausted is None:
+                return None
+        return None
+
+    def _buckets(self, difficulty: Optional[str],
+                 topic: Optional[str]) -> List[Tuple[str, Tuple[Optional[str], Optional[str]]]]:
+        """(key, (topic, difficulty)) of the buckets to try, most specific first."""
+        buckets: List[Tuple[str, Tuple[Optional[str], Optional[str]]]] = []
+        difficulty = difficulty.lower() if difficulty else None
+        if topic:
+            topic = topic.lower()
+            if difficulty:
+                buckets.append((f"topic:{topic}:{difficulty}", (topic, difficulty)))
+            buckets.append((f"topic:{topic}", (topic, None)))
+        if difficulty:
+            buckets.append((difficulty, (None, difficulty)))
+        buckets.append((self.ALL, (None, None)))
+        return buckets
+
+    def commit(self, index: ProblemIndex, key: str, problem_id: str) -> bool:
+        """Deal a previously peeked problem from the given bucket."""
+        deck = self.decks.get(key)
+        position = index.positions.get(problem_id)
+        if deck is None or position is None:
+            return False
+        bucket = self._bucket(index, deck.filters)
+        deck.sync(index, bucket)
+        return deck.commit(bucket, position)
+
+    @staticmethod
+    def _bucket(index: ProblemIndex, filters: Tuple[Optional[str], Optional[str]]) -> Sequence[int]:
+        topic, difficulty = filters
+        if topic:
+            return index.topic_bucket(topic, difficulty)
+        return index.bucket(difficulty)
+
+    def _deck(self, key: str, filters: Tuple[Optional[str], Optional[str]], index: ProblemIndex,
+              bucket: Sequence[int]) -> Deck:
+        """Get the deck for a bucket, creating and syncing it as needed."""
+        deck = self.decks.get(key)
+        if deck is None:
+            deck = Deck(seed=f"{self.user_id}:{key}", filters=filters)
+            self.decks[key] = deck
+        deck.sync(index, bucket)
+        return deck
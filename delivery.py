@@ -0,0 +1,219 @@
+"""Rate-limited concurrent delivery of Telegram messages."""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from config import Config
+from metrics import delivery_lag
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket limiting the rate of an operation."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size (defaults to one second of tokens)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class DeliveryReport:
+    """Outcome of one fan-out batch."""
+    total: int
+    sent: int
+    failed: int
+    duration: float
+    p50_lag: float
+    p99_lag: float
+
+    @property
+    def throughput(self) -> float:
+        """Deliveries per second over the batch."""
+        return self.total / self.duration if self.duration > 0 else 0.0
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class DeliveryPipeline:
+    """Sends Telegram messages concurrently within Bot API rate limits.
+
+    A global token bucket keeps the bot under Telegram's overall limit, and a
+    per-chat gate spaces out messages to the same chat. RetryAfter responses
+    pause the global bucket; connection errors are retried with exponential
+    backoff and jitter. Both count against max_retries. Timeouts are not
+    retried, since the message may already have been delivered.
+    """
+
+    # Per-chat send times are pruned once the table grows past this size
+    CHAT_TABLE_PRUNE_SIZE = 10000
+
+    def __init__(self, rate: Optional[float] = None, per_chat_interval: Optional[float] = None,
+                 concurrency: Optional[int] = None, max_retries: Optional[int] = None):
+        """Initialize the pipeline (all limits default to Config)."""
+        self.bucket = TokenBucket(rate or Config.TELEGRAM_RATE_LIMIT)
+        self.per_chat_interval = (per_chat_interval if per_chat_interval is not None
+                                  else Config.TELEGRAM_PER_CHAT_INTERVAL)
+        self.concurrency = concurrency or Config.DELIVERY_CONCURRENCY
+        self.max_retries = max_retries if max_retries is not None else Config.DELIVERY_MAX_RETRIES
+        self._chat_next_send: Dict[int, float] = {}
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        """Respect the minimum interval between messages to one chat."""
+        now = time.monotonic()
+        next_send = self._chat_next_send.get(chat_id, 0.0)
+        self._chat_next_send[chat_id] = max(now, next_send) + self.per_chat_interval
+        if next_send > now:
+            await asyncio.sleep(next_send - now)
+
+        if len(self._chat_next_send) > self.CHAT_TABLE_PRUNE_SIZE:
+            self._chat_next_send = {
+                chat: at for chat, at in self._chat_next_send.items() if at > now
+            }
+
+    async def send_message(self, bot, chat_id: int, **kwargs):
+        """Send a message through the rate limiter, retrying transient failures.
+
+        Raises the last error once retries are exhausted or for errors that
+        retrying cannot fix (e.g. the user blocked the bot).
+        """
+        await self._wait_for_chat(chat_id)
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                message = await bot.send_message(chat_id=chat_id, **kwargs)
+                self.sent += 1
+                return message
+            except RetryAfter as e:
+                # Telegram told us to slow down: pause all sends, not just this one
+                self.rate_limited += 1
+                self.bucket.pause(float(e.retry_after))
+                # Still counts as an attempt, so a chat that keeps being throttled gives up
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                logger.warning(f"Rate limited by Telegram, pausing sends for {e.retry_after}s")
+            except BadRequest:
+                self.failed += 1
+                raise
+            except TimedOut:
+                # The request may well have reached Telegram: resending could deliver it twice
+                self.failed += 1
+                raise
+            except NetworkError as e:
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Transient error sending to {chat_id}: {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except Exception:
+                self.failed += 1
+                raise
+            attempt += 1
+            self.retries += 1
+
+    async def fan_out(self, chat_ids: Iterable[int], send: Callable[[int], Awaitable[bool]],
+                      scheduled_at: Optional[float] = None) -> DeliveryReport:
+        """Run a send coroutine for every chat with bounded concurrency.
+
+        Args:
+            chat_ids: Chats to deliver to
+            send: Coroutine function taking a chat ID and returning success
+            scheduled_at: Wall-clock time the batch was due, for lag reporting
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+
+        total = queue.qsize()
+        started = time.time()
+        due = scheduled_at if scheduled_at is not None else started
+        lags: List[float] = []
+        failures = 0
+
+        async def worker() -> None:
+            nonlocal failures
+            while True:
+                try:
+                    chat_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    ok = await send(chat_id)
+                except Exception as e:
+                    logger.error(f"Error delivering to {chat_id}: {e}")
+                    ok = False
+                if ok:
+                    lag = time.time() - due
+                    lags.append(lag)
+                    delivery_lag.observe(lag)
+                else:
+                    failures += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, total))))
+
+        lags.sort()
+        report = DeliveryReport(
+            total=total,
+            sent=total - failures,
+            failed=failures,
+            duration=time.time() - started,
+            p50_lag=percentile(lags, 0.50),
+            p99_lag=percentile(lags, 0.99),
+        )
+        if total:
+            logger.info(
+                f"Delivered {report.sent}/{report.total} in {report.duration:.1f}s "
+                f"({report.throughput:.1f} msg/s, p50 lag {report.p50_lag:.1f}s, p99 lag {report.p99_lag:.1f}s)"
+            )
+        return report
@@ -0,0 +1,197 @@
+"""Duplicate problem detection by normalized URL and title.
+
+Usage:
+    python duplicates.py report                          # Check the local catalog snapshot
+    python duplicates.py report --snapshot catalog.jsonl
+    python duplicates.py report --sheet                  # Fetch the sheet (needs credentials)
+
+The report exits with status 1 when duplicates are found, so it can run
+from cron or CI.
+"""
+
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from config import Config
+from models import Problem
+from search import tokenize
+from snapshot import CatalogSnapshotFile
+
+# Host, path and query of a URL (the scheme and fragment are dropped)
+_URL = re.compile(r'^(?:[A-Za-z][A-Za-z0-9+.-]*:)?(?://)?([^/?#]*)([^?#]*)(?:\?([^#]*))?')
+# Hosts whose paths are case-insensitive, so /problems/Two-Sum is /problems/two-sum
+_CASE_INSENSITIVE_HOSTS = {'leetcode.com', 'leetcode.cn'}
+# Trailing path segments that point at a tab of the same problem page
+_PAGE_TABS = {'description', 'solution', 'solutions', 'editorial', 'discuss', 'submissions'}
+# Query parameters that only track where a link came from
+_TRACKING_PARAMS = {'envtype', 'envid', 'ref', 'source', 'fbclid', 'gclid'}
+# Leading problem numbers such as "1. Two Sum" or "#1 - Two Sum"
+_TITLE_NUMBER = re.compile(r'^\s*#?\d+\s*[.):-]\s*')
+
+
+def _is_tracking(name: str) -> bool:
+    return name in _TRACKING_PARAMS or name.startswith('utm_')
+
+
+def url_key(url: str) -> str:
+    """Normalized URL used to match duplicates.
+
+    Ignores the scheme, "www.", the case of the host, trailing slashes,
+    fragments, tracking parameters and trailing tabs like /description, so
+    https://leetcode.com/problems/two-sum/description/?envType=study-plan
+    and http://www.LeetCode.com/problems/two-sum match. Path and query case
+    is kept, except on hosts known to ignore it (see _CASE_INSENSITIVE_HOSTS).
+    """
+    match = _URL.match(url.strip())
+    host, path, query = match.group(1, 2, 3)
+    host = host.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    if host in _CASE_INSENSITIVE_HOSTS:
+        path = path.lower()
+    segments = [segment for segment in path.split('/') if segment]
+    while len(segments) > 1 and segments[-1].lower() in _PAGE_TABS:
+        segments.pop()
+    if query:
+        query = '&'.join(sorted(
+            param for param in query.split('&')
+            if param and not _is_tracking(param.partition('=')[0].lower())
+        ))
+    key = host + '/' + '/'.join(segments)
+    return f"{key}?{query}" if query else key
+
+
+def title_key(title: str) -> str:
+    """Normalized title used to match duplicates (empty if it has no words)."""
+    return ' '.join(tokenize(_TITLE_NUMBER.sub('', title)))
+
+
+@dataclass
+class Duplicate:
+    """Where a new problem matches the catalog."""
+    kind: str  # 'url' (same problem, rejected) or 'title' (likely the same, flagged)
+    position: int
+
+
+class DuplicateIndex:
+    """Hash index from normalized URL and title to the first problem with them."""
+
+    def __init__(self, problems: Sequence[Problem] = ()):
+        """Index a catalog snapshot's problems in catalog order."""
+        self.by_url: Dict[str, int] = {}
+        self.by_title: Dict[str, int] = {}
+        self._add(problems, 0)
+
+    def _add(self, problems: Iterable[Problem], start: int) -> None:
+        for position, problem in enumerate(problems, start=start):
+            self.by_url.setdefault(url_key(problem.url), position)
+            title = title_key(problem.title)
+            if title:
+                self.by_title.setdefault(title, position)
+
+    def extended(self, new_problems: Sequence[Problem], start: int) -> 'DuplicateIndex':
+        """Index for this catalog plus rows appended at the given position."""
+        index = DuplicateIndex.__new__(DuplicateIndex)
+        index.by_url = dict(self.by_url)
+        index.by_title = dict(self.by_title)
+        index._add(new_problems, start)
+        return index
+
+    def find(self, title: str, url: str) -> Optional[Duplicate]:
+        """The existing problem a new one duplicates, by URL first, then by title."""
+        position = self.by_url.get(url_key(url))
+        if position is not None:
+            return Duplicate('url', position)
+        title = title_key(title)
+        position = self.by_title.get(title) if title else None
+        if position is not None:
+            return Duplicate('title', position)
+        return None
+
+
+@dataclass
+class DuplicateGroup:
+    """Catalog problems sharing a normalized URL or title."""
+    kind: str
+    key: str
+    problems: List[Problem]
+
+
+def find_duplicate_groups(problems: Iterable[Problem]) -> List[DuplicateGroup]:
+    """Group a whole catalog's duplicates in a single pass.
+
+    Title groups are only reported when their problems have different URLs,
+    since same-URL rows already appear as a URL group.
+    """
+    by_url: Dict[str, List[Problem]] = {}
+    by_title: Dict[str, List[Problem]] = {}
+    for problem in problems:
+        by_url.setdefault(url_key(problem.url), []).append(problem)
+        title = title_key(problem.title)
+        if title:
+            by_title.setdefault(title, []).append(problem)
+
+    groups = [DuplicateGroup('url', key, group) for key, group in by_url.items() if len(group) > 1]
+    groups.extend(
+        DuplicateGroup('title', key, group) for key, group in by_title.items()
+        if len({url_key(problem.url) for problem in group}) > 1
+    )
+    return groups
+
+
+def format_report(groups: List[DuplicateGroup], total: int) -> str:
+    """Human-readable dedupe report."""
+    url_groups = [group for group in groups if group.kind == 'url']
+    title_groups = [group for group in groups if group.kind == 'title']
+    extra = sum(len(group.problems) - 1 for group in url_groups)
+    lines = [
+        f"Checked {total} problems",
+        f"Same URL: {len(url_groups)} groups ({extra} redundant rows)",
+        f"Same title, different URL: {len(title_groups)} groups",
+    ]
+    for heading, kind_groups in (("Same URL", url_groups), ("Same title", title_groups)):
+        if not kind_groups:
+            continue
+        lines.append(f"\n{heading}:")
+        for group in kind_groups:
+            lines.append(f"  {group.key}")
+            lines.extend(f"    {problem.id}\t{problem.title}\t{problem.url}" for problem in group.problems)
+    return "\n".join(lines)
+
+
+def load_problems(args: argparse.Namespace) -> List[Problem]:
+    """Read the catalog from the sheet or a local snapshot."""
+    if args.sheet:
+        from sheets import SheetsService
+        return SheetsService().fetch_all_problems()
+
+    path = args.snapshot or Config.CATALOG_SNAPSHOT_PATH
+    stored = CatalogSnapshotFile(path).load() if path else None
+    if stored is None:
+        raise SystemExit(f"No catalog snapshot at {path!r}; pass --snapshot or --sheet")
+    return stored.problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report = commands.add_parser('report', help='List duplicates already in the catalog')
+    source = report.add_mutually_exclusive_group()
+    source.add_argument('--snapshot', help='Catalog snapshot file (defaults to CATALOG_SNAPSHOT_PATH)')
+    source.add_argument('--sheet', action='store_true', help='Fetch the catalog from Google Sheets')
+
+    args = parser.parse_args()
+    if args.command == 'report':
+        problems = load_problems(args)
+        groups = find_duplicate_groups(problems)
+        print(format_report(groups, len(problems)))
+        sys.exit(1 if groups else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Post fake Telegram updates to a local webhook server.
+
+Usage:
+    python fake_updates.py --count 1000 --users 200 --concurrency 50
+    python fake_updates.py --text /today --secret "$WEBHOOK_SECRET_TOKEN"
+    python fake_updates.py --check
+
+Replies to fake users fail at the Bot API; this exercises the receiving side
+(secret check, queueing, back-pressure) and the handlers up to the send.
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from delivery import percentile
+
+FIRST_FAKE_USER_ID = 900000000
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Dict:
+    """Build a private-chat message update as Telegram would send it."""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'Load{user_id}'}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': user['first_name']},
+        'from': user,
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+class Connection:
+    """Keep-alive HTTP/1.1 connection to the webhook server."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: bytes = b'',
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        """Send one request and return (status, body)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        self.writer.write(head.encode() + b'\r\n' + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, await self.reader.readexactly(length)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def post_updates(host: str, port: int, path: str, secret: str, count: int,
+                       users: int, concurrency: int, text: str) -> None:
+    """Post updates over concurrent connections and print status counts and latency."""
+    statuses: collections.Counter = collections.Counter()
+    latencies: List[float] = []
+    update_ids = itertools.count(1)
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret
+
+    async def worker(quota: int) -> None:
+        connection = Connection(host, port)
+        try:
+            for _ in range(quota):
+                update_id = next(update_ids)
+                user_id = FIRST_FAKE_USER_ID + update_id % users
+                body = json.dumps(make_update(update_id, user_id, text)).encode()
+                started = time.perf_counter()
+                try:
+                    status, _ = await connection.request('POST', path, body, headers)
+                    statuses[status] += 1
+                except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                    statuses[type(e).__name__] += 1
+                    connection.close()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    quotas = [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+    await asyncio.gather(*(worker(quota) for quota in quotas if quota))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"Posted {count} updates in {elapsed:.2f}s ({count / elapsed:.0f}/s)")
+    print(f"Latency p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+    for status, seen in sorted(statuses.items(), key=lambda item: str(item[0])):
+        print(f"  {status}: {seen}")
+
+
+async def check_health(host: str, port: int) -> None:
+    """Print the health and readiness endpoint responses."""
+    connection = Connection(host, port)
+    try:
+        for path in ('/healthz', '/readyz'):
+            status, body = await connection.request('GET', path)
+            print(f"{path}: {status} {body.decode()}")
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=Config.WEBHOOK_LISTEN)
+    parser.add_argument('--port', type=int, default=Config.WEBHOOK_PORT)
+    parser.add_argument('--path', default=Config.WEBHOOK_PATH)
+    parser.add_argument('--secret', default=Config.WEBHOOK_SECRET_TOKEN)
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--text', default='/start')
+    parser.add_argument('--check', action='store_true', help='Only query /healthz and /readyz')
+    args = parser.parse_args()
+
+    if args.check:
+        asyncio.run(check_health(args.host, args.port))
+    else:
+        asyncio.run(post_updates(args.host, args.port, args.path, args.secret, args.count,
+                                 args.users, args.concurrency, args.text))
+
+
+if __name__ == '__main__':
+    main()
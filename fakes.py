@@ -0,0 +1,237 @@
+"""Local stand-ins for the Google Sheets values API and the Telegram Bot API.
+
+Used by benchmark.py to drive the bot offline. Both fakes can add latency,
+fail a fraction of calls and answer 429 (rate limited) like the real
+services do.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+from telegram.error import NetworkError, RetryAfter
+
+from sheets import parse_range, quote_sheet_name
+
+
+class FakeFailures:
+    """Latency and failure behaviour shared by the fakes."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, seed: Optional[int] = None):
+        """Initialize the behaviour.
+
+        Args:
+            latency: Seconds each call takes
+            jitter: Extra random latency up to this many seconds
+            error_rate: Fraction of calls failing with a server error
+            throttle_rate: Fraction of calls answered with 429
+            seed: Seed for reproducible failures
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def outcome(self) -> Optional[str]:
+        """'error', 'throttled' or None for a successful call."""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.error_rate:
+            return 'error'
+        if roll < self.error_rate + self.throttle_rate:
+            return 'throttled'
+        return None
+
+
+class _Request:
+    """Deferred API call with an execute() method, like googleapiclient's."""
+
+    def __init__(self, values: 'FakeSheetsValues', method: str, func):
+        self.values = values
+        self.method = method
+        self.func = func
+
+    def execute(self) -> Dict:
+        return self.values._execute(self.method, self.func)
+
+
+class FakeSheetsValues:
+    """In-memory sheet behind the spreadsheets().values() get/append API.
+
+    Calls are blocking (they sleep), matching the real client which the bot
+    runs on executor threads.
+    """
+
+    def __init__(self, rows: List[list], range_name: str = 'Sheet1!A2:E',
+                 failures: Optional[FakeFailures] = None):
+        """Initialize with the data rows below the header."""
+        self.rows = [list(row) for row in rows]
+        self.sheet_name, _, self.start_row, _ = parse_range(range_name)
+        self.failures = failures or FakeFailures()
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+
+    def _execute(self, method: str, func) -> Dict:
+        delay = self.failures.delay()
+        if delay:
+            time.sleep(delay)
+        outcome = self.failures.outcome()
+        self.calls[(method, outcome or 'ok')] += 1
+        if outcome == 'error':
+            raise HttpError(httplib2.Response({'status': 500, 'reason': 'Internal Error'}), b'{}', uri=method)
+        if outcome == 'throttled':
+            raise HttpError(httplib2.Response({'status': 429, 'reason': 'Too Many Requests'}), b'{}', uri=method)
+        with self._lock:
+            return func()
+
+    def get(self, spreadsheetId: str, range: str) -> _Request:
+        _, _, first_row, _ = parse_range(range)
+
+        def run() -> Dict:
+            offset = max(first_row - self.start_row, 0)
+            return {'values': [list(row) for row in self.rows[offset:]]}
+        return _Request(self, 'values.get', run)
+
+    def append(self, spreadsheetId: str, range: str, body: Dict, **kwargs) -> _Request:
+        def run() -> Dict:
+            first = self.start_row + len(self.rows)
+            self.rows.extend(list(row) for row in body['values'])
+            last = self.start_row + len(self.rows) - 1
+            return {'updates': {'updatedRange': f"{quote_sheet_name(self.sheet_name)}!A{first}:E{last}"}}
+        return _Request(self, 'values.append', run)
+
+    def resource(self) -> Any:
+        """Object shaped like the discovery resource: .spreadsheets().values()."""
+        return SimpleNamespace(spreadsheets=lambda: SimpleNamespace(values=lambda: self))
+
+
+def make_rows(count: int, seed: int = 0) -> List[list]:
+    """Synthetic catalog rows (id, title, difficulty, topic, url)."""
+    rng = random.Random(seed)
+    topics = ['Arrays', 'Strings', 'Trees', 'Graphs', 'Dynamic Programming', 'Heaps', 'Greedy']
+    return [
+        [f"p{i}", f"Problem {i}", rng.choice(['easy', 'medium', 'hard']),
+         rng.choice(topics), f"https://example.com/problems/{i}"]
+        for i in range(count)
+    ]
+
+
+class FakeBot:
+    """Async stand-in for telegram.Bot covering the calls the handlers make.
+
+    Besides random 429s (throttle_rate), a bot-wide limit of rate_limit
+    messages per second answers RetryAfter once exceeded, like Telegram's
+    flood control.
+    """
+
+    def __init__(self, failures: Optional[FakeFailures] = None, rate_limit: Optional[float] = None,
+                 retry_after: int = 1):
+        """Initialize the fake.
+
+        Args:
+            failures: Latency and random failure behaviour
+            rate_limit: Messages per second before answering 429 (None disables)
+            retry_after: Seconds reported in RetryAfter errors
+        """
+        self.failures = failures or FakeFailures()
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self._recent_sends: deque = deque()
+        self._message_ids = 0
+        self.calls: Counter = Counter()
+
+    def _over_limit(self) -> bool:
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        while self._recent_sends and now - self._recent_sends[0] >= 1.0:
+            self._recent_sends.popleft()
+        if len(self._recent_sends) >= self.rate_limit:
+            return True
+        self._recent_sends.append(now)
+        return False
+
+    async def _call(self, method: str, limited: bool = True) -> None:
+        delay = self.failures.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        outcome = self.failures.outcome()
+        if outcome is None and limited and self._over_limit():
+            outcome = 'throttled'
+        self.calls[(method, outcome or 'ok')] += 1
+        if outcome == 'error':
+            raise NetworkError("Fake Bot API error")
+        if outcome == 'throttled':
+            raise RetryAfter(self.retry_after)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        await self._call('sendMessage')
+        self._message_ids += 1
+        return SimpleNamespace(message_id=self._message_ids, chat_id=chat_id, text=text)
+
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, **kwargs) -> bool:
+        await self._call('editMessageReplyMarkup')
+        return True
+
+    async def answer_callback_query(self, callback_query_id: str, **kwargs) -> bool:
+        await self._call('answerCallbackQuery', limited=False)
+        return True
+
+
+class FakeMessage:
+    """Incoming message whose replies go through a FakeBot."""
+
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = '', message_id: int = 0):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.message_id = message_id
+
+    async def reply_text(self, text: str, **kwargs) -> SimpleNamespace:
+        return await self.bot.send_message(self.chat_id, text, **kwargs)
+
+
+class FakeCallbackQuery:
+    """Button press on a problem message."""
+
+    def __init__(self, bot: FakeBot, user_id: int, data: str):
+        self.bot = bot
+        self.id = str(user_id)
+        self.data = data
+        self.from_user = SimpleNamespace(id=user_id, first_name=f"User{user_id}")
+        self.message = FakeMessage(bot, user_id)
+
+    async def answer(self, *args, **kwargs) -> bool:
+        return await self.bot.answer_callback_query(self.id)
+
+    async def edit_message_reply_markup(self, reply_markup=None, **kwargs) -> bool:
+        return await self.bot.edit_message_reply_markup(self.message.chat_id, self.message.message_id)
+
+
+def fake_update(bot: FakeBot, user_id: int, text: str = '', callback_data: Optional[str] = None) -> SimpleNamespace:
+    """Update-shaped object for a private-chat command or button press."""
+    user = SimpleNamespace(id=user_id, first_name=f"User{user_id}")
+    chat = SimpleNamespace(id=user_id, type='private')
+    if callback_data is not None:
+        return SimpleNamespace(effective_user=user, effective_chat=chat, message=None,
+                               callback_query=FakeCallbackQuery(bot, user_id, callback_data))
+    return SimpleNamespace(effective_user=user, effective_chat=chat, callback_query=None,
+                           message=FakeMessage(bot, user_id, text))
+
+
+def fake_context(args: Optional[List[str]] = None) -> SimpleNamespace:
+    """Context-shaped object carrying command arguments."""
+    return SimpleNamespace(args=args or [], bot=None)
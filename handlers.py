@@ -1,14 +1,28 @@
 """Command handlers for the DSA Telegram bot."""
 
+import asyncio
 import logging
-import time
-from typing import Dict, Optional, Set
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
 
-from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Bot, Update, InlineKeyboardMarkup
+from telegram.constants import ChatMemberStatus, ChatType
+from telegram.error import ChatMigrated, Forbidden
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 
-from models import Problem, UserPrefs
-from sheets import SheetsService
+from config import Config
+from deck import UserDecks
+from delivery import DeliveryPipeline
+from models import VALID_DIFFICULTIES, Problem, UserPrefs, is_valid_url, new_problem_id
+from importer import ProblemImporter, detect_format, iter_rows
+from metrics import timed
+from planner import DailyPlanner
+from profiler import MODES, Profiler
+from progress import ProblemBitset, RecentWindow
+from render import RenderCache
+from sheets import AsyncSheetsService
+from storage import MemoryStateStore, StateStore
 
 logger = logging.getLogger(__name__)
 
@@ -18,74 +32,128 @@ TITLE, DIFFICULTY, TOPIC, URL = range(4)
 # In-memory storage
 user_prefs: Dict[int, UserPrefs] = {}
 conversation_data: Dict[int, Dict] = {}  # Store temporary data during /add flow
-user_completed_problems: Dict[int, Set[str]] = {}  # Track done/discarded problems per user
-user_recent_problems: Dict[int, list] = {}  # Track recently sent problems (last 20) per user
+user_completed_problems: Dict[int, ProblemBitset] = {}  # Track done/discarded problems per user
+user_recent_problems: Dict[int, RecentWindow] = {}  # Track recently sent problems (last 20) per user
+user_decks: Dict[int, UserDecks] = {}  # Shuffled selection order per user
+
+# Subscribed groups and channels share the per-user dicts above, keyed by their chat ID
+
+
+def is_group_chat(chat_id: int) -> bool:
+    """Whether a chat ID belongs to a group, supergroup or channel (they are negative)."""
+    return chat_id < 0
 
 
 class Handlers:
     """Command handlers for the bot."""
     
-    def __init__(self, sheets_service: SheetsService):
-        """Initialize handlers with sheets service."""
+    # Topics shown by /topic and results returned by /search
+    MAX_LISTED_TOPICS = 40
+    SEARCH_RESULTS = 10
+    
+    def __init__(self, sheets_service: AsyncSheetsService, store: Optional[StateStore] = None,
+                 delivery: Optional[DeliveryPipeline] = None):
+        """Initialize handlers with sheets service, state store and delivery pipeline."""
         self.sheets = sheets_service
+        self.store = store if store is not None else MemoryStateStore()
+        self.delivery = delivery if delivery is not None else DeliveryPipeline()
+        self.renderer = RenderCache()
+        self.planner = DailyPlanner(user_prefs, user_completed_problems, user_recent_problems, user_decks, self.store)
+        self.profiler = Profiler()
     
-    def _get_excluded_problem_ids(self, user_id: int) -> Set[str]:
-        """Get set of problem IDs to exclude for a user (completed + recent)."""
-        excluded = set()
-        
-        # Add completed/discarded problems
-        if user_id in user_completed_problems:
-            excluded.update(user_completed_problems[user_id])
+    def restore_state(self, shard_index: int = 0, shard_count: int = 1) -> None:
+        """Load persisted user state into the in-memory dicts.
         
-        # Add recently sent problems (last 20)
-        if user_id in user_recent_problems:
-            excluded.update(user_recent_problems[user_id])
-        
-        return excluded
+        Args:
+            shard_index: Shard this process serves (sharded mode only)
+            shard_count: Total number of shards
+        """
+        state = self.store.load(shard_index, shard_count)
+        user_prefs.update(state.prefs)
+        for user_id, completed in state.completed.items():
+            user_completed_problems[user_id] = ProblemBitset(completed)
+        for user_id, recent in state.recent.items():
+            user_recent_problems[user_id] = RecentWindow(recent)
+        conversation_data.update(state.conversations)
+        self.planner.assignments.update(state.assignments)
+    
+    def _record_sent(self, user_id: int, problem: Problem) -> None:
+        """Track a problem as recently sent to a user (keeps the last 20)."""
+        recent = user_recent_problems[user_id]
+        recent.append(problem.id)
+        self.store.save_recent(user_id, list(recent))
     
-    def _create_problem_keyboard(self, problem_id: str) -> InlineKeyboardMarkup:
-        """Create inline keyboard with Done/Later/Discard buttons."""
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Done", callback_data=f"problem_done_{problem_id}"),
-                InlineKeyboardButton("⏰ Later", callback_data=f"problem_later_{problem_id}"),
-                InlineKeyboardButton("❌ Discard", callback_data=f"problem_discard_{problem_id}")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+    async def _pick_problem(self, user_id: int, difficulty: Optional[str]) -> Optional[Problem]:
+        """Deal the user's next problem, skipping completed and recently sent ones."""
+        index = await self.sheets.get_index()
+        decks = user_decks.get(user_id)
+        if decks is None:
+            decks = user_decks[user_id] = UserDecks(user_id)
+        prefs = user_prefs.get(user_id)
+        return decks.draw(
+            index,
+            difficulty,
+            user_completed_problems[user_id],
+            user_recent_problems[user_id],
+            prefs.topic if prefs else None
+        )
+    
+    def _render_problem(self, problem: Problem, kind: str) -> Tuple[str, InlineKeyboardMarkup]:
+        """Get the cached message text and keyboard for a problem."""
+        return self.renderer.render(problem, kind, self.sheets.catalog.version)
     
+    @timed('problem_action')
     async def handle_problem_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Handle callback queries for problem action buttons."""
-        query = update.callback_query
-        await query.answer()
+        """Handle callback queries for problem action buttons.
         
+        Progress is tracked for the member who pressed the button. In groups
+        and channels the buttons stay on the shared message and the member
+        gets a popup instead of a reply.
+        """
+        query = update.callback_query
         user_id = query.from_user.id
         data = query.data
+        shared = query.message is not None and is_group_chat(query.message.chat_id)
+        
+        if not shared:
+            await query.answer()
         
         # Initialize user tracking if needed
         if user_id not in user_completed_problems:
-            user_completed_problems[user_id] = set()
+            user_completed_problems[user_id] = ProblemBitset()
         if user_id not in user_recent_problems:
-            user_recent_problems[user_id] = []
+            user_recent_problems[user_id] = RecentWindow()
         
         if data.startswith("problem_done_"):
             problem_id = data.replace("problem_done_", "")
             user_completed_problems[user_id].add(problem_id)
-            await query.edit_message_reply_markup(reply_markup=None)
-            await query.message.reply_text("✅ Marked as done! Great job! 🎉")
+            self.store.add_completed(user_id, problem_id)
+            reply = "✅ Marked as done! Great job! 🎉"
         
         elif data.startswith("problem_discard_"):
             problem_id = data.replace("problem_discard_", "")
             user_completed_problems[user_id].add(problem_id)
-            await query.edit_message_reply_markup(reply_markup=None)
-            await query.message.reply_text("❌ Problem discarded. I won't send this one again.")
+            self.store.add_completed(user_id, problem_id)
+            self.planner.invalidate(user_id)
+            reply = "❌ Problem discarded. I won't send this one again."
         
         elif data.startswith("problem_later_"):
             problem_id = data.replace("problem_later_", "")
             # Don't mark as completed, just acknowledge
+            reply = "⏰ Saved for later! I'll keep this problem in rotation."
+        
+        else:
+            if shared:
+                await query.answer()
+            return
+        
+        if shared:
+            await query.answer(reply)
+        else:
             await query.edit_message_reply_markup(reply_markup=None)
-            await query.message.reply_text("⏰ Saved for later! I'll keep this problem in rotation.")
+            await query.message.reply_text(reply)
     
+    @timed('start')
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /start command."""
         user_id = update.effective_user.id
@@ -94,6 +162,7 @@ class Handlers:
         # Initialize user preferences if not exists
         if user_id not in user_prefs:
             user_prefs[user_id] = UserPrefs(user_id=user_id)
+            self.store.save_prefs(user_prefs[user_id])
             # Schedule job for new user
             if hasattr(self, 'scheduler') and self.scheduler:
                 self.scheduler.schedule_new_user(user_id)
@@ -110,7 +179,10 @@ class Handlers:
             "/another - Get another random problem\n"
             "/level [default|easy|medium|hard] - Set difficulty preference\n"
             "/settime [HH:MM] - Set daily problem delivery time\n"
-            "/add - Add a new problem to the database\n\n"
+            "/topic [name|any] - Set topic preference\n"
+            "/search <words> - Find problems by title or topic\n"
+            "/add - Add a new problem to the database\n"
+            "/subscribe [HH:MM] - (Groups and channels) Get one shared daily problem\n\n"
             "💡 *Features:*\n"
             f"• Daily problems at {schedule_time} IST (customize with /settime)\n"
             "• Interactive buttons: ✅ Done, ⏰ Later, ❌ Discard\n"
@@ -120,42 +192,31 @@ class Handlers:
         
         await update.message.reply_text(welcome_message, parse_mode='Markdown')
     
+    @timed('today')
     async def today(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /today command - send today's problem."""
         user_id = update.effective_user.id
         
         # Initialize user tracking if needed
         if user_id not in user_completed_problems:
-            user_completed_problems[user_id] = set()
+            user_completed_problems[user_id] = ProblemBitset()
         if user_id not in user_recent_problems:
-            user_recent_problems[user_id] = []
+            user_recent_problems[user_id] = RecentWindow()
         
         # Get user's difficulty preference
         difficulty = None
         if user_id in user_prefs:
             difficulty = user_prefs[user_id].get_difficulty()
         
-        # Get excluded problem IDs
-        excluded_ids = self._get_excluded_problem_ids(user_id)
-        
         try:
-            problem = self.sheets.get_random_problem(difficulty, exclude_ids=excluded_ids)
+            problem = await self._pick_problem(user_id, difficulty)
             
             if problem:
-                # Track this problem as recently sent
-                user_recent_problems[user_id].append(problem.id)
-                # Keep only last 20 recent problems
-                if len(user_recent_problems[user_id]) > 20:
-                    user_recent_problems[user_id] = user_recent_problems[user_id][-20:]
+                self._record_sent(user_id, problem)
                 
-                message = (
-                    "📅 *Today's DSA Problem*\n\n"
-                    f"{problem}\n\n"
-                    "💪 Good luck solving it!"
-                )
-                keyboard = self._create_problem_keyboard(problem.id)
+                message, keyboard = self._render_problem(problem, 'today')
                 await update.message.reply_text(
-                    message, 
+                    message,
                     parse_mode='Markdown',
                     reply_markup=keyboard
                 )
@@ -170,40 +231,29 @@ class Handlers:
                 "❌ Error fetching problem. Please try again later."
             )
     
+    @timed('another')
     async def another(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /another command - send another random problem."""
         user_id = update.effective_user.id
         
         # Initialize user tracking if needed
         if user_id not in user_completed_problems:
-            user_completed_problems[user_id] = set()
+            user_completed_problems[user_id] = ProblemBitset()
         if user_id not in user_recent_problems:
-            user_recent_problems[user_id] = []
+            user_recent_problems[user_id] = RecentWindow()
         
         # Get user's difficulty preference
         difficulty = None
         if user_id in user_prefs:
             difficulty = user_prefs[user_id].get_difficulty()
         
-        # Get excluded problem IDs
-        excluded_ids = self._get_excluded_problem_ids(user_id)
-        
         try:
-            problem = self.sheets.get_random_problem(difficulty, exclude_ids=excluded_ids)
+            problem = await self._pick_problem(user_id, difficulty)
             
             if problem:
-                # Track this problem as recently sent
-                user_recent_problems[user_id].append(problem.id)
-                # Keep only last 20 recent problems
-                if len(user_recent_problems[user_id]) > 20:
-                    user_recent_problems[user_id] = user_recent_problems[user_id][-20:]
+                self._record_sent(user_id, problem)
                 
-                message = (
-                    "🎲 *Another Random Problem*\n\n"
-                    f"{problem}\n\n"
-                    "💪 Good luck solving it!"
-                )
-                keyboard = self._create_problem_keyboard(problem.id)
+                message, keyboard = self._render_problem(problem, 'another')
                 await update.message.reply_text(
                     message,
                     parse_mode='Markdown',
@@ -220,6 +270,7 @@ class Handlers:
                 "❌ Error fetching problem. Please try again later."
             )
     
+    @timed('level')
     async def level(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /level command - set difficulty preference."""
         user_id = update.effective_user.id
@@ -253,11 +304,14 @@ class Handlers:
             return
         
         user_prefs[user_id].difficulty = difficulty
+        self.store.save_prefs(user_prefs[user_id])
+        self.planner.invalidate(user_id)
         await update.message.reply_text(
             f"✅ Difficulty preference set to: *{difficulty.capitalize()}*",
             parse_mode='Markdown'
         )
     
+    @timed('settime')
     async def settime(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle /settime command - set daily problem delivery time."""
         user_id = update.effective_user.id
@@ -305,6 +359,7 @@ class Handlers:
             # Update user preference
             old_time = user_prefs[user_id].get_schedule_time()
             user_prefs[user_id].schedule_time = formatted_time
+            self.store.save_prefs(user_prefs[user_id])
             
             # Reschedule the user's job if scheduler is available
             if hasattr(self, 'scheduler') and self.scheduler:
@@ -325,11 +380,109 @@ class Handlers:
                 "Examples: 09:00, 14:30, 18:00"
             )
     
+    @timed('topic')
+    async def topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /topic command - set topic preference."""
+        user_id = update.effective_user.id
+        query = ' '.join(context.args or []).strip()
+        
+        # Initialize user preferences if not exists
+        if user_id not in user_prefs:
+            user_prefs[user_id] = UserPrefs(user_id=user_id)
+        prefs = user_prefs[user_id]
+        
+        try:
+            search_index = await self.sheets.get_search_index()
+        except Exception as e:
+            logger.error(f"Error loading topics: {e}")
+            await update.message.reply_text("❌ Error loading topics. Please try again later.")
+            return
+        
+        if not query:
+            # Show current preference and the available topics
+            current = search_index.topics.get(prefs.topic, prefs.topic) if prefs.topic else "Any"
+            topics = sorted(search_index.topics.values(), key=str.lower)
+            listed = ', '.join(topics[:self.MAX_LISTED_TOPICS])
+            if len(topics) > self.MAX_LISTED_TOPICS:
+                listed += f" and {len(topics) - self.MAX_LISTED_TOPICS} more"
+            await update.message.reply_text(
+                f"🏷 Your current topic preference: {current}\n\n"
+                f"Topics: {listed}\n\n"
+                "To change it, use:\n"
+                "/topic <name>  (e.g. /topic graphs or /topic dp)\n"
+                "/topic any"
+            )
+            return
+        
+        if query.lower() in ('any', 'default', 'clear'):
+            prefs.topic = None
+            self.store.save_prefs(prefs)
+            self.planner.invalidate(user_id)
+            await update.message.reply_text("✅ Topic preference cleared. You'll get problems from any topic.")
+            return
+        
+        matches = search_index.match_topics(query)
+        if not matches:
+            await update.message.reply_text(
+                f"❌ No topic matches \"{query}\". Send /topic to see the available topics."
+            )
+            return
+        if len(matches) > 1:
+            await update.message.reply_text(
+                f"🤔 \"{query}\" matches several topics: {', '.join(matches[:self.MAX_LISTED_TOPICS])}\n"
+                "Please be more specific."
+            )
+            return
+        
+        prefs.topic = matches[0].lower()
+        self.store.save_prefs(prefs)
+        self.planner.invalidate(user_id)
+        await update.message.reply_text(
+            f"✅ Topic preference set to: {matches[0]}\n"
+            "When you've done every problem of this topic you'll get problems from other topics."
+        )
+    
+    @timed('search')
+    async def search(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /search command - find problems by title or topic words."""
+        query = ' '.join(context.args or []).strip()
+        if not query:
+            await update.message.reply_text(
+                "🔎 Usage: /search <words>\n\n"
+                "Examples:\n"
+                "/search two sum\n"
+                "/search binary tree\n"
+                "Prefixes and small typos are fine (e.g. /search dijkstr, /search palindrom)."
+            )
+            return
+        
+        try:
+            index = await self.sheets.get_index()
+            search_index = await self.sheets.get_search_index(index)
+        except Exception as e:
+            logger.error(f"Error searching problems: {e}")
+            await update.message.reply_text("❌ Error searching problems. Please try again later.")
+            return
+        
+        positions = search_index.search(query, limit=self.SEARCH_RESULTS)
+        if not positions:
+            await update.message.reply_text(f"🔎 No problems match \"{query}\".")
+            return
+        
+        lines = [f"🔎 Results for \"{query}\":", ""]
+        for rank, position in enumerate(positions, start=1):
+            problem = index.problems[position]
+            lines.append(f"{rank}. {problem.title} ({problem.difficulty.capitalize()}, {problem.topic})")
+            lines.append(f"   {problem.url}")
+        await update.message.reply_text('\n'.join(lines), disable_web_page_preview=True)
+    
     # /add command conversation handlers
+    @timed('add')
     async def add_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Start the /add conversation."""
         user_id = update.effective_user.id
         conversation_data[user_id] = {}
+        self.store.save_conversation(user_id, conversation_data[user_id])
         
         await update.message.reply_text(
             "➕ Let's add a new problem!\n\n"
@@ -338,6 +491,7 @@ class Handlers:
         )
         return TITLE
     
+    @timed('add_title')
     async def add_title(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle title input."""
         user_id = update.effective_user.id
@@ -348,6 +502,7 @@ class Handlers:
             return TITLE
         
         conversation_data[user_id]['title'] = title
+        self.store.save_conversation(user_id, conversation_data[user_id])
         
         await update.message.reply_text(
             "✅ Title saved!\n\n"
@@ -356,19 +511,20 @@ class Handlers:
         )
         return DIFFICULTY
     
+    @timed('add_difficulty')
     async def add_difficulty(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle difficulty input."""
         user_id = update.effective_user.id
         difficulty = update.message.text.strip().lower()
         
-        valid_difficulties = ['easy', 'medium', 'hard']
-        if difficulty not in valid_difficulties:
+        if difficulty not in VALID_DIFFICULTIES:
             await update.message.reply_text(
-                f"❌ Invalid difficulty. Please use one of: {', '.join(valid_difficulties)}"
+                f"❌ Invalid difficulty. Please use one of: {', '.join(VALID_DIFFICULTIES)}"
             )
             return DIFFICULTY
         
         conversation_data[user_id]['difficulty'] = difficulty
+        self.store.save_conversation(user_id, conversation_data[user_id])
         
         await update.message.reply_text(
             "✅ Difficulty saved!\n\n"
@@ -377,6 +533,7 @@ class Handlers:
         )
         return TOPIC
     
+    @timed('add_topic')
     async def add_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle topic input."""
         user_id = update.effective_user.id
@@ -387,6 +544,7 @@ class Handlers:
             return TOPIC
         
         conversation_data[user_id]['topic'] = topic
+        self.store.save_conversation(user_id, conversation_data[user_id])
         
         await update.message.reply_text(
             "✅ Topic saved!\n\n"
@@ -395,6 +553,7 @@ class Handlers:
         )
         return URL
     
+    @timed('add_url')
     async def add_url(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle URL input and save the problem."""
         user_id = update.effective_user.id
@@ -405,22 +564,33 @@ class Handlers:
             return URL
         
         # Validate URL format (basic check)
-        if not (url.startswith('http://') or url.startswith('https://')):
+        if not is_valid_url(url):
             await update.message.reply_text(
                 "❌ Invalid URL format. Please provide a valid URL starting with http:// or https://"
             )
             return URL
         
+        # Links already in the catalog are rejected; a known title is only flagged
+        try:
+            index = await self.sheets.get_index()
+            duplicate = index.find_duplicate(conversation_data[user_id]['title'], url)
+        except Exception as e:
+            logger.error(f"Error checking for duplicate problems: {e}")
+            duplicate = None
+        if duplicate and duplicate[0].kind == 'url':
+            existing = duplicate[1]
+            await update.message.reply_text(
+                f"❌ This problem is already in the database: {existing.title}\n{existing.url}\n\n"
+                "Please send a different URL, or /cancel to stop."
+            )
+            return URL
+        
         conversation_data[user_id]['url'] = url
         
         # Create problem object
         data = conversation_data[user_id]
-        # Generate ID based on current problem count + timestamp for uniqueness
-        problem_count = len(self.sheets.get_all_problems())
-        problem_id = f"{problem_count + 1}_{int(time.time())}"
-        
         problem = Problem(
-            id=problem_id,
+            id=new_problem_id(),
             title=data['title'],
             difficulty=data['difficulty'],
             topic=data['topic'],
@@ -429,15 +599,22 @@ class Handlers:
         
         try:
             # Add to Google Sheets
-            self.sheets.add_problem(problem)
+            await self.sheets.add_problem(problem)
             
             # Clean up conversation data
             del conversation_data[user_id]
+            self.store.save_conversation(user_id, None)
             
             await update.message.reply_text(
                 f"✅ Problem added successfully!\n\n{problem}",
                 parse_mode='Markdown'
             )
+            if duplicate:
+                existing = duplicate[1]
+                await update.message.reply_text(
+                    f"⚠️ Possible duplicate: a problem with the same title is already in the database:\n"
+                    f"{existing.title}\n{existing.url}"
+                )
         except Exception as e:
             logger.error(f"Error adding problem: {e}")
             await update.message.reply_text(
@@ -445,18 +622,276 @@ class Handlers:
                 "Please try again later or contact the administrator."
             )
             del conversation_data[user_id]
+            self.store.save_conversation(user_id, None)
         
         return ConversationHandler.END
     
+    @timed('add_cancel')
     async def add_cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Cancel the /add conversation."""
         user_id = update.effective_user.id
         if user_id in conversation_data:
             del conversation_data[user_id]
+            self.store.save_conversation(user_id, None)
         
         await update.message.reply_text("❌ Problem addition cancelled.")
         return ConversationHandler.END
     
+    async def _can_manage_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+        """Whether the sender may change a group or channel's subscription.
+        
+        Channel posts come from channel admins; in groups the sender must be a
+        chat administrator or a bot admin.
+        """
+        chat = update.effective_chat
+        if chat.type == ChatType.CHANNEL:
+            return True
+        sender_chat = update.effective_message.sender_chat
+        if sender_chat is not None and sender_chat.id == chat.id:
+            # Anonymous admin posting as the group
+            return True
+        user = update.effective_user
+        if user is None:
+            return False
+        if self._is_admin(user.id):
+            return True
+        member = await context.bot.get_chat_member(chat.id, user.id)
+        return member.status in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    
+    @timed('subscribe')
+    async def subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /subscribe [HH:MM] - send this group or channel one shared daily problem."""
+        chat_id = update.effective_chat.id
+        message = update.effective_message
+        if not is_group_chat(chat_id):
+            await message.reply_text(
+                "ℹ️ /subscribe is for groups and channels. In a private chat you're already subscribed "
+                "after /start; use /settime to pick the time."
+            )
+            return
+        if not await self._can_manage_chat(update, context):
+            await message.reply_text("❌ Only chat administrators can manage the subscription.")
+            return
+        
+        schedule_time = None
+        if context.args:
+            try:
+                hour, minute = map(int, context.args[0].strip().split(':'))
+                if not (0 <= hour <= 23 and 0 <= minute <= 59):
+                    raise ValueError("Time out of range")
+            except ValueError:
+                await message.reply_text("❌ Invalid time format. Please use HH:MM, e.g. /subscribe 09:00")
+                return
+            schedule_time = f"{hour:02d}:{minute:02d}"
+        
+        prefs = user_prefs.get(chat_id)
+        if prefs is None:
+            prefs = user_prefs[chat_id] = UserPrefs(user_id=chat_id)
+        if schedule_time:
+            prefs.schedule_time = schedule_time
+        self.store.save_prefs(prefs)
+        if hasattr(self, 'scheduler') and self.scheduler:
+            self.scheduler.reschedule_user_job(chat_id, prefs.get_schedule_time())
+        
+        await message.reply_text(
+            f"✅ Subscribed! This chat will get one shared problem every day at *{prefs.get_schedule_time()}* IST.\n\n"
+            "Everyone can use the buttons to track their own progress. "
+            "Problems already sent here won't repeat. Use /unsubscribe to stop.",
+            parse_mode='Markdown'
+        )
+    
+    def _unsubscribe(self, chat_id: int) -> bool:
+        """Remove a group or channel's subscription; False if it had none."""
+        if user_prefs.pop(chat_id, None) is None:
+            return False
+        self.store.delete_prefs(chat_id)
+        self.planner.invalidate(chat_id)
+        if hasattr(self, 'scheduler') and self.scheduler:
+            self.scheduler.unschedule(chat_id)
+        return True
+    
+    def _migrate_chat(self, old_chat_id: int, new_chat_id: int) -> None:
+        """Move a group's subscription, slot and sent problems to its new chat ID."""
+        self.planner.invalidate(old_chat_id)
+        user_decks.pop(old_chat_id, None)
+        
+        completed = user_completed_problems.pop(old_chat_id, None)
+        if completed is not None:
+            moved = user_completed_problems.setdefault(new_chat_id, ProblemBitset())
+            for problem_id in completed:
+                moved.add(problem_id)
+                self.store.add_completed(new_chat_id, problem_id)
+        
+        recent = user_recent_problems.pop(old_chat_id, None)
+        if recent is not None:
+            user_recent_problems[new_chat_id] = recent
+            self.store.save_recent(new_chat_id, list(recent))
+        # The old ID is dead: don't leave its rows to be loaded again on restart
+        self.store.delete_progress(old_chat_id)
+        
+        prefs = user_prefs.pop(old_chat_id, None)
+        if prefs is None:
+            return
+        self.store.delete_prefs(old_chat_id)
+        prefs.user_id = new_chat_id
+        user_prefs[new_chat_id] = prefs
+        self.store.save_prefs(prefs)
+        if hasattr(self, 'scheduler') and self.scheduler:
+            self.scheduler.unschedule(old_chat_id)
+            self.scheduler.reschedule_user_job(new_chat_id, prefs.get_schedule_time())
+    
+    @timed('unsubscribe')
+    async def unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /unsubscribe - stop this group or channel's daily problem."""
+        chat_id = update.effective_chat.id
+        message = update.effective_message
+        if not is_group_chat(chat_id):
+            await message.reply_text("ℹ️ /unsubscribe is for groups and channels.")
+            return
+        if not await self._can_manage_chat(update, context):
+            await message.reply_text("❌ Only chat administrators can manage the subscription.")
+            return
+        
+        if self._unsubscribe(chat_id):
+            await message.reply_text("👋 Unsubscribed. This chat won't get daily problems anymore.")
+        else:
+            await message.reply_text("ℹ️ This chat isn't subscribed. Use /subscribe to start.")
+    
+    def _is_admin(self, user_id: int) -> bool:
+        """Whether a user may run admin commands."""
+        return user_id in Config.ADMIN_USER_IDS
+    
+    @timed('import')
+    async def import_problems(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /import - bulk add problems from an uploaded CSV or JSONL file.
+        
+        The file is sent with /import as its caption, or /import is sent as a
+        reply to the file.
+        """
+        user_id = update.effective_user.id
+        if not self._is_admin(user_id):
+            await update.message.reply_text("❌ This command is only available to administrators.")
+            return
+        
+        message = update.message
+        document = message.document
+        if document is None and message.reply_to_message:
+            document = message.reply_to_message.document
+        if document is None:
+            await update.message.reply_text(
+                "📥 Send a CSV or JSONL file with the caption /import, or reply /import to one.\n\n"
+                "Columns: title, difficulty, topic, url (id is optional)"
+            )
+            return
+        
+        file_format = detect_format(document.file_name)
+        if file_format is None:
+            await update.message.reply_text("❌ Unsupported file type. Please upload a .csv or .jsonl file.")
+            return
+        
+        status = await update.message.reply_text(f"📥 Importing {document.file_name}...")
+        
+        async def write_batch(problems):
+            results = await asyncio.gather(*self.sheets.add_problems(problems), return_exceptions=True)
+            return sum(1 for result in results if result is True)
+        
+        async def progress(report):
+            # Progress is cosmetic: a failed edit (flood limit, deleted message) must not stop the import
+            try:
+                await status.edit_text(
+                    f"📥 Importing {document.file_name}...\n"
+                    f"Rows read: {report.rows} | Added: {report.added} | "
+                    f"Duplicates: {report.duplicates} | Invalid: {report.invalid}"
+                )
+            except Exception as e:
+                logger.warning(f"Could not update import progress: {e}")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, f"import.{file_format}")
+            try:
+                telegram_file = await document.get_file()
+                await telegram_file.download_to_drive(path)
+                importer = ProblemImporter(await self.sheets.get_index(), write_batch)
+                report = await importer.run(iter_rows(path, file_format), progress)
+            except Exception as e:
+                logger.error(f"Error importing problems: {e}")
+                await update.message.reply_text(f"❌ Import failed: {str(e)}")
+                return
+        
+        logger.info(f"Import by {user_id}: {report.added} added, {report.duplicates} duplicates, {report.invalid} invalid")
+        await update.message.reply_text(report.summary())
+    
+    def state_for_profiling(self) -> Dict[str, object]:
+        """In-memory state dicts sized by /profile memory."""
+        return {
+            'user_prefs': user_prefs,
+            'user_completed_problems': user_completed_problems,
+            'user_recent_problems': user_recent_problems,
+            'user_decks': user_decks,
+            'conversation_data': conversation_data,
+        }
+    
+    @timed('profile')
+    async def profile(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle /profile - start/stop a CPU profile or take a memory snapshot.
+        
+        Usage: /profile start [seconds] [sample|cprofile], /profile stop,
+        /profile memory, /profile memory stop
+        """
+        user_id = update.effective_user.id
+        if not self._is_admin(user_id):
+            await update.message.reply_text("❌ This command is only available to administrators.")
+            return
+        
+        args = [arg.lower() for arg in context.args or []]
+        action = args[0] if args else 'status'
+        
+        if action == 'start':
+            seconds = None
+            mode = 'sample'
+            for arg in args[1:]:
+                if arg in MODES:
+                    mode = arg
+                else:
+                    try:
+                        seconds = float(arg)
+                    except ValueError:
+                        await update.message.reply_text(f"❌ Invalid duration: {arg}")
+                        return
+            
+            async def report(text: str) -> None:
+                await context.bot.send_message(chat_id=update.effective_chat.id, text=f"📊 {text}")
+            
+            try:
+                seconds = self.profiler.start(seconds, mode, on_finish=report)
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {str(e)}")
+                return
+            await update.message.reply_text(
+                f"📊 Started {mode} profile for {seconds:.0f}s. Use /profile stop to end it early."
+            )
+        elif action == 'stop':
+            report = self.profiler.stop()
+            await update.message.reply_text(f"📊 {report}" if report else "ℹ️ No profile is running.")
+        elif action == 'memory':
+            if args[1:2] == ['stop']:
+                stopped = self.profiler.stop_memory()
+                await update.message.reply_text(
+                    "📊 Stopped memory tracing." if stopped else "ℹ️ Memory tracing is not running."
+                )
+                return
+            report = await self.profiler.snapshot_memory(self.state_for_profiling())
+            await update.message.reply_text(f"📊 {report}")
+        else:
+            status = f"a {self.profiler.mode} profile is running" if self.profiler.running else "no profile is running"
+            await update.message.reply_text(
+                f"📊 Profiler: {status}.\n\n"
+                "/profile start [seconds] [sample|cprofile]\n"
+                "/profile stop\n"
+                "/profile memory\n"
+                "/profile memory stop"
+            )
+    
     def get_conversation_handler(self) -> ConversationHandler:
         """Get the conversation handler for /add command."""
         return ConversationHandler(
@@ -470,65 +905,99 @@ class Handlers:
             fallbacks=[CommandHandler("cancel", self.add_cancel)],
         )
     
-    async def send_daily_problem_to_user(self, bot, user_id: int) -> None:
-        """Send daily problem to a specific user.
+    async def send_daily_problem_to_user(self, bot, user_id: int) -> bool:
+        """Send daily problem to a specific user or subscribed chat.
         
         Args:
             bot: Bot instance
-            user_id: Telegram user ID
+            user_id: Telegram user ID, or the chat ID of a subscribed group or channel
+        
+        Returns:
+            True if a message was delivered
         """
         try:
             # Initialize user tracking if needed
             if user_id not in user_completed_problems:
-                user_completed_problems[user_id] = set()
+                user_completed_problems[user_id] = ProblemBitset()
             if user_id not in user_recent_problems:
-                user_recent_problems[user_id] = []
+                user_recent_problems[user_id] = RecentWindow()
             
             # Get user's difficulty preference
             difficulty = None
             if user_id in user_prefs:
                 difficulty = user_prefs[user_id].get_difficulty()
             
-            excluded_ids = self._get_excluded_problem_ids(user_id)
-            problem = self.sheets.get_random_problem(difficulty, exclude_ids=excluded_ids)
+            # Use the pick precomputed off-peak, or pick live if it went stale
+            problem = self.planner.take(user_id, await self.sheets.get_index())
+            if problem is None:
+                problem = await self._pick_problem(user_id, difficulty)
             
             if problem:
-                # Track this problem as recently sent
-                user_recent_problems[user_id].append(problem.id)
-                # Keep only last 20 recent problems
-                if len(user_recent_problems[user_id]) > 20:
-                    user_recent_problems[user_id] = user_recent_problems[user_id][-20:]
-                
-                message = (
-                    "🌅 *Good Morning!*\n\n"
-                    "Here's your daily DSA problem:\n\n"
-                    f"{problem}\n\n"
-                    "💪 Have a great day of coding!"
-                )
-                keyboard = self._create_problem_keyboard(problem.id)
-                await bot.send_message(
+                message, keyboard = self._render_problem(problem, 'daily')
+                await self.delivery.send_message(
+                    bot,
                     chat_id=user_id,
                     text=message,
                     parse_mode='Markdown',
                     reply_markup=keyboard
                 )
+                # Only count the problem as seen once it actually arrived
+                self._record_sent(user_id, problem)
+                if is_group_chat(user_id):
+                    # Groups never get the same problem twice
+                    user_completed_problems[user_id].add(problem.id)
+                    self.store.add_completed(user_id, problem.id)
+                return True
             else:
                 logger.warning(f"No new problems available for user {user_id}")
+                if is_group_chat(user_id):
+                    text = (
+                        "🌅 *Good Morning!*\n\n"
+                        "This chat has seen every problem in the catalog! 🎉\n\n"
+                        "Add more problems with /add"
+                    )
+                else:
+                    text = (
+                        "🌅 *Good Morning!*\n\n"
+                        "You've completed all available problems in your difficulty range! 🎉\n\n"
+                        "Try changing your difficulty with /level or add more problems with /add"
+                    )
                 # Send a message to user
                 try:
-                    await bot.send_message(
+                    await self.delivery.send_message(
+                        bot,
                         chat_id=user_id,
-                        text=(
-                            "🌅 *Good Morning!*\n\n"
-                            "You've completed all available problems in your difficulty range! 🎉\n\n"
-                            "Try changing your difficulty with /level or add more problems with /add"
-                        ),
+                        text=text,
                         parse_mode='Markdown'
                     )
+                    return True
+                except (ChatMigrated, Forbidden):
+                    raise
                 except Exception as e:
                     logger.error(f"Error sending no-problems message to user {user_id}: {e}")
+        except ChatMigrated as e:
+            # The group became a supergroup: follow it to its new ID and deliver there
+            logger.info(f"Chat {user_id} migrated to {e.new_chat_id}")
+            self._migrate_chat(user_id, e.new_chat_id)
+            return await self.send_daily_problem_to_user(bot, e.new_chat_id)
+        except Forbidden as e:
+            if is_group_chat(user_id):
+                # Removed from the group or channel: stop sending there
+                logger.warning(f"Unsubscribing chat {user_id} after delivery was refused: {e}")
+                self._unsubscribe(user_id)
+            else:
+                logger.error(f"Error sending daily problem to user {user_id}: {e}")
         except Exception as e:
             logger.error(f"Error sending daily problem to user {user_id}: {e}")
+        return False
+    
+    async def precompute_daily_problems(self) -> None:
+        """Pick every user's next daily problem ahead of the scheduled sends."""
+        try:
+            index = await self.sheets.get_index()
+            await self.planner.precompute(index)
+        except Exception as e:
+            logger.error(f"Error precomputing daily problems: {e}")
     
     async def send_daily_problem(self, context_or_bot) -> None:
         """Send daily problem to all registered users (legacy method, kept for compatibility).
@@ -549,5 +1018,7 @@ class Handlers:
             logger.info("No users to send daily problem to")
             return
         
-        for user_id in users:
-            await self.send_daily_problem_to_user(bot, user_id)
+        await self.delivery.fan_out(
+            users,
+            lambda user_id: self.send_daily_problem_to_user(bot, user_id)
+        )
@@ -0,0 +1,214 @@
+"""Streaming bulk import of problems from CSV or JSONL files."""
+
+import asyncio
+import csv
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import Config
+from duplicates import title_key, url_key
+from models import Problem, new_problem_id, validate_problem_fields
+from problem_index import ProblemIndex
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('id', 'title', 'difficulty', 'topic', 'url')
+
+
+def iter_rows(path: str, file_format: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (line number, row) pairs from a CSV or JSONL file one at a time.
+
+    CSV files need a header row naming the columns; JSONL files hold one JSON
+    object per line. Lines that cannot be parsed yield an empty row.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {k.strip().lower(): v for k, v in row.items() if k}
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_num, row if isinstance(row, dict) else {}
+
+
+def detect_format(file_name: str) -> Optional[str]:
+    """Pick the parser from a file name ('csv', 'jsonl' or None if unsupported)."""
+    name = (file_name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    return None
+
+
+@dataclass
+class ImportReport:
+    """Outcome of a bulk import."""
+    rows: int = 0
+    added: int = 0
+    duplicates: int = 0
+    flagged: int = 0
+    invalid: int = 0
+    failed: int = 0
+    error_counts: Counter = field(default_factory=Counter)
+    error_samples: List[str] = field(default_factory=list)
+    flagged_samples: List[str] = field(default_factory=list)
+
+    # Per-row error lines kept for the summary
+    MAX_SAMPLES = 10
+
+    def record_error(self, line_num: int, message: str) -> None:
+        self.invalid += 1
+        self.error_counts[message] += 1
+        if len(self.error_samples) < self.MAX_SAMPLES:
+            self.error_samples.append(f"Line {line_num}: {message}")
+
+    def record_flagged(self, line_num: int, title: str, existing_url: str) -> None:
+        """Note a row added despite sharing its title with another problem."""
+        self.flagged += 1
+        if len(self.flagged_samples) < self.MAX_SAMPLES:
+            self.flagged_samples.append(f"Line {line_num}: {title} (like {existing_url})")
+
+    def summary(self) -> str:
+        """Human-readable summary for the admin."""
+        lines = [
+            f"📥 Import finished: {self.rows} rows",
+            f"✅ Added: {self.added}",
+            f"🔁 Duplicates skipped: {self.duplicates}",
+            f"⚠️ Invalid rows: {self.invalid}",
+        ]
+        if self.flagged:
+            lines.append(f"🔎 Added with a title already in the catalog: {self.flagged}")
+        if self.failed:
+            lines.append(f"❌ Failed to write: {self.failed}")
+        if self.error_counts:
+            lines.append("\nErrors:")
+            lines.extend(f"• {message} ({count})" for message, count in self.error_counts.most_common(5))
+            lines.append("\nFirst errors:")
+            lines.extend(self.error_samples)
+        if self.flagged_samples:
+            lines.append("\nPossible duplicates (same title, different URL):")
+            lines.extend(self.flagged_samples)
+        return "\n".join(lines)
+
+
+class ProblemImporter:
+    """Validates, de-duplicates and writes streamed rows in large batches.
+
+    Only one batch of rows is held in memory at a time, plus the keys of the
+    rows imported so far. Rows are checked against the catalog through the
+    snapshot's duplicate index instead of a scan. A row with a URL already in
+    the catalog (or earlier in the file) is skipped; one with a known title
+    but a new URL is added and flagged in the report.
+    """
+
+    def __init__(self, index: ProblemIndex,
+                 write_batch: Callable[[List[Problem]], Awaitable[int]],
+                 batch_size: Optional[int] = None):
+        """Initialize the importer.
+
+        Args:
+            index: Index of the current catalog snapshot (for duplicate checks)
+            write_batch: Coroutine function writing problems, returning how many committed
+            batch_size: Rows per write (defaults to Config)
+        """
+        self.index = index
+        self.write_batch = write_batch
+        self.batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+        # Keys of rows imported so far; the catalog's are in index.duplicates
+        self._seen_urls: Set[str] = set()
+        self._seen_titles: Dict[str, str] = {}
+        self._seen_ids: Set[str] = set()
+
+    def parse_row(self, line_num: int, row: Dict[str, str], report: ImportReport) -> Optional[Problem]:
+        """Turn a raw row into a Problem, recording why it was rejected if not."""
+        if not row:
+            report.record_error(line_num, "Could not parse row")
+            return None
+
+        values = {name: str(row.get(name) or '').strip() for name in FIELDS}
+        values['difficulty'] = values['difficulty'].lower()
+        error = validate_problem_fields(values['title'], values['difficulty'], values['topic'], values['url'])
+        if error:
+            report.record_error(line_num, error)
+            return None
+
+        key = url_key(values['url'])
+        problem_id = values['id']
+        if (key in self._seen_urls or key in self.index.duplicates.by_url
+                or (problem_id and (problem_id in self._seen_ids or problem_id in self.index.positions))):
+            report.duplicates += 1
+            return None
+        self._seen_urls.add(key)
+
+        title = title_key(values['title'])
+        if title:
+            position = self.index.duplicates.by_title.get(title)
+            existing = self.index.problems[position].url if position is not None else self._seen_titles.get(title)
+            if existing:
+                report.record_flagged(line_num, values['title'], existing)
+            else:
+                self._seen_titles[title] = values['url']
+
+        problem_id = problem_id or new_problem_id()
+        self._seen_ids.add(problem_id)
+        return Problem(
+            id=problem_id,
+            title=values['title'],
+            difficulty=values['difficulty'],
+            topic=values['topic'],
+            url=values['url']
+        )
+
+    def _read_batch(self, rows: Iterator[Tuple[int, Dict[str, str]]],
+                    report: ImportReport) -> Tuple[List[Problem], bool]:
+        """Parse rows until a full batch is ready (runs on an executor thread).
+
+        Returns:
+            The batch and whether the rows ran out
+        """
+        batch: List[Problem] = []
+        for line_num, row in rows:
+            report.rows += 1
+            problem = self.parse_row(line_num, row, report)
+            if problem:
+                batch.append(problem)
+            if len(batch) >= self.batch_size:
+                return batch, False
+        return batch, True
+
+    async def run(self, rows: Iterator[Tuple[int, Dict[str, str]]],
+                  progress: Optional[Callable[[ImportReport], Awaitable[None]]] = None) -> ImportReport:
+        """Import all rows, reporting progress after every written batch.
+
+        Reading and validating the file happen off the event loop, one batch
+        at a time, so a large upload does not stall other updates.
+        """
+        loop = asyncio.get_running_loop()
+        report = ImportReport()
+        while True:
+            batch, done = await loop.run_in_executor(None, self._read_batch, rows, report)
+            if batch:
+                await self._write(batch, report)
+            if done:
+                return report
+            if progress:
+                await progress(report)
+
+    async def _write(self, batch: List[Problem], report: ImportReport) -> None:
+        try:
+            written = await self.write_batch(batch)
+        except Exception as e:
+            logger.error(f"Error importing batch of {len(batch)} problems: {e}")
+            written = 0
+        report.added += written
+        report.failed += len(batch) - written
@@ -0,0 +1,198 @@
+"""Logging pipeline: records are queued and written by a background thread.
+
+Handlers on the event loop only put records on a queue; formatting, file
+writes and size-based rotation happen on the listener thread. Repetitive
+info lines (one per user, such as scheduling messages) are sampled before
+they are queued.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Numbers (user IDs, times, counts) are ignored when grouping similar lines
+_NUMBERS = re.compile(r'\d+')
+
+
+class RepetitionSampler(logging.Filter):
+    """Lets through the first `burst` similar info lines per interval.
+
+    Lines are similar when they only differ in their numbers. The next line
+    let through after a quiet period reports how many were suppressed.
+    Warnings and errors are never sampled.
+    """
+
+    # Distinct line shapes tracked before the table is reset
+    MAX_KEYS = 10000
+
+    def __init__(self, burst: int, interval: float):
+        """Initialize the sampler.
+
+        Args:
+            burst: Similar lines allowed per interval
+            interval: Window length in seconds
+        """
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.suppressed = 0
+        # key -> [window start, lines let through, lines suppressed]
+        self._windows: Dict[tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        message = record.getMessage()
+        key = (record.name, _NUMBERS.sub('#', message))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                if len(self._windows) >= self.MAX_KEYS:
+                    self._windows.clear()
+                self._windows[key] = [now, 1, 0]
+                return True
+            if now - window[0] >= self.interval:
+                skipped = window[2]
+                window[:] = [now, 1, 0]
+                if skipped:
+                    record.msg = f"{message} ({skipped} similar messages suppressed)"
+                    record.args = None
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting to the listener and drops when full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may change later) but leave formatting to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop waits for room in a full queue instead of failing."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def __init__(self, static_fields: Optional[Dict] = None):
+        """Initialize with fields added to every line (such as the shard)."""
+        super().__init__()
+        self.static_fields = static_fields or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(self.static_fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def log_path(path: str, shard_index: int) -> str:
+    """Per-shard log file, so worker processes never rotate each other's file."""
+    if shard_index < 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_index}{ext}"
+
+
+_listener: Optional[DrainingQueueListener] = None
+queue_handler: Optional[NonBlockingQueueHandler] = None
+sampler: Optional[RepetitionSampler] = None
+
+
+def configure_logging() -> None:
+    """Route the root logger through a queue to file or stderr handlers.
+
+    Uses LOG_FILE (rotated at LOG_MAX_BYTES, keeping LOG_KEEP old files) or
+    stderr when unset, LOG_FORMAT ("text" or "json"), LOG_LEVEL and the
+    LOG_SAMPLE_* settings. Safe to call more than once.
+    """
+    global _listener, queue_handler, sampler
+    if _listener is not None:
+        return
+
+    if Config.LOG_FORMAT == 'json':
+        formatter: logging.Formatter = JsonFormatter(
+            {'shard': Config.SHARD_INDEX} if Config.SHARD_INDEX >= 0 else None
+        )
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    if Config.LOG_FILE:
+        path = log_path(Config.LOG_FILE, Config.SHARD_INDEX)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        output: logging.Handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_KEEP, encoding='utf-8'
+        )
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(formatter)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+    if Config.LOG_SAMPLE_BURST > 0:
+        sampler = RepetitionSampler(Config.LOG_SAMPLE_BURST, Config.LOG_SAMPLE_INTERVAL)
+        queue_handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(Config.LOG_LEVEL)
+    # Per-request HTTP lines from the Telegram client would flood the log
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = DrainingQueueListener(queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
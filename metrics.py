@@ -0,0 +1,268 @@
+"""In-process metrics exposed in Prometheus text format.
+
+Counters and histograms are plain in-memory numbers updated under a lock,
+so recording is a few hundred nanoseconds and safe from executor threads.
+Callback metrics read existing counters (delivery, caches) only when
+scraped.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast cache hits to slow Sheets calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Lag buckets in seconds, from on-time to several minutes late
+LAG_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for a named metric with optional labels."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (name suffix, labels, value) for every series."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield '', _format_labels(self.labelnames, labels), value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last)], sum
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observe the duration of the enclosed block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield '_bucket', _format_labels(self.labelnames, labels, le), cumulative
+            yield '_sum', _format_labels(self.labelnames, labels), total
+            yield '_count', _format_labels(self.labelnames, labels), cumulative
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose value is read from a callable when scraped."""
+
+    def __init__(self, name: str, documentation: str, func: Callable[[], Optional[float]],
+                 kind: str = 'gauge'):
+        super().__init__(name, documentation)
+        self.func = func
+        self.kind = kind
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.error(f"Error collecting metric {self.name}: {e}")
+            return
+        if value is not None:
+            yield '', '', value
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, replacing any earlier one with the same name."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def gauge_func(self, name: str, documentation: str, func: Callable[[], Optional[float]]) -> None:
+        """Register a gauge read from func at scrape time (None skips it)."""
+        self.register(CallbackMetric(name, documentation, func, 'gauge'))
+
+    def counter_func(self, name: str, documentation: str, func: Callable[[], Optional[float]]) -> None:
+        """Register a counter read from func at scrape time."""
+        self.register(CallbackMetric(name, documentation, func, 'counter'))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+handler_latency = REGISTRY.register(Histogram(
+    'dsa_bot_handler_seconds', 'Time spent in each command and callback handler.', ['handler']
+))
+handler_errors = REGISTRY.register(Counter(
+    'dsa_bot_handler_errors_total', 'Handler calls that raised an exception.', ['handler']
+))
+sheets_calls = REGISTRY.register(Counter(
+    'dsa_bot_sheets_calls_total', 'Google Sheets API calls by method and outcome.', ['method', 'outcome']
+))
+sheets_latency = REGISTRY.register(Histogram(
+    'dsa_bot_sheets_call_seconds', 'Google Sheets API call latency by method.', ['method']
+))
+scheduler_lag = REGISTRY.register(Histogram(
+    'dsa_bot_scheduler_lag_seconds', 'Dispatcher fire time minus the slot time it dispatched.',
+    buckets=LAG_BUCKETS
+))
+delivery_lag = REGISTRY.register(Histogram(
+    'dsa_bot_delivery_lag_seconds', 'Daily problem delivery time minus its scheduled time.',
+    buckets=LAG_BUCKETS
+))
+
+
+def timed(name: str):
+    """Decorator recording an async handler's latency and errors under a name."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(name)
+                raise
+            finally:
+                handler_latency.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def sheets_call(method: str):
+    """Record count, outcome and latency of one Google Sheets API call."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        sheets_latency.observe(time.perf_counter() - started, method)
+        sheets_calls.inc(method, outcome)
+
+
+class MetricsServer:
+    """Tiny HTTP server answering GET /metrics with the registry contents."""
+
+    def __init__(self, registry: Registry = REGISTRY, listen: Optional[str] = None,
+                 port: Optional[int] = None):
+        """Initialize the server (address defaults to Config)."""
+        self.registry = registry
+        self.listen = listen or Config.METRICS_LISTEN
+        self.port = port if port is not None else Config.METRICS_PORT
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info(f"Metrics available at http://{self.listen}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = self.registry.render().encode()
+            else:
+                status = '404 Not Found'
+                body = b'Not found\n'
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -1,10 +1,40 @@
 """Data models for the DSA Telegram bot."""
 
+import secrets
+import time
 from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+VALID_DIFFICULTIES = ['easy', 'medium', 'hard']
+
+
+def is_valid_url(url: str) -> bool:
+    """Basic URL format check used when adding problems."""
+    return url.startswith('http://') or url.startswith('https://')
+
+
+def validate_problem_fields(title: str, difficulty: str, topic: str, url: str) -> Optional[str]:
+    """Check problem fields with the /add rules; returns an error message or None."""
+    if not title:
+        return "Title cannot be empty"
+    if difficulty not in VALID_DIFFICULTIES:
+        return f"Invalid difficulty. Please use one of: {', '.join(VALID_DIFFICULTIES)}"
+    if not topic:
+        return "Topic cannot be empty"
+    if not url:
+        return "URL cannot be empty"
+    if not is_valid_url(url):
+        return "Invalid URL format. Please provide a valid URL starting with http:// or https://"
+    return None
+
+
+def new_problem_id() -> str:
+    """Generate a unique problem ID without consulting the sheet."""
+    return f"{int(time.time() * 1000)}_{secrets.token_hex(3)}"
+
+
+@dataclass(slots=True)
 class Problem:
     """Represents a DSA problem."""
     id: str
@@ -23,12 +53,13 @@ class Problem:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class UserPrefs:
     """User preferences stored in memory."""
     user_id: int
     difficulty: Optional[str] = None  # 'easy', 'medium', 'hard', or None for default
     schedule_time: Optional[str] = None  # Time in HH:MM format (24-hour), None for default
+    topic: Optional[str] = None  # Lowercase catalog topic, or None for any topic
 
     def get_difficulty(self) -> Optional[str]:
         """Get user's preferred difficulty or None for default."""
@@ -36,4 +67,12 @@ class UserPrefs:
     
     def get_schedule_time(self) -> str:
         """Get user's preferred schedule time or default."""
-        return self.schedule_time if self.schedule_time else "11:00"
\ No newline at end of file
+        return self.schedule_time if self.schedule_time else "11:00"
+
+@dataclass(slots=True)
+class Assignment:
+    """A problem picked ahead of time for a user's next daily send."""
+    problem_id: str
+    difficulty: Optional[str]
+    topic: Optional[str]
+    bucket: str  # Deck bucket the problem was peeked from
@@ -0,0 +1,128 @@
+"""Off-peak precomputation of each user's next daily problem."""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from deck import UserDecks
+from models import Assignment, Problem, UserPrefs
+from problem_index import ProblemIndex
+from progress import ProblemBitset, RecentWindow
+from storage import MemoryStateStore, StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class DailyPlanner:
+    """Picks every user's next daily problem in an off-peak batch.
+
+    Picks are peeked from the user's deck, not dealt, so a pick that goes
+    stale (the user changed /level or /topic, discarded the problem or got it via
+    /today in the meantime) is simply dropped and the scheduled send falls
+    back to picking live. Picks are persisted through the state store, so a
+    restart after the batch keeps them.
+    """
+
+    # Longest stretch of planning before yielding to the event loop (seconds)
+    SLICE_SECONDS = 0.02
+
+    def __init__(self, user_prefs: Dict[int, UserPrefs], completed: Dict[int, ProblemBitset],
+                 recent: Dict[int, RecentWindow], decks: Dict[int, UserDecks],
+                 store: Optional[StateStore] = None):
+        """Initialize with the handlers' per-user state and state store."""
+        self.user_prefs = user_prefs
+        self.completed = completed
+        self.recent = recent
+        self.decks = decks
+        self.store = store if store is not None else MemoryStateStore()
+        self.assignments: Dict[int, Assignment] = {}
+
+    def _decks_for(self, user_id: int) -> UserDecks:
+        decks = self.decks.get(user_id)
+        if decks is None:
+            decks = self.decks[user_id] = UserDecks(user_id)
+        return decks
+
+    def _difficulty(self, user_id: int) -> Optional[str]:
+        prefs = self.user_prefs.get(user_id)
+        return prefs.get_difficulty() if prefs else None
+
+    def _topic(self, user_id: int) -> Optional[str]:
+        prefs = self.user_prefs.get(user_id)
+        return prefs.topic if prefs else None
+
+    def plan_user(self, user_id: int, index: ProblemIndex) -> Optional[Assignment]:
+        """Pick and store the next daily problem for one user."""
+        difficulty = self._difficulty(user_id)
+        topic = self._topic(user_id)
+        picked = self._decks_for(user_id).peek(
+            index,
+            difficulty,
+            self.completed.get(user_id, ()),
+            self.recent.get(user_id, ()),
+            topic
+        )
+        if picked is None:
+            self.invalidate(user_id)
+            return None
+
+        bucket, problem = picked
+        assignment = Assignment(problem.id, difficulty, topic, bucket)
+        self.assignments[user_id] = assignment
+        self.store.save_assignment(user_id, assignment)
+        return assignment
+
+    async def precompute(self, index: ProblemIndex, user_ids: Optional[Iterable[int]] = None) -> int:
+        """Plan the next daily problem for many users in short time slices.
+
+        Args:
+            index: Index of the current catalog snapshot
+            user_ids: Users to plan for (defaults to all known users)
+
+        Returns:
+            Number of users that received an assignment
+        """
+        started = time.time()
+        users: List[int] = list(user_ids if user_ids is not None else self.user_prefs.keys())
+        planned = 0
+        slice_started = time.perf_counter()
+        for user_id in users:
+            if self.plan_user(user_id, index):
+                planned += 1
+            # Let updates and callbacks run between slices
+            if time.perf_counter() - slice_started >= self.SLICE_SECONDS:
+                await asyncio.sleep(0)
+                slice_started = time.perf_counter()
+
+        logger.info(f"Precomputed daily problems for {planned}/{len(users)} users in {time.time() - started:.1f}s")
+        return planned
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's precomputed pick."""
+        if self.assignments.pop(user_id, None) is not None:
+            self.store.save_assignment(user_id, None)
+
+    def take(self, user_id: int, index: ProblemIndex) -> Optional[Problem]:
+        """Consume a user's precomputed pick if it is still valid.
+
+        Returns None when there is no pick or it went stale, in which case
+        the caller picks live.
+        """
+        assignment = self.assignments.pop(user_id, None)
+        if assignment is None:
+            return None
+        self.store.save_assignment(user_id, None)
+
+        if assignment.difficulty != self._difficulty(user_id) or assignment.topic != self._topic(user_id):
+            return None
+        problem_id = assignment.problem_id
+        if problem_id in self.completed.get(user_id, ()) or problem_id in self.recent.get(user_id, ()):
+            return None
+        problem = index.get(problem_id)
+        if problem is None:
+            return None
+
+        # Deal it from the deck so the live path won't offer it again
+        self._decks_for(user_id).commit(index, assignment.bucket, problem_id)
+        return problem
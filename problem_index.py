@@ -0,0 +1,183 @@
+"""Indexed random problem selection over a catalog snapshot."""
+
+import random
+import threading
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+from duplicates import Duplicate, DuplicateIndex
+from models import Problem
+from progress import interner
+from search import SearchIndex
+
+
+class ProblemIndex:
+    """Random-access index over the problems of one catalog snapshot.
+
+    Problems are addressed by dense integer positions (their order in the
+    snapshot) and bucketed by difficulty and topic, so a random pick never
+    has to rebuild filtered lists of the whole catalog.
+    """
+
+    # Random draws tried before falling back to scanning a bucket
+    REJECTION_ATTEMPTS = 16
+
+    def __init__(self, problems: List[Problem], lineage: Optional[object] = None):
+        """Build the index for a list of problems.
+
+        Args:
+            problems: Problems in catalog (sheet row) order
+            lineage: Token shared with an earlier index whose problems are a
+                prefix of these, i.e. the catalog has only been appended to
+        """
+        self.problems = problems
+        self.lineage = lineage if lineage is not None else object()
+        self.positions: Dict[str, int] = {}
+        self.by_difficulty: Dict[str, List[int]] = {}
+        self.by_topic: Dict[str, List[int]] = {}
+        self.all_positions = range(len(problems))
+        self._filtered: Dict[Tuple[str, str], List[int]] = {}
+        self._search: Optional[SearchIndex] = None
+        self._search_base: Optional[Tuple['ProblemIndex', List[Problem]]] = None
+        self._search_lock = threading.Lock()
+        self.duplicates = DuplicateIndex(problems)
+
+        for position, problem in enumerate(problems):
+            # Number IDs in catalog order so per-user bitsets stay dense
+            interner.intern(problem.id)
+            # Keep the first row if the sheet contains a duplicate ID
+            self.positions.setdefault(problem.id, position)
+            self.by_difficulty.setdefault(problem.difficulty, []).append(position)
+            self.by_topic.setdefault(problem.topic.lower(), []).append(position)
+
+    def extended(self, new_problems: List[Problem]) -> 'ProblemIndex':
+        """Build the index for this catalog plus appended rows.
+
+        Copies the existing buckets instead of re-indexing every problem, and
+        keeps the lineage so per-user decks stay valid.
+        """
+        index = ProblemIndex.__new__(ProblemIndex)
+        index.problems = self.problems + new_problems
+        index.lineage = self.lineage
+        index.positions = dict(self.positions)
+        index.by_difficulty = {key: list(bucket) for key, bucket in self.by_difficulty.items()}
+        index.by_topic = {key: list(bucket) for key, bucket in self.by_topic.items()}
+        index.all_positions = range(len(index.problems))
+        index._filtered = {}
+        index._search = None
+        # Search is built on first use, from this index's if it has one by then
+        index._search_base = (self, new_problems)
+        index._search_lock = threading.Lock()
+        index.duplicates = self.duplicates.extended(new_problems, len(self.problems))
+
+        for position, problem in enumerate(new_problems, start=len(self.problems)):
+            interner.intern(problem.id)
+            index.positions.setdefault(problem.id, position)
+            index.by_difficulty.setdefault(problem.difficulty, []).append(position)
+            index.by_topic.setdefault(problem.topic.lower(), []).append(position)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.problems)
+
+    def extends(self, other: 'ProblemIndex') -> bool:
+        """Whether this catalog is the other one with only new rows appended."""
+        if len(self.problems) < len(other.problems):
+            return False
+        return all(
+            a.id == b.id and a.difficulty == b.difficulty
+            for a, b in zip(self.problems, other.problems)
+        )
+
+    def get(self, problem_id: str) -> Optional[Problem]:
+        """Look up a problem by ID."""
+        position = self.positions.get(problem_id)
+        return self.problems[position] if position is not None else None
+
+    def find_duplicate(self, title: str, url: str) -> Optional[Tuple[Duplicate, Problem]]:
+        """The catalog problem a new one would duplicate (same URL, else same title), if any."""
+        duplicate = self.duplicates.find(title, url)
+        if duplicate is None:
+            return None
+        return duplicate, self.problems[duplicate.position]
+
+    def bucket(self, difficulty: Optional[str] = None) -> Sequence[int]:
+        """Positions of problems with the given difficulty (all problems if None)."""
+        if not difficulty:
+            return self.all_positions
+        return self.by_difficulty.get(difficulty.lower(), [])
+
+    def topic_bucket(self, topic: str, difficulty: Optional[str] = None) -> Sequence[int]:
+        """Positions of problems with the given topic (case-insensitive), optionally of one difficulty."""
+        topic = topic.lower()
+        if not difficulty:
+            return self.by_topic.get(topic, [])
+        key = (topic, difficulty.lower())
+        bucket = self._filtered.get(key)
+        if bucket is None:
+            # Positions stay in catalog order, so appended rows only ever extend the bucket
+            bucket = self._filtered[key] = [
+                position for position in self.by_topic.get(topic, [])
+                if self.problems[position].difficulty == key[1]
+            ]
+        return bucket
+
+    def has_search_index(self) -> bool:
+        return self._search is not None
+
+    def search_index(self) -> SearchIndex:
+        """Full-text index of this snapshot, built on first use (slow for big catalogs)."""
+        if self._search is not None:
+            return self._search
+        with self._search_lock:
+            if self._search is None:
+                base = self._search_base
+                if base is not None and base[0].has_search_index():
+                    self._search = base[0].search_index().extended(base[1])
+                else:
+                    self._search = SearchIndex(self.problems)
+                self._search_base = None
+        return self._search
+
+    def search(self, query: str, limit: int = 10) -> List[Problem]:
+        """Problems matching a free-text query, best first."""
+        return [self.problems[position] for position in self.search_index().search(query, limit)]
+
+    def pick(self, difficulty: Optional[str] = None, exclude_ids: Optional[Collection[str]] = None,
+             rng: random.Random = random) -> Optional[Problem]:
+        """Pick a random non-excluded problem, preferring the given difficulty.
+
+        Falls back to any difficulty when every problem of the preferred
+        difficulty is excluded.
+
+        Args:
+            difficulty: Optional difficulty filter ('easy', 'medium', 'hard')
+            exclude_ids: Problem IDs that must not be returned
+            rng: Random source (module-level random by default)
+        """
+        if difficulty:
+            problem = self._pick_from(self.bucket(difficulty), exclude_ids, rng)
+            if problem:
+                return problem
+        return self._pick_from(self.all_positions, exclude_ids, rng)
+
+    def _pick_from(self, bucket: Sequence[int], exclude_ids: Optional[Collection[str]],
+                   rng: random.Random) -> Optional[Problem]:
+        """Uniformly pick a non-excluded problem from a bucket of positions."""
+        size = len(bucket)
+        if not size:
+            return None
+
+        if not exclude_ids:
+            return self.problems[bucket[rng.randrange(size)]]
+
+        # Rejection sampling is O(1) expected while most of the bucket is allowed
+        for _ in range(self.REJECTION_ATTEMPTS):
+            problem = self.problems[bucket[rng.randrange(size)]]
+            if problem.id not in exclude_ids:
+                return problem
+
+        # Bucket is mostly excluded: scan it once
+        candidates = [position for position in bucket if self.problems[position].id not in exclude_ids]
+        if not candidates:
+            return None
+        return self.problems[rng.choice(candidates)]
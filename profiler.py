@@ -0,0 +1,298 @@
+"""On-demand CPU and memory profiling of the running bot.
+
+Nothing here runs until a profile is started: the sampler thread, cProfile
+hooks and tracemalloc tracing are only active inside a profiling window.
+"""
+
+import asyncio
+import cProfile
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sample', 'cprofile')
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread.
+
+    Produces collapsed stacks ("outer;inner count" per line), the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        """Initialize for the thread to sample and the seconds between samples."""
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        labels: Dict[Any, str] = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.counts[tuple(stack)] += 1
+                self.samples += 1
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def top_frames(self, limit: int = 5) -> List[Tuple[str, int]]:
+        """Frames most often on top of the stack (self time)."""
+        leaves: Counter = Counter()
+        for stack, count in self.counts.items():
+            leaves[stack[-1]] += count
+        return leaves.most_common(limit)
+
+
+def deep_size(obj: Any) -> int:
+    """Approximate bytes reachable from an object, counting shared objects once.
+
+    Safe to run off the event loop while the objects change: a container
+    that is resized mid-walk is counted without its contents.
+    """
+    seen = set()
+    total = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, bytearray, int, float, bool, array)) or current is None:
+            continue
+        try:
+            if isinstance(current, dict):
+                items = list(current.items())
+                pending.extend(key for key, _ in items)
+                pending.extend(value for _, value in items)
+            elif isinstance(current, (list, tuple, set, frozenset)):
+                pending.extend(list(current))
+            else:
+                if hasattr(current, '__dict__'):
+                    pending.append(vars(current))
+                for cls in type(current).__mro__:
+                    for name in getattr(cls, '__slots__', ()):
+                        if hasattr(current, name):
+                            pending.append(getattr(current, name))
+        except RuntimeError:
+            # Changed size while being copied on the event loop
+            continue
+    return total
+
+
+class Profiler:
+    """Starts and stops bounded CPU profiles and takes memory snapshots.
+
+    CPU profiles sample the event loop thread (collapsed stacks) or trace it
+    with cProfile (pstats) for at most PROFILE_MAX_SECONDS, then are written
+    to PROFILE_DIR. Memory snapshots report the size of the bot's state dicts
+    and, while tracing is on, a tracemalloc snapshot diffed against the last.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, max_seconds: Optional[float] = None):
+        """Initialize (defaults come from Config)."""
+        self.output_dir = output_dir or Config.PROFILE_DIR
+        self.max_seconds = max_seconds or Config.PROFILE_MAX_SECONDS
+        self.mode: Optional[str] = None
+        self.started_at = 0.0
+        self._sampler: Optional[StackSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None
+
+    def _path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"{kind}-{stamp}-{os.getpid()}.{extension}")
+
+    def start(self, seconds: Optional[float] = None, mode: str = 'sample',
+              on_finish: Optional[Callable[[str], Awaitable[None]]] = None) -> float:
+        """Start a CPU profile of the calling (event loop) thread.
+
+        Args:
+            seconds: Window length, capped at max_seconds
+            mode: 'sample' for collapsed stacks or 'cprofile' for pstats
+            on_finish: Coroutine function called with the report when the
+                window ends on its own
+
+        Returns:
+            The window length actually used
+        """
+        if self.running:
+            raise ValueError(f"A {self.mode} profile is already running")
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode} (expected {' or '.join(MODES)})")
+        seconds = min(seconds or Config.PROFILE_DEFAULT_SECONDS, self.max_seconds)
+
+        if mode == 'sample':
+            self._sampler = StackSampler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL)
+            self._sampler.start()
+        else:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self.mode = mode
+        self.started_at = time.monotonic()
+        self._timer = asyncio.create_task(self._finish_after(seconds, on_finish))
+        logger.info(f"Started {mode} profile for {seconds:.0f}s")
+        return seconds
+
+    async def _finish_after(self, seconds: float, on_finish: Optional[Callable[[str], Awaitable[None]]]) -> None:
+        await asyncio.sleep(seconds)
+        self._timer = None
+        report = self.stop()
+        if on_finish and report:
+            try:
+                await on_finish(report)
+            except Exception as e:
+                logger.error(f"Error reporting finished profile: {e}")
+
+    def stop(self) -> Optional[str]:
+        """Stop the running CPU profile, write it to disk and return a summary."""
+        if not self.running:
+            return None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        elapsed = time.monotonic() - self.started_at
+
+        if self._sampler is not None:
+            sampler, self._sampler = self._sampler, None
+            sampler.stop()
+            path = self._path('cpu', 'collapsed')
+            sampler.write_collapsed(path)
+            lines = [f"CPU profile ({sampler.samples} samples over {elapsed:.1f}s) written to {path}", "Top frames:"]
+            lines.extend(
+                f"{count * 100 / max(sampler.samples, 1):5.1f}% {frame}" for frame, count in sampler.top_frames()
+            )
+        else:
+            profile, self._cprofile = self._cprofile, None
+            profile.disable()
+            path = self._path('cpu', 'pstats')
+            profile.dump_stats(path)
+            lines = [f"cProfile over {elapsed:.1f}s written to {path}"]
+
+        self.mode = None
+        report = "\n".join(lines)
+        logger.info(report)
+        return report
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        # Leave out tracemalloc's own bookkeeping
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    async def snapshot_memory(self, state: Dict[str, Any]) -> str:
+        """Report state dict sizes and take a tracemalloc snapshot.
+
+        The first call starts tracemalloc, so allocation statistics cover
+        what was allocated since then; later calls diff against the previous
+        snapshot. The walk and the snapshot run on the default executor over
+        shallow copies of the dicts, so polling and deliveries carry on.
+
+        Args:
+            state: Named objects to size (the handlers' state dicts)
+        """
+        copies = {name: dict(obj) if isinstance(obj, dict) else obj for name, obj in state.items()}
+        return await asyncio.get_running_loop().run_in_executor(None, self._snapshot_memory, copies)
+
+    def _snapshot_memory(self, state: Dict[str, Any]) -> str:
+        lines = ["State sizes:"]
+        for name, obj in state.items():
+            entries = f", {len(obj)} entries" if hasattr(obj, '__len__') else ""
+            lines.append(f"{name}: {deep_size(obj) / 2**20:.2f} MiB{entries}")
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._last_snapshot = self._take_snapshot()
+            lines.append("\nStarted tracemalloc; run again to see allocations since now.")
+            return "\n".join(lines)
+
+        snapshot = self._take_snapshot()
+        path = self._path('memory', 'tracemalloc')
+        snapshot.dump(path)
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"\nTraced: {current / 2**20:.1f} MiB (peak {peak / 2**20:.1f} MiB), snapshot written to {path}")
+        lines.append("Top growth since last snapshot:")
+        growth = [stat for stat in snapshot.compare_to(self._last_snapshot, 'lineno') if stat.size_diff > 0]
+        for stat in growth[:5]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size_diff / 1024:+.0f} KiB {os.path.basename(frame.filename)}:{frame.lineno}")
+        self._last_snapshot = snapshot
+        return "\n".join(lines)
+
+    def stop_memory(self) -> bool:
+        """Stop tracemalloc tracing; returns False if it was not running."""
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        self._last_snapshot = None
+        return True
+
+    def install_signal_handlers(self, state: Callable[[], Dict[str, Any]]) -> None:
+        """Toggle a CPU profile on SIGUSR1 and log a memory snapshot on SIGUSR2."""
+        loop = asyncio.get_running_loop()
+
+        def toggle_cpu() -> None:
+            if self.running:
+                self.stop()
+            else:
+                self.start()
+
+        async def log_memory() -> None:
+            try:
+                logger.info(await self.snapshot_memory(state()))
+            except Exception as e:
+                logger.error(f"Error taking memory snapshot: {e}")
+
+        def memory() -> None:
+            loop.create_task(log_memory())
+
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, toggle_cpu)
+            loop.add_signal_handler(signal.SIGUSR2, memory)
+        except (NotImplementedError, AttributeError):
+            logger.warning("Profiling signals are not supported on this platform")
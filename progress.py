@@ -0,0 +1,121 @@
+"""Compact per-user progress tracking over interned problem IDs."""
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class ProblemIdInterner:
+    """Maps problem ID strings to dense integers for the life of the process.
+
+    Numbers are never reused or reassigned, so they stay valid across
+    catalog refreshes even when rows are reordered or removed.
+    """
+
+    def __init__(self):
+        """Initialize an empty interner."""
+        self._numbers: Dict[str, int] = {}
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def intern(self, problem_id: str) -> int:
+        """Get the number for an ID, assigning the next one if it is new."""
+        number = self._numbers.get(problem_id)
+        if number is None:
+            number = self._numbers[problem_id] = len(self._ids)
+            self._ids.append(problem_id)
+        return number
+
+    def lookup(self, problem_id: str) -> Optional[int]:
+        """Get the number for an ID without assigning one."""
+        return self._numbers.get(problem_id)
+
+    def id_of(self, number: int) -> str:
+        """Get the ID string for a number."""
+        return self._ids[number]
+
+
+# Shared by every user's progress so a problem has one number process-wide
+interner = ProblemIdInterner()
+
+
+class ProblemBitset:
+    """Set of problem IDs stored as a bitmap over interned numbers.
+
+    Supports the set operations the handlers use (add, in, iteration, len)
+    at one bit per problem instead of one string reference plus hash entry.
+    """
+
+    __slots__ = ('_bits',)
+
+    def __init__(self, problem_ids: Iterable[str] = ()):
+        """Create a bitset holding the given IDs."""
+        numbers = [interner.intern(problem_id) for problem_id in problem_ids]
+        self._bits = bytearray((max(numbers) >> 3) + 1 if numbers else 0)
+        for number in numbers:
+            self._bits[number >> 3] |= 1 << (number & 7)
+
+    def add(self, problem_id: str) -> None:
+        number = interner.intern(problem_id)
+        byte = number >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        self._bits[byte] |= 1 << (number & 7)
+
+    def discard(self, problem_id: str) -> None:
+        number = interner.lookup(problem_id)
+        if number is not None and (number >> 3) < len(self._bits):
+            self._bits[number >> 3] &= ~(1 << (number & 7)) & 0xFF
+
+    def __contains__(self, problem_id: object) -> bool:
+        number = interner.lookup(problem_id) if isinstance(problem_id, str) else None
+        if number is None or (number >> 3) >= len(self._bits):
+            return False
+        return bool(self._bits[number >> 3] & (1 << (number & 7)))
+
+    def __iter__(self) -> Iterator[str]:
+        for byte_index, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield interner.id_of((byte_index << 3) + low.bit_length() - 1)
+                byte ^= low
+
+    def __len__(self) -> int:
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+
+class RecentWindow:
+    """Fixed-size ring buffer of the most recently sent problem IDs."""
+
+    __slots__ = ('_slots', '_next', '_count')
+
+    # Default number of recent problems kept per user
+    CAPACITY = 20
+
+    def __init__(self, problem_ids: Iterable[str] = (), capacity: int = CAPACITY):
+        """Create a window holding the last `capacity` of the given IDs."""
+        numbers = [interner.intern(problem_id) for problem_id in problem_ids][-capacity:]
+        self._slots = array('i', numbers) + array('i', [-1]) * (capacity - len(numbers))
+        self._next = len(numbers) % capacity
+        self._count = len(numbers)
+
+    def append(self, problem_id: str) -> None:
+        """Record a sent problem, evicting the oldest once full."""
+        self._slots[self._next] = interner.intern(problem_id)
+        self._next = (self._next + 1) % len(self._slots)
+        self._count = min(self._count + 1, len(self._slots))
+
+    def __contains__(self, problem_id: object) -> bool:
+        number = interner.lookup(problem_id) if isinstance(problem_id, str) else None
+        return number is not None and number in self._slots
+
+    def __iter__(self) -> Iterator[str]:
+        """Yield IDs from oldest to newest."""
+        capacity = len(self._slots)
+        start = (self._next - self._count) % capacity
+        for offset in range(self._count):
+            yield interner.id_of(self._slots[(start + offset) % capacity])
+
+    def __len__(self) -> int:
+        return self._count
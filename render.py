@@ -0,0 +1,92 @@
+"""Rendering of problem messages with an LRU cache."""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import Config
+from models import Problem
+
+# Header and footer wrapped around Problem.__str__ for each message kind
+TEMPLATES: Dict[str, Tuple[str, str]] = {
+    'today': (
+        "📅 *Today's DSA Problem*\n\n",
+        "\n\n💪 Good luck solving it!"
+    ),
+    'another': (
+        "🎲 *Another Random Problem*\n\n",
+        "\n\n💪 Good luck solving it!"
+    ),
+    'daily': (
+        "🌅 *Good Morning!*\n\n"
+        "Here's your daily DSA problem:\n\n",
+        "\n\n💪 Have a great day of coding!"
+    ),
+}
+
+
+def create_problem_keyboard(problem_id: str) -> InlineKeyboardMarkup:
+    """Create inline keyboard with Done/Later/Discard buttons."""
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Done", callback_data=f"problem_done_{problem_id}"),
+            InlineKeyboardButton("⏰ Later", callback_data=f"problem_later_{problem_id}"),
+            InlineKeyboardButton("❌ Discard", callback_data=f"problem_discard_{problem_id}")
+        ]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+class RenderCache:
+    """LRU cache of rendered problem messages and their keyboards.
+
+    Entries are keyed by (problem ID, template kind) and the whole cache is
+    dropped when the catalog snapshot version changes, so edited problems
+    are never served stale.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None):
+        """Initialize an empty cache holding at most maxsize entries."""
+        self.maxsize = maxsize or Config.RENDER_CACHE_SIZE
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[str, InlineKeyboardMarkup]]' = OrderedDict()
+        self._keyboards: Dict[str, InlineKeyboardMarkup] = {}
+        self._version = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, problem: Problem, kind: str, version: int) -> Tuple[str, InlineKeyboardMarkup]:
+        """Get the message text and keyboard for a problem.
+
+        Args:
+            problem: Problem to render
+            kind: Template kind ('today', 'another' or 'daily')
+            version: Version of the catalog snapshot the problem came from
+        """
+        if version != self._version:
+            self._entries.clear()
+            self._keyboards.clear()
+            self._version = version
+
+        key = (problem.id, kind)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        header, footer = TEMPLATES[kind]
+        keyboard = self._keyboards.get(problem.id)
+        if keyboard is None:
+            keyboard = self._keyboards[problem.id] = create_problem_keyboard(problem.id)
+        entry = (f"{header}{problem}{footer}", keyboard)
+
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            evicted_id, _ = self._entries.popitem(last=False)[0]
+            if not any((evicted_id, other) in self._entries for other in TEMPLATES):
+                self._keyboards.pop(evicted_id, None)
+        return entry
@@ -1,4 +1,7 @@
 #!/bin/bash
+# Rotates bot.err, the process's raw stdout/stderr (startup failures, crash
+# tracebacks). bot.log is rotated by the bot itself (LOG_FILE, LOG_MAX_BYTES,
+# LOG_KEEP), so it is not touched here.
 set -euo pipefail
 
 LOG_DIR="/ws/vishwsh2-sjc/dsaTelegram/logs"
@@ -20,13 +23,13 @@ rotate_file() {
 
   local ts
   ts="$(date +%Y%m%d%H%M%S)"
-  mv "$file" "$file.$ts"
+  # Copy then truncate in place: systemd keeps appending to the same open file
+  cp "$file" "$file.$ts"
   : > "$file"
 
   ls -1t "$file".* 2>/dev/null | tail -n +$((KEEP + 1)) | xargs -r rm -f
 }
 
 mkdir -p "$LOG_DIR"
-rotate_file "$LOG_DIR/bot.log"
 rotate_file "$LOG_DIR/bot.err"
 
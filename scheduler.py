@@ -1,79 +1,233 @@
 """Scheduler for daily DSA problem delivery."""
 
+import asyncio
 import logging
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import pytz
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from telegram.ext import Application
 
 from config import Config
 from handlers import Handlers
+from metrics import scheduler_lag
 
 logger = logging.getLogger(__name__)
 
 
+def time_to_slot(time_str: str) -> int:
+    """Convert an HH:MM time to its minute-of-day slot."""
+    hour, minute = map(int, time_str.split(':'))
+    return hour * 60 + minute
+
+
 class Scheduler:
-    """Manages the daily problem scheduler."""
+    """Manages the daily problem scheduler.
+    
+    Users are bucketed into 1440 minute-of-day slots kept in the state store.
+    A single job fires every minute and dispatches the users in the current
+    slot, so there is no per-user APScheduler job and nothing to rebuild on
+    restart. Slots missed while the bot was down are caught up on start.
+    """
+    
+    DISPATCH_JOB_ID = "daily_problem_dispatch"
+    CATCHUP_JOB_ID = "daily_problem_catchup"
+    PRECOMPUTE_JOB_ID = "daily_problem_precompute"
+    # Delivered marks written to the state store per batch while a slot is sent
+    DELIVERED_BATCH = 100
     
     def __init__(self, handlers: Handlers):
         """Initialize scheduler with handlers."""
         self.scheduler = AsyncIOScheduler(timezone=Config.TIMEZONE)
+        self.timezone = pytz.timezone(Config.TIMEZONE)
         self.handlers = handlers
+        self.store = handlers.store
         self.application: Application = None
+        # Shard whose users this process delivers to (the only one when not sharded)
+        self.shard_index = max(Config.SHARD_INDEX, 0)
+        self.shard_count = Config.SHARD_COUNT if Config.SHARD_INDEX >= 0 else 1
+        # Epoch time of the last slot the dispatcher finished
+        self._last_dispatched: Optional[float] = None
+        # Last slot handed to a running dispatch, so an overlapping run skips it
+        self._claimed: Optional[float] = None
         # Store scheduler reference in handlers for rescheduling
         handlers.scheduler = self
     
     def start(self, application: Application) -> None:
-        """Start the scheduler and schedule jobs for all users."""
+        """Start the scheduler, catching up on slots missed while stopped."""
         self.application = application
         
-        # Schedule jobs for all existing users
-        self._schedule_all_users()
+        # Slots are persisted, so they only need building the first time
+        if not self.store.has_schedule(self.shard_index, self.shard_count):
+            self._schedule_all_users()
+        self._last_dispatched = self.store.load_last_dispatch(self.shard_index)
+        
+        self.scheduler.add_job(
+            self._dispatch_slot,
+            trigger=CronTrigger(minute='*', timezone=Config.TIMEZONE),
+            id=self.DISPATCH_JOB_ID,
+            name="Daily problem slot dispatcher",
+            misfire_grace_time=30,
+            max_instances=2
+        )
         
+        # Deliver anything missed while the bot was down right away
+        if self._last_dispatched is not None:
+            self.scheduler.add_job(
+                self._dispatch_slot,
+                id=self.CATCHUP_JOB_ID,
+                name="Daily problem catch-up"
+            )
+        
+        # Pick tomorrow's problems off-peak so slot sends only render and send
+        hour, minute = map(int, Config.PRECOMPUTE_TIME.split(':'))
+        self.scheduler.add_job(
+            self.handlers.precompute_daily_problems,
+            trigger=CronTrigger(hour=hour, minute=minute, timezone=Config.TIMEZONE),
+            id=self.PRECOMPUTE_JOB_ID,
+            name="Precompute daily problems"
+        )
         self.scheduler.start()
-        logger.info(f"Scheduler started. Scheduling per-user daily problems.")
+        logger.info(f"Scheduler started. Dispatching per-user daily problems by minute slot.")
     
     def _schedule_all_users(self) -> None:
-        """Schedule daily problem jobs for all users."""
+        """Place every known user in their daily slot (first start with an empty schedule)."""
         # Import here to avoid circular import
         from handlers import user_prefs
         
         for user_id, prefs in user_prefs.items():
-            schedule_time = prefs.get_schedule_time()
-            self._schedule_user_job(user_id, schedule_time)
+            self._schedule_user_job(user_id, prefs.get_schedule_time(), log=False)
         
         default_time = Config.SCHEDULE_TIME
         logger.info(f"Scheduled jobs for {len(user_prefs)} users. Default time: {default_time}")
     
-    def _schedule_user_job(self, user_id: int, time_str: str) -> None:
-        """Schedule a daily job for a specific user at the given time."""
-        job_id = f"daily_problem_user_{user_id}"
+    def _schedule_user_job(self, user_id: int, time_str: str, log: bool = True) -> None:
+        """Move a user into the slot for the given time."""
+        self.store.save_slot(user_id, time_to_slot(time_str))
         
-        # Remove existing job if it exists
-        try:
-            self.scheduler.remove_job(job_id)
-        except Exception:
-            pass  # Job doesn't exist, that's fine
+        if log:
+            logger.info(f"Scheduled daily problem for user {user_id} at {time_str} {Config.TIMEZONE}")
+    
+    def current_slot(self) -> int:
+        """Minute-of-day slot for the current time in the bot's timezone."""
+        now = datetime.now(self.timezone)
+        return now.hour * 60 + now.minute
+    
+    def _local(self, slot_time: float) -> datetime:
+        return datetime.fromtimestamp(slot_time, self.timezone)
+    
+    def _pending_slot_times(self) -> List[float]:
+        """Epoch times of the slots due since the last dispatch, oldest first.
         
-        # Parse time
-        hour, minute = map(int, time_str.split(':'))
+        Slots more than SCHEDULE_CATCHUP_MINUTES old are skipped.
+        """
+        current = self.slot_timestamp(self.current_slot())
+        cursor = self._claimed if self._claimed is not None else self._last_dispatched
+        if cursor is None:
+            return [current]
         
-        # Schedule new job
-        self.scheduler.add_job(
-            self._send_user_daily_problem,
-            trigger=CronTrigger(hour=hour, minute=minute, timezone=Config.TIMEZONE),
-            id=job_id,
-            name=f"Daily problem for user {user_id}",
-            args=[user_id]
+        grace_start = current - Config.SCHEDULE_CATCHUP_MINUTES * 60
+        first = cursor + 60
+        if first < grace_start:
+            skipped = int((grace_start - first) // 60)
+            logger.warning(f"Skipping {skipped} slots missed more than {Config.SCHEDULE_CATCHUP_MINUTES} minutes ago")
+            first = grace_start
+        
+        pending = []
+        slot_time = first
+        while slot_time <= current:
+            pending.append(slot_time)
+            slot_time += 60
+        return pending
+    
+    async def _dispatch_slot(self) -> None:
+        """Dispatch the current slot plus any slots missed since the last run."""
+        pending = self._pending_slot_times()
+        if not pending:
+            return
+        # Claim the slots before awaiting so an overlapping run doesn't repeat them
+        claim = self._claimed = pending[-1]
+        if len(pending) > 1:
+            logger.info(f"Catching up on {len(pending)} slots since {self._local(pending[0]):%Y-%m-%d %H:%M}")
+        
+        fired_at = time.time()
+        for slot_time in pending:
+            local = self._local(slot_time)
+            scheduler_lag.observe(fired_at - slot_time)
+            try:
+                await self._send_slot(local.hour * 60 + local.minute, slot_time)
+            except Exception as e:
+                logger.error(f"Error dispatching slot {local:%Y-%m-%d %H:%M}, retrying on the next run: {e}")
+                # Release this slot and the ones after it, unless a newer run claimed past them
+                if self._claimed == claim:
+                    self._claimed = self._last_dispatched
+                return
+            # Advance only as each slot finishes, so a failure never skips the rest
+            if self._last_dispatched is None or slot_time > self._last_dispatched:
+                self._last_dispatched = slot_time
+                self.store.save_last_dispatch(self.shard_index, slot_time)
+    
+    async def _send_slot(self, slot: int, scheduled_at: Optional[float] = None) -> None:
+        """Send daily problems to every user in a slot who hasn't had that day's problem.
+        
+        Args:
+            slot: Minute-of-day slot
+            scheduled_at: Epoch time of the slot occurrence (defaults to the most recent one)
+        """
+        if scheduled_at is None:
+            scheduled_at = self.slot_timestamp(slot)
+        day = self._local(scheduled_at).date().isoformat()
+        
+        loop = asyncio.get_running_loop()
+        user_ids = await loop.run_in_executor(
+            None, self.store.due_users, slot, day, self.shard_index, self.shard_count
         )
+        if not user_ids:
+            return
+        
+        marked = 0
         
-        logger.info(f"Scheduled daily problem for user {user_id} at {time_str} {Config.TIMEZONE}")
+        async def send(user_id: int) -> bool:
+            nonlocal marked
+            delivered = await self._send_user_daily_problem(user_id)
+            if delivered:
+                self.store.mark_delivered(user_id, day)
+                marked += 1
+                if marked % self.DELIVERED_BATCH == 0:
+                    # Persist marks as the slot goes, so a crash resends at most a batch
+                    try:
+                        await loop.run_in_executor(None, self.store.flush)
+                    except Exception as e:
+                        logger.error(f"Error saving delivered marks for slot {slot}: {e}")
+            return delivered
+        
+        logger.info(f"Dispatching daily problem to {len(user_ids)} users for slot {slot // 60:02d}:{slot % 60:02d}")
+        await self.handlers.delivery.fan_out(user_ids, send, scheduled_at=scheduled_at)
+        # Write the slot's delivered marks before the slot is recorded as dispatched;
+        # on failure they stay queued and are written with it on the next flush
+        try:
+            await loop.run_in_executor(None, self.store.flush)
+        except Exception as e:
+            logger.error(f"Error saving delivered marks for slot {slot}: {e}")
+    
+    def slot_timestamp(self, slot: int) -> float:
+        """Epoch time of the most recent occurrence of a slot."""
+        now = datetime.now(self.timezone)
+        due = now.replace(hour=slot // 60, minute=slot % 60, second=0, microsecond=0)
+        if due > now:
+            due -= timedelta(days=1)
+        return due.timestamp()
     
-    async def _send_user_daily_problem(self, user_id: int) -> None:
+    async def _send_user_daily_problem(self, user_id: int) -> bool:
         """Send daily problem to a specific user."""
         try:
-            await self.handlers.send_daily_problem_to_user(self.application.bot, user_id)
+            return await self.handlers.send_daily_problem_to_user(self.application.bot, user_id)
         except Exception as e:
             logger.error(f"Error sending daily problem to user {user_id}: {e}")
+            return False
     
     def reschedule_user_job(self, user_id: int, time_str: str) -> None:
         """Reschedule a user's daily problem job."""
@@ -92,6 +246,11 @@ class Scheduler:
         
         self._schedule_user_job(user_id, schedule_time)
     
+    def unschedule(self, user_id: int) -> None:
+        """Stop daily problems for a user or chat (called on /unsubscribe)."""
+        self.store.remove_slot(user_id)
+        logger.info(f"Unscheduled daily problem for chat {user_id}")
+    
     def stop(self) -> None:
         """Stop the scheduler."""
         self.scheduler.shutdown()
@@ -0,0 +1,268 @@
+"""Inverted index for problem search and topic lookup.
+
+Built once per catalog snapshot. Queries match title and topic words
+exactly, by prefix or with one typo (two for long words), and only touch the
+posting lists of matching words, so they stay well under a millisecond on
+catalogs of tens of thousands of problems.
+"""
+
+import heapq
+import re
+from bisect import bisect_left
+from itertools import chain, groupby
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from models import Problem
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+# Match quality, added up per query word to rank results
+EXACT = 3
+PREFIX = 2
+FUZZY = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words and numbers of a text."""
+    return _TOKEN.findall(text.lower())
+
+
+def _deletes(token: str) -> Iterable[str]:
+    """Every variant of a token with one character removed."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_distance(a: str, b: str, max_distance: int) -> bool:
+    """Whether two words are within an edit distance (adjacent swaps count as one edit)."""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return False
+        previous2, previous = previous, current
+    return previous[-1] <= max_distance
+
+
+class SearchIndex:
+    """Inverted index from title and topic words to catalog positions.
+
+    Typo tolerance uses symmetric deletes: every indexed word is stored under
+    each of its one-character deletions, so a misspelt query word finds its
+    candidates with a handful of dictionary lookups instead of a vocabulary
+    scan.
+    """
+
+    # Shortest query word that matches by prefix or with typos
+    MIN_PREFIX_LENGTH = 2
+    MIN_FUZZY_LENGTH = 4
+    # Words at least this long tolerate two typos instead of one
+    LONG_WORD_LENGTH = 8
+    # Indexed words a prefix may expand to
+    MAX_PREFIX_EXPANSIONS = 50
+    # Postings checked one by one before switching to set intersection
+    WALK_BUDGET = 256
+
+    def __init__(self, problems: Sequence[Problem]):
+        """Index a catalog snapshot's problems in catalog order."""
+        self.postings: Dict[str, List[int]] = {}
+        self.size = 0
+        self.deletes: Dict[str, List[str]] = {}
+        self.topics: Dict[str, str] = {}  # Lowercase topic -> name as written in the sheet
+        self._add(problems, 0)
+        self.vocabulary = sorted(self.postings)
+
+    def _add(self, problems: Sequence[Problem], start: int) -> None:
+        for position, problem in enumerate(problems, start=start):
+            for token in set(tokenize(problem.title)) | set(tokenize(problem.topic)):
+                posting = self.postings.get(token)
+                if posting is None:
+                    self.postings[token] = [position]
+                    self._add_deletes(token)
+                else:
+                    posting.append(position)
+            self.topics.setdefault(problem.topic.lower(), problem.topic)
+        self.size = start + len(problems)
+
+    def _add_deletes(self, token: str) -> None:
+        if len(token) < self.MIN_FUZZY_LENGTH or token.isdigit():
+            return
+        for variant in _deletes(token):
+            self.deletes.setdefault(variant, []).append(token)
+
+    def extended(self, new_problems: Sequence[Problem]) -> 'SearchIndex':
+        """Index for this catalog plus appended rows, sharing unchanged posting lists."""
+        index = SearchIndex.__new__(SearchIndex)
+        index.postings = dict(self.postings)
+        index.size = self.size
+        index.deletes = dict(self.deletes)
+        index.topics = dict(self.topics)
+        # Copy the lists that are about to grow so readers of this index are unaffected
+        for problem in new_problems:
+            for token in set(tokenize(problem.title)) | set(tokenize(problem.topic)):
+                if token in index.postings and index.postings[token] is self.postings.get(token):
+                    index.postings[token] = list(index.postings[token])
+                if len(token) >= self.MIN_FUZZY_LENGTH and token not in self.postings:
+                    for variant in _deletes(token):
+                        if variant in index.deletes and index.deletes[variant] is self.deletes.get(variant):
+                            index.deletes[variant] = list(index.deletes[variant])
+        index._add(new_problems, self.size)
+        index.vocabulary = sorted(index.postings) if len(index.postings) != len(self.postings) else self.vocabulary
+        return index
+
+    def _max_distance(self, word: str) -> int:
+        return 2 if len(word) >= self.LONG_WORD_LENGTH else 1
+
+    def expand(self, word: str) -> Dict[str, int]:
+        """Indexed words a query word matches, with their match quality."""
+        matches: Dict[str, int] = {}
+        if word in self.postings:
+            matches[word] = EXACT
+
+        if len(word) >= self.MIN_PREFIX_LENGTH:
+            start = bisect_left(self.vocabulary, word)
+            for token in self.vocabulary[start:start + self.MAX_PREFIX_EXPANSIONS]:
+                if not token.startswith(word):
+                    break
+                matches.setdefault(token, PREFIX)
+
+        if len(word) >= self.MIN_FUZZY_LENGTH and not word.isdigit():
+            max_distance = self._max_distance(word)
+            # Indexed words with one extra character, then ones sharing a deletion
+            candidates = list(self.deletes.get(word, ()))
+            for variant in _deletes(word):
+                if variant in self.postings:
+                    candidates.append(variant)
+                candidates.extend(self.deletes.get(variant, ()))
+            for token in candidates:
+                if token not in matches and _within_distance(word, token, max_distance):
+                    matches[token] = FUZZY
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """Catalog positions matching every word of a query, best first.
+
+        Args:
+            query: Free text; each word may match exactly, by prefix or with typos
+            limit: Maximum number of results
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        expansions = [self.expand(word) for word in words]
+        if not all(expansions):
+            return []
+        if len(words) == 1:
+            return self._top_single(expansions[0], limit)
+
+        # Per word, the indexed words it matches at each quality, best quality first
+        tiers: List[List[Tuple[int, List[str]]]] = []
+        for matches in expansions:
+            tokens_by_quality: Dict[int, List[str]] = {}
+            for token, quality in matches.items():
+                tokens_by_quality.setdefault(quality, []).append(token)
+            tiers.append(sorted(tokens_by_quality.items(), reverse=True))
+
+        # Problems matching every word at its best quality outrank all others and
+        # tie-break by position. Walk the rarest word's postings while matches are
+        # common, and intersect whole posting lists when they turn out rare.
+        best = sorted((word_tiers[0][1] for word_tiers in tiers), key=self._posting_count)
+        results: List[int] = []
+        walked = 0
+        for position in self._walk(best[0]):
+            if all(self._contains(tokens, position) for tokens in best[1:]):
+                results.append(position)
+                if len(results) >= limit:
+                    return results
+            walked += 1
+            if walked >= self.WALK_BUDGET:
+                top = set(self._walk(best[0]))
+                for tokens in best[1:]:
+                    top = top.intersection(chain.from_iterable(self.postings[token] for token in tokens))
+                results = heapq.nsmallest(limit, top)
+                break
+        if len(results) >= limit:
+            return results
+        if all(len(word_tiers) == 1 for word_tiers in tiers):
+            return results
+
+        # Too few top matches: score everything that matches every word
+        sets = [
+            [(quality, set().union(*(self.postings[token] for token in tokens))) for quality, tokens in word_tiers]
+            for word_tiers in tiers
+        ]
+        matched = sorted((set().union(*(positions for _, positions in word_sets)) for word_sets in sets), key=len)
+        candidates = matched[0].intersection(*matched[1:])
+
+        def score(position: int) -> int:
+            return sum(
+                next(quality for quality, positions in word_sets if position in positions)
+                for word_sets in sets
+            )
+
+        return heapq.nsmallest(limit, candidates, key=lambda position: (-score(position), position))
+
+    def _posting_count(self, tokens: List[str]) -> int:
+        return sum(len(self.postings[token]) for token in tokens)
+
+    def _walk(self, tokens: List[str]) -> Iterable[int]:
+        """Positions of any of the given words, ascending and without repeats."""
+        if len(tokens) == 1:
+            return self.postings[tokens[0]]
+        return (position for position, _ in groupby(heapq.merge(*(self.postings[token] for token in tokens))))
+
+    def _contains(self, tokens: List[str], position: int) -> bool:
+        """Whether a position is in the postings of any of the given words."""
+        for token in tokens:
+            posting = self.postings[token]
+            i = bisect_left(posting, position)
+            if i < len(posting) and posting[i] == position:
+                return True
+        return False
+
+    def _top_single(self, matches: Dict[str, int], limit: int) -> List[int]:
+        """Best results for a one-word query without scoring every posting."""
+        results: List[int] = []
+        seen = set()
+        for quality in (EXACT, PREFIX, FUZZY):
+            for token in sorted(token for token, q in matches.items() if q == quality):
+                for position in self.postings[token]:
+                    if position not in seen:
+                        seen.add(position)
+                        results.append(position)
+                        if len(results) >= limit:
+                            return results
+        return results
+
+    def match_topics(self, query: str) -> List[str]:
+        """Catalog topics (as written in the sheet) a topic name could refer to.
+
+        An exact name wins; otherwise every query word must match a word of
+        the topic (by prefix or with typos), or the query is the topic's
+        initials (e.g. "dp" for Dynamic Programming).
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        normalized = ' '.join(words)
+        for topic, name in self.topics.items():
+            if ' '.join(tokenize(topic)) == normalized:
+                return [name]
+
+        expansions = [self.expand(word) for word in words]
+        matched = []
+        for topic, name in self.topics.items():
+            topic_words = tokenize(topic)
+            if all(any(word in matches for word in topic_words) for matches in expansions):
+                matched.append(name)
+            elif len(words) == 1 and len(topic_words) > 1 and ''.join(w[0] for w in topic_words) == words[0]:
+                matched.append(name)
+        return sorted(matched)
+
@@ -0,0 +1,360 @@
+"""Sharded deployment: worker processes each owning a partition of users.
+
+A coordinator process receives every update (polling or webhook) and
+forwards it over a Unix socket to the worker that owns the update's user
+(or, for chat subscriptions, its chat). Each worker is a full bot process
+that only loads, schedules and serves its own users, sharing the SQLite
+state database and catalog snapshot with the other workers. Shard 0 alone
+refreshes the catalog from Google Sheets and rewrites the snapshot file;
+the other workers reload that file when it changes.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+from telegram.ext import Application
+
+from config import Config
+from webhook import UpdateQueue, WebhookServer, serve_application
+
+logger = logging.getLogger(__name__)
+
+# Frames are a 4-byte big-endian length followed by the update as JSON
+FRAME_HEADER = struct.Struct('>I')
+# Commands that act on the chat they are sent in, not on the sender
+CHAT_COMMANDS = {'subscribe', 'unsubscribe'}
+
+
+def shard_for(user_id: int, shard_count: int) -> int:
+    """Shard that owns a user or chat.
+
+    Matches the `abs(user_id) % shard_count` filter the state store uses
+    when a worker loads its users.
+    """
+    return abs(user_id) % shard_count
+
+
+def _command(message) -> Optional[str]:
+    """Lowercased command name a message starts with, without any @botname."""
+    text = message.text or message.caption or ''
+    if not text.startswith('/'):
+        return None
+    words = text[1:].split(maxsplit=1)
+    return words[0].partition('@')[0].lower() if words else None
+
+
+def update_owner(data: Dict) -> Optional[int]:
+    """Chat (or user) ID whose shard handles a raw update.
+
+    Progress and preferences are kept per user, so messages and button
+    presses go to the sender's shard even inside a group. Only the commands
+    that change a chat's own subscription, channel posts and membership
+    changes go to the chat's shard, which is the one that schedules it.
+    """
+    update = Update.de_json(data, None)
+    if update is None:
+        raise ValueError("Empty update")
+    if update.callback_query:
+        # Button presses update the clicking member's progress, held by their own shard
+        return update.callback_query.from_user.id
+    message = update.message or update.edited_message
+    if message is not None and message.from_user and message.from_user.id >= 0:
+        if _command(message) not in CHAT_COMMANDS:
+            return message.from_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+def shard_socket_path(index: int) -> str:
+    return os.path.join(Config.SHARD_SOCKET_DIR, f"shard-{index}.sock")
+
+
+class ShardLink:
+    """Coordinator-side connection to one worker, with its own send queue."""
+
+    # Seconds between connection attempts
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, index: int, path: str, queue_size: int):
+        """Initialize the link.
+
+        Args:
+            index: Shard index
+            path: Unix socket the worker listens on
+            queue_size: Frames buffered while the worker is slow or restarting
+        """
+        self.index = index
+        self.path = path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.connected = False
+
+        # Counters
+        self.forwarded = 0
+        self.reconnects = 0
+
+    async def run(self) -> None:
+        """Send queued frames to the worker until cancelled, reconnecting as needed."""
+        frame: Optional[bytes] = None
+        while True:
+            try:
+                _, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(self.RECONNECT_DELAY)
+                continue
+
+            self.connected = True
+            logger.info(f"Connected to shard {self.index}")
+            try:
+                while True:
+                    if frame is None:
+                        frame = await self.queue.get()
+                    writer.write(frame)
+                    await writer.drain()
+                    frame = None
+                    self.forwarded += 1
+                    self.queue.task_done()
+            except (ConnectionError, OSError) as e:
+                # Keep the frame in flight and resend it once reconnected
+                logger.warning(f"Lost connection to shard {self.index}: {e}")
+                self.reconnects += 1
+            finally:
+                self.connected = False
+                writer.close()
+
+
+class ShardRouter:
+    """Routes raw updates to the link of the shard that owns them."""
+
+    # Seconds to forward buffered updates when stopping
+    DRAIN_TIMEOUT = 10
+
+    def __init__(self, shard_count: int, queue_size: Optional[int] = None):
+        """Initialize one link per shard."""
+        queue_size = queue_size or Config.WEBHOOK_QUEUE_SIZE
+        self.links = [ShardLink(index, shard_socket_path(index), queue_size) for index in range(shard_count)]
+        self._tasks: List[asyncio.Task] = []
+
+    def is_ready(self) -> bool:
+        """Whether every worker is connected."""
+        return all(link.connected for link in self.links)
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(link.run()) for link in self.links]
+
+    async def stop(self) -> None:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(link.queue.join() for link in self.links)), self.DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Dropping updates still buffered for shards on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _route(self, data: Dict) -> Tuple[ShardLink, bytes]:
+        try:
+            owner = update_owner(data)
+        except (TypeError, KeyError) as e:
+            raise ValueError(str(e)) from e
+        link = self.links[shard_for(owner if owner is not None else data.get('update_id', 0), len(self.links))]
+        body = json.dumps(data, separators=(',', ':')).encode()
+        return link, FRAME_HEADER.pack(len(body)) + body
+
+    def submit(self, data: Dict) -> bool:
+        """Queue an update for its shard without waiting; False when that shard is backed up."""
+        link, frame = self._route(data)
+        try:
+            link.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, data: Dict) -> None:
+        """Queue an update for its shard, waiting for room."""
+        link, frame = self._route(data)
+        await link.queue.put(frame)
+
+
+class ShardListener:
+    """Worker-side Unix socket server feeding forwarded updates to an UpdateQueue."""
+
+    def __init__(self, updates: UpdateQueue, path: str):
+        """Initialize for the given update queue and socket path."""
+        self.updates = updates
+        self.path = path
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Left behind by a crashed worker
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.path)
+        logger.info(f"Shard listening on {self.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                body = await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+                try:
+                    # Waiting here pushes back on the coordinator when we fall behind
+                    await self.updates.put(json.loads(body))
+                except ValueError as e:
+                    logger.warning(f"Dropping malformed update from coordinator: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def run_shard_worker(application: Application, index: int) -> None:
+    """Serve updates forwarded by the coordinator for one shard."""
+    async def main() -> None:
+        updates = UpdateQueue(application)
+        listener = ShardListener(updates, shard_socket_path(index))
+        await serve_application(application, [updates, listener])
+
+    asyncio.run(main())
+
+
+class Coordinator:
+    """Starts and supervises the shard workers and routes updates to them."""
+
+    # Seconds before restarting a worker that exited
+    RESTART_DELAY = 5
+    # Seconds a worker gets to shut down before it is killed
+    STOP_TIMEOUT = 30
+    # Long-polling timeout for getUpdates
+    POLL_TIMEOUT = 30
+
+    def __init__(self, shard_count: int):
+        """Initialize for the given number of shards."""
+        self.shard_count = shard_count
+        self.router = ShardRouter(shard_count)
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._stopping = False
+        # Next getUpdates offset, kept across poller restarts so updates aren't fetched twice
+        self._offset: Optional[int] = None
+
+    async def _supervise(self, index: int) -> None:
+        """Run one worker process, restarting it if it exits unexpectedly."""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+        env = dict(os.environ, SHARD_INDEX=str(index), SHARD_COUNT=str(self.shard_count))
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(sys.executable, script, env=env)
+            self.processes[index] = process
+            logger.info(f"Started shard {index} (pid {process.pid})")
+            code = await process.wait()
+            if self._stopping:
+                break
+            logger.error(f"Shard {index} exited with code {code}, restarting in {self.RESTART_DELAY}s")
+            await asyncio.sleep(self.RESTART_DELAY)
+
+    async def _stop_workers(self) -> None:
+        self._stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.send_signal(signal.SIGTERM)
+        for index, process in self.processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), self.STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning(f"Shard {index} did not stop in time, killing it")
+                process.kill()
+
+    async def _poll(self, bot: Bot) -> None:
+        """Fetch updates with long polling and forward them to the shards."""
+        await bot.delete_webhook()
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=self._offset, timeout=self.POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                )
+            except TelegramError as e:
+                logger.warning(f"Error polling for updates: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                try:
+                    await self.router.put(update.to_dict())
+                except Exception as e:
+                    # A bad update must not stall the rest: skip it
+                    logger.error(f"Dropping update {update.update_id} that could not be routed: {e}")
+                finally:
+                    self._offset = update.update_id + 1
+
+    async def _keep_polling(self, bot: Bot) -> None:
+        """Run the poller, restarting it (from the same offset) if it fails."""
+        while True:
+            try:
+                await self._poll(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Update poller failed, restarting in {self.RESTART_DELAY}s: {e}")
+                await asyncio.sleep(self.RESTART_DELAY)
+
+    async def run(self) -> None:
+        """Run until SIGINT/SIGTERM."""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        supervisors = [asyncio.create_task(self._supervise(index)) for index in range(self.shard_count)]
+        await self.router.start()
+        server: Optional[WebhookServer] = None
+        poller: Optional[asyncio.Task] = None
+        try:
+            async with Bot(Config.TELEGRAM_BOT_TOKEN) as bot:
+                if Config.BOT_MODE == "webhook":
+                    server = WebhookServer(self.router.submit, self.router.is_ready)
+                    await server.start()
+                    await bot.set_webhook(
+                        url=Config.WEBHOOK_URL + Config.WEBHOOK_PATH,
+                        secret_token=server.secret_token or None,
+                        allowed_updates=Update.ALL_TYPES,
+                        max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+                    )
+                else:
+                    poller = asyncio.create_task(self._keep_polling(bot))
+                logger.info(f"Coordinator routing updates to {self.shard_count} shards")
+                await stop.wait()
+                logger.info("Received stop signal, shutting down shards")
+        except TelegramError as e:
+            logger.error(f"Coordinator failed: {e}")
+        finally:
+            if poller:
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+            if server:
+                await server.stop()
+            await self.router.stop()
+            await self._stop_workers()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+
+
+def run_coordinator(shard_count: int) -> None:
+    """Start the shard workers and route updates to them until stopped."""
+    asyncio.run(Coordinator(shard_count).run())
@@ -1,14 +1,290 @@
 """Google Sheets integration for reading and writing DSA problems."""
 
-import random
-from typing import List, Optional, Set
+import asyncio
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from config import Config
+from metrics import sheets_call
 from models import Problem
+from problem_index import ProblemIndex
+from search import SearchIndex
+from snapshot import CatalogSnapshotFile
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Collapses concurrent calls into one in-flight call whose result all callers share.
+    
+    Works for both threads (do) and coroutines (do_async). A failure is
+    raised to every caller that joined that flight but is not remembered,
+    so the next call starts a fresh attempt.
+    """
+    
+    def __init__(self):
+        """Initialize with nothing in flight."""
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self._pending_async: Optional[asyncio.Future] = None
+        
+        # Counters
+        self.calls = 0  # Calls actually executed
+        self.saved = 0  # Callers that joined an in-flight call instead
+    
+    def do(self, func: Callable[[], Any]) -> Any:
+        """Run func, or wait for the call already in flight on another thread."""
+        with self._lock:
+            pending = self._pending
+            leader = pending is None
+            if leader:
+                pending = self._pending = Future()
+                self.calls += 1
+            else:
+                self.saved += 1
+        if not leader:
+            return pending.result()
+        
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                self._pending = None
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._pending = None
+        pending.set_result(result)
+        return result
+    
+    async def do_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await func, or join the call already in flight on this event loop."""
+        pending = self._pending_async
+        if pending is not None:
+            self.saved += 1
+        else:
+            self.calls += 1
+            pending = self._pending_async = asyncio.ensure_future(func())
+            pending.add_done_callback(self._clear_async)
+        # Shield so one cancelled waiter does not cancel the shared call
+        return await asyncio.shield(pending)
+    
+    def _clear_async(self, future: asyncio.Future) -> None:
+        if self._pending_async is future:
+            self._pending_async = None
+        if not future.cancelled():
+            # Mark the exception as retrieved when nobody is left waiting
+            future.exception()
+
+
+@dataclass
+class CatalogSnapshot:
+    """An immutable view of the problem catalog as of a single fetch."""
+    problems: List[Problem]
+    fetched_at: float
+    version: int
+    index: ProblemIndex
+
+
+class CatalogCache:
+    """In-memory problem catalog with TTL-based background refresh.
+    
+    Readers always get the last good snapshot without waiting on a refresh.
+    Only the very first read (before any snapshot exists) blocks on a fetch.
+    """
+    
+    def __init__(self, loader: Callable[[], List[Problem]], ttl: float,
+                 syncer: Optional[Callable[[], 'CatalogSnapshot']] = None,
+                 on_refresh: Optional[Callable[['CatalogSnapshot'], None]] = None):
+        """Initialize the cache.
+        
+        Args:
+            loader: Callable that fetches the full problem list from the source
+            ttl: Seconds after which a snapshot is considered stale
+            syncer: Optional callable that brings an existing snapshot up to
+                date incrementally (via install/extend/touch)
+            on_refresh: Optional callback run after every successful refresh
+        """
+        self._loader = loader
+        self._syncer = syncer
+        self._on_refresh = on_refresh
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._version = 0
+        self.flight = SingleFlight()
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+    
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, fetching only if none exists yet."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        
+        self.misses += 1
+        return self.refresh()
+    
+    def refresh(self) -> CatalogSnapshot:
+        """Bring the catalog up to date and return the current snapshot.
+        
+        Uses the incremental syncer once a snapshot exists, otherwise a full
+        fetch. Concurrent refreshes share a single call.
+        """
+        return self.flight.do(self._refresh)
+    
+    def _refresh(self) -> CatalogSnapshot:
+        try:
+            if self._syncer is not None and self._snapshot is not None:
+                snapshot = self._syncer()
+            else:
+                snapshot = self.install(self._loader())
+        except Exception:
+            self.refresh_failures += 1
+            raise
+        self.refreshes += 1
+        if self._on_refresh is not None:
+            try:
+                self._on_refresh(snapshot)
+            except Exception as e:
+                logger.error(f"Error in catalog refresh callback: {e}")
+        return snapshot
+    
+    def append(self, problem: Problem) -> None:
+        """Add a newly written problem to the current snapshot without a refetch."""
+        self.extend([problem])
+    
+    def extend(self, new_problems: List[Problem], synced: bool = False) -> Optional[CatalogSnapshot]:
+        """Add appended rows to the current snapshot without a full refetch.
+        
+        Args:
+            new_problems: Problems appended after the current ones
+            synced: True when the rows came from a sync, which also makes the
+                snapshot fresh again
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or not new_problems:
+                return snapshot
+            self._version += 1
+            index = snapshot.index.extended(new_problems)
+            fetched_at = time.time() if synced else snapshot.fetched_at
+            self._snapshot = CatalogSnapshot(index.problems, fetched_at, self._version, index)
+            return self._snapshot
+    
+    def touch(self) -> Optional[CatalogSnapshot]:
+        """Mark the current snapshot fresh after a sync found no changes."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return None
+            self._snapshot = CatalogSnapshot(snapshot.problems, time.time(), snapshot.version, snapshot.index)
+            return self._snapshot
+    
+    def install(self, problems: List[Problem], fetched_at: Optional[float] = None) -> CatalogSnapshot:
+        """Swap in a fully fetched problem list.
+        
+        Args:
+            problems: The complete catalog
+            fetched_at: When it was fetched (defaults to now)
+        """
+        with self._lock:
+            self._version += 1
+            index = ProblemIndex(problems)
+            previous = self._snapshot
+            if previous is not None and index.extends(previous.index):
+                # Append-only change: keep per-user decks valid
+                index.lineage = previous.index.lineage
+            fetched_at = fetched_at if fetched_at is not None else time.time()
+            snapshot = CatalogSnapshot(problems, fetched_at, self._version, index)
+            self._snapshot = snapshot
+        return snapshot
+    
+    @property
+    def version(self) -> int:
+        """Version of the current snapshot (0 before the first fetch)."""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+    
+    def age(self) -> Optional[float]:
+        """Seconds since the current snapshot was fetched, or None if empty."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return time.time() - snapshot.fetched_at
+    
+    def is_stale(self) -> bool:
+        """Whether the snapshot is missing or older than the TTL."""
+        age = self.age()
+        return age is None or age >= self.ttl
+    
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/refresh counters and the current snapshot age."""
+        age = self.age()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+            'fetches_saved': self.flight.saved,
+            'age_seconds': age if age is not None else -1,
+        }
+    
+    async def run_refresh_loop(self) -> None:
+        """Keep the snapshot fresh in the background until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            age = self.age()
+            # With no snapshot yet, warm the cache right away
+            delay = 0 if age is None else max(self.ttl - age, 0)
+            await asyncio.sleep(delay)
+            try:
+                snapshot = await loop.run_in_executor(None, self.refresh)
+                logger.info(f"Refreshed problem catalog ({len(self._snapshot.problems)} problems)")
+                # Build the search index here rather than on the first /search
+                await loop.run_in_executor(None, snapshot.index.search_index)
+            except Exception as e:
+                # Keep serving the last good snapshot; retry after a full TTL
+                logger.error(f"Catalog refresh failed, serving stale snapshot: {e}")
+                await asyncio.sleep(self.ttl)
+
+
+# A1 range: optional sheet name (quoted, with '' for a quote, or bare), then columns and rows
+_A1_RANGE = re.compile(r"^(?:(?:'((?:[^']|'')+)'|([^'!]+))!)?([A-Z]+)(\d*)(?::([A-Z]+)\d*)?$")
+
+
+def parse_range(range_name: str) -> Tuple[str, str, int, str]:
+    """Split an A1 range like 'Sheet1!A2:E' into (sheet, first column, first row, last column).
+    
+    Raises:
+        ValueError: If the range is not in A1 notation
+    """
+    match = _A1_RANGE.match(range_name or '')
+    if not match:
+        raise ValueError(f"Invalid A1 range: {range_name!r}")
+    quoted, bare, first_column, first_row, last_column = match.groups()
+    sheet = quoted.replace("''", "'") if quoted else bare
+    return sheet or 'Sheet1', first_column, int(first_row or 1), last_column or first_column
+
+
+def quote_sheet_name(sheet: str) -> str:
+    """Sheet name quoted for an A1 range, doubling any embedded quotes."""
+    return "'" + sheet.replace("'", "''") + "'"
 
 
 class SheetsService:
@@ -16,41 +292,199 @@ class SheetsService:
     
     SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
     
-    def __init__(self):
-        """Initialize Google Sheets service."""
-        creds = Credentials.from_service_account_file(
-            Config.GOOGLE_CREDENTIALS_FILE,
-            scopes=self.SCOPES
-        )
-        self.service = build('sheets', 'v4', credentials=creds)
+    # Seconds between checks for a snapshot file rewritten by another shard
+    FOLLOW_INTERVAL = 5.0
+    
+    def __init__(self, service_factory: Optional[Callable[[], Any]] = None, owns_snapshot: bool = True):
+        """Initialize Google Sheets service.
+        
+        Args:
+            service_factory: Optional callable building the Sheets API resource
+                (used by benchmarks to swap in a fake); defaults to the real
+                API with service account credentials
+            owns_snapshot: Whether this process writes the snapshot file; shard
+                workers other than 0 only read it
+        """
+        self._service_factory = service_factory
+        self._creds = None
+        if service_factory is None:
+            self._creds = Credentials.from_service_account_file(
+                Config.GOOGLE_CREDENTIALS_FILE,
+                scopes=self.SCOPES
+            )
+        # googleapiclient's HTTP transport is not thread-safe, so each worker
+        # thread gets its own service object
+        self._local = threading.local()
         self.sheet_id = Config.GOOGLE_SHEETS_ID
         self.range_name = Config.GOOGLE_SHEETS_RANGE
+        self.sheet_name, self.first_column, self.start_row, self.last_column = parse_range(self.range_name)
+        
+        # Incremental sync state: raw rows already in the catalog and the last
+        # of them, used to detect edits before trusting a tail-only fetch
+        self._rows_lock = threading.Lock()
+        self._synced_rows = 0
+        self._last_row: Optional[list] = None
+        self._last_full_sync = 0.0
+        self._needs_full_sync = True
+        
+        # Local copy of the catalog for fast startup and Sheets outages
+        self.snapshot_file = (
+            CatalogSnapshotFile(Config.CATALOG_SNAPSHOT_PATH) if Config.CATALOG_SNAPSHOT_PATH else None
+        )
+        self._saved_version: Optional[int] = None
+        self.owns_snapshot = owns_snapshot
+        
+        self.catalog = CatalogCache(
+            self.fetch_all_problems,
+            Config.CATALOG_TTL_SECONDS,
+            syncer=self.sync_catalog,
+            on_refresh=self._save_snapshot
+        )
+    
+    @property
+    def service(self):
+        """Sheets API resource bound to the calling thread."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            if self._service_factory is not None:
+                service = self._service_factory()
+            else:
+                service = build('sheets', 'v4', credentials=self._creds)
+            self._local.service = service
+        return service
+    
+    def load_snapshot(self) -> bool:
+        """Serve the catalog from the local snapshot file until Sheets is reached.
+        
+        Returns:
+            True if a snapshot was loaded
+        """
+        if self.snapshot_file is None:
+            return False
+        stored = self.snapshot_file.load()
+        if stored is None:
+            return False
+        
+        with self._rows_lock:
+            self._synced_rows = stored.synced_rows
+            self._last_row = stored.last_row
+            self._last_full_sync = stored.fetched_at
+            self._needs_full_sync = False
+            snapshot = self.catalog.install(stored.problems, fetched_at=stored.fetched_at)
+            self._saved_version = snapshot.version
+        
+        logger.info(
+            f"Loaded {len(stored.problems)} problems from {self.snapshot_file.path} "
+            f"({self.snapshot_file.age():.0f}s old)"
+        )
+        return True
+    
+    def _save_snapshot(self, _: CatalogSnapshot) -> None:
+        """Persist the catalog after a sync, if it changed since the last save."""
+        if self.snapshot_file is None or not self.owns_snapshot:
+            return
+        with self._rows_lock:
+            snapshot = self.catalog.get()
+            if snapshot.version == self._saved_version:
+                return
+            self.snapshot_file.save(snapshot.problems, snapshot.fetched_at, self._synced_rows, self._last_row)
+            self._saved_version = snapshot.version
+    
+    async def run_follow_loop(self) -> None:
+        """Reload the snapshot file whenever its owner rewrites it, until cancelled.
+        
+        Used instead of the refresh loop by shard workers that do not own the
+        snapshot, so only one process polls Google Sheets.
+        """
+        loop = asyncio.get_running_loop()
+        modified_at = self.snapshot_file.modified_at()
+        while True:
+            await asyncio.sleep(self.FOLLOW_INTERVAL)
+            current = self.snapshot_file.modified_at()
+            if current is None or current == modified_at:
+                continue
+            modified_at = current
+            try:
+                if await loop.run_in_executor(None, self.load_snapshot):
+                    await loop.run_in_executor(None, self.catalog.get().index.search_index)
+            except Exception as e:
+                logger.error(f"Could not reload catalog snapshot: {e}")
+    
+    def stats(self) -> Dict[str, float]:
+        """Catalog cache counters plus the age of the on-disk snapshot."""
+        stats = self.catalog.stats()
+        age = self.snapshot_file.age() if self.snapshot_file else None
+        stats['snapshot_file_age_seconds'] = age if age is not None else -1
+        return stats
     
     def get_all_problems(self) -> List[Problem]:
-        """Fetch all problems from Google Sheets."""
+        """Get all problems from the cached catalog snapshot."""
+        return self.catalog.get().problems
+    
+    def _get_values(self, range_name: str) -> List[list]:
+        """Read raw cell values for a range."""
         try:
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=self.range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            problems = []
-            
-            for row in values:
-                # Ensure row has at least 5 columns (id, title, difficulty, topic, url)
-                if len(row) >= 5:
-                    problems.append(Problem(
-                        id=row[0].strip() if row[0] else "",
-                        title=row[1].strip() if row[1] else "",
-                        difficulty=row[2].strip().lower() if row[2] else "",
-                        topic=row[3].strip() if row[3] else "",
-                        url=row[4].strip() if row[4] else ""
-                    ))
-            
-            return problems
+            with sheets_call('values.get'):
+                result = self.service.spreadsheets().values().get(
+                    spreadsheetId=self.sheet_id,
+                    range=range_name
+                ).execute()
         except HttpError as error:
             raise Exception(f"Error fetching problems from Google Sheets: {error}")
+        return result.get('values', [])
+    
+    @staticmethod
+    def _parse_rows(values: List[list]) -> List[Problem]:
+        """Turn raw sheet rows into problems."""
+        problems = []
+        for row in values:
+            # Ensure row has at least 5 columns (id, title, difficulty, topic, url)
+            if len(row) >= 5:
+                problems.append(Problem(
+                    id=row[0].strip() if row[0] else "",
+                    title=row[1].strip() if row[1] else "",
+                    difficulty=row[2].strip().lower() if row[2] else "",
+                    topic=row[3].strip() if row[3] else "",
+                    url=row[4].strip() if row[4] else ""
+                ))
+        return problems
+    
+    def fetch_all_problems(self) -> List[Problem]:
+        """Fetch all problems from Google Sheets, bypassing the cache."""
+        with self._rows_lock:
+            values = self._get_values(self.range_name)
+            self._synced_rows = len(values)
+            self._last_row = values[-1] if values else None
+            self._last_full_sync = time.time()
+            self._needs_full_sync = False
+        return self._parse_rows(values)
+    
+    def sync_catalog(self) -> CatalogSnapshot:
+        """Bring the cached catalog up to date with as little reading as possible.
+        
+        Re-reads only the tail of the sheet starting at the last synced row.
+        If that row is unchanged, only rows appended after it are applied;
+        otherwise (or every CATALOG_FULL_SYNC_SECONDS, to catch edits further
+        up) the whole range is reloaded.
+        """
+        with self._rows_lock:
+            due_full = time.time() - self._last_full_sync >= Config.CATALOG_FULL_SYNC_SECONDS
+            if not (self._needs_full_sync or due_full or self._synced_rows == 0):
+                overlap_row = self.start_row + self._synced_rows - 1
+                tail = self._get_values(
+                    f"{quote_sheet_name(self.sheet_name)}!{self.first_column}{overlap_row}:{self.last_column}"
+                )
+                if tail and tail[0] == self._last_row:
+                    new_rows = tail[1:]
+                    if not new_rows:
+                        return self.catalog.touch()
+                    self._synced_rows += len(new_rows)
+                    self._last_row = new_rows[-1]
+                    logger.info(f"Catalog sync: {len(new_rows)} appended rows")
+                    return self.catalog.extend(self._parse_rows(new_rows), synced=True)
+                logger.info("Catalog sync: edits detected, reloading full range")
+        
+        return self.catalog.install(self.fetch_all_problems())
     
     def get_random_problem(self, difficulty: Optional[str] = None, exclude_ids: Optional[Set[str]] = None) -> Optional[Problem]:
         """Get a random problem, optionally filtered by difficulty and excluding certain IDs.
@@ -59,64 +493,235 @@ class SheetsService:
             difficulty: Optional difficulty filter ('easy', 'medium', 'hard')
             exclude_ids: Set of problem IDs to exclude from selection
         """
-        problems = self.get_all_problems()
+        return self.catalog.get().index.pick(difficulty, exclude_ids=exclude_ids)
+    
+    def has_problems(self, problems: List[Problem]) -> bool:
+        """Sync the catalog and check whether all the given problems are in the sheet.
         
-        if not problems:
-            return None
+        Goes through the catalog's single flight, so the checks after a burst
+        of failed appends share one read of the sheet.
+        """
+        snapshot = self.catalog.refresh()
+        if snapshot is None:
+            return False
+        positions = snapshot.index.positions
+        return all(problem.id in positions for problem in problems)
+    
+    def add_problem(self, problem: Problem) -> bool:
+        """Add a new problem to Google Sheets."""
+        return self.append_problems([problem])
+    
+    def append_problems(self, problems: List[Problem]) -> bool:
+        """Append problems after the last row of the sheet in a single call.
         
-        # Filter out excluded problems
-        if exclude_ids:
-            problems = [p for p in problems if p.id not in exclude_ids]
+        Uses the values.append API, so no read is needed to find the next row
+        and concurrent writers cannot overwrite each other's rows.
+        """
+        rows = [
+            [problem.id, problem.title, problem.difficulty, problem.topic, problem.url]
+            for problem in problems
+        ]
+        with self._rows_lock:
+            try:
+                with sheets_call('values.append'):
+                    result = self.service.spreadsheets().values().append(
+                        spreadsheetId=self.sheet_id,
+                        range=self.range_name,
+                        valueInputOption='RAW',
+                        insertDataOption='INSERT_ROWS',
+                        body={'values': rows}
+                    ).execute()
+            except HttpError as error:
+                raise Exception(f"Error adding problem to Google Sheets: {error}")
+            
+            # Our rows only extend the synced tail if they landed right after it;
+            # otherwise someone else appended too and the next sync reloads
+            try:
+                first_row = parse_range(result.get('updates', {}).get('updatedRange', ''))[2]
+            except ValueError:
+                first_row = None
+            if first_row == self.start_row + self._synced_rows:
+                self._synced_rows += len(rows)
+                self._last_row = rows[-1]
+            else:
+                self._needs_full_sync = True
+            
+            self.catalog.extend(problems)
+        return True
+
+
+class ProblemWriteQueue:
+    """Batches problem writes from many coroutines into periodic Sheets appends.
+    
+    Each submitter awaits a future that resolves once its row is committed
+    (or raises if the batch containing it failed).
+    """
+    
+    def __init__(self, write_batch: Callable[[List[Problem]], Awaitable[Any]],
+                 flush_interval: float, batch_size: int):
+        """Initialize the queue.
         
-        if not problems:
-            return None
+        Args:
+            write_batch: Coroutine function that writes a list of problems
+            flush_interval: Seconds to collect rows before a flush
+            batch_size: Maximum rows per write call
+        """
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending: List[tuple] = []
+        self._flusher: Optional[asyncio.Task] = None
         
-        # Filter by difficulty if specified
-        if difficulty:
-            difficulty = difficulty.lower()
-            filtered = [p for p in problems if p.difficulty == difficulty]
-            if filtered:
-                return random.choice(filtered)
-            # If no problems found for difficulty, return random from all (excluding excluded)
-            if problems:
-                return random.choice(problems)
-            return None
+        # Counters
+        self.rows_written = 0
+        self.batches_written = 0
+    
+    def submit_many(self, problems: List[Problem]) -> List[asyncio.Future]:
+        """Queue problems for writing; returns one future per problem."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for problem in problems:
+            future = loop.create_future()
+            self._pending.append((problem, future))
+            futures.append(future)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run_flusher())
+        return futures
+    
+    async def submit(self, problem: Problem) -> bool:
+        """Queue a problem and wait until its row is committed."""
+        return await self.submit_many([problem])[0]
+    
+    async def _run_flusher(self) -> None:
+        """Flush queued rows every interval until the queue is empty."""
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                await self._flush(batch)
+    
+    async def _flush(self, batch: List[tuple]) -> None:
+        """Write one batch and resolve its futures."""
+        try:
+            await self._write_batch([problem for problem, _ in batch])
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} problems to Google Sheets: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
         
-        return random.choice(problems)
+        self.rows_written += len(batch)
+        self.batches_written += 1
+        for _, future in batch:
+            if not future.done():
+                future.set_result(True)
+
+
+class AsyncSheetsService:
+    """Async facade over SheetsService for use from the event loop.
     
-    def add_problem(self, problem: Problem) -> bool:
-        """Add a new problem to Google Sheets."""
+    Blocking Sheets API calls run on a bounded thread pool with a per-call
+    timeout (except appends, see _append). Reads that can be served from the
+    catalog snapshot skip the pool.
+    """
+    
+    def __init__(self, sheets: SheetsService, max_concurrency: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """Initialize the facade.
+        
+        Args:
+            sheets: Underlying synchronous service
+            max_concurrency: Maximum concurrent Sheets calls (defaults to Config)
+            timeout: Per-call timeout in seconds (defaults to Config)
+        """
+        self.sync = sheets
+        self.catalog = sheets.catalog
+        self.timeout = timeout if timeout is not None else Config.SHEETS_TIMEOUT_SECONDS
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency or Config.SHEETS_MAX_CONCURRENCY,
+            thread_name_prefix='sheets'
+        )
+        # Coroutines waiting on the first catalog load share one executor call
+        self._load_flight = SingleFlight()
+        self.writes = ProblemWriteQueue(
+            self._append,
+            Config.SHEETS_WRITE_FLUSH_INTERVAL,
+            Config.SHEETS_WRITE_BATCH_SIZE
+        )
+    
+    async def _run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a blocking call on the Sheets executor with a timeout."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
         try:
-            # Get the next available row
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.sheet_id,
-                range=self.range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            next_row = len(values) + 2  # +2 because range starts at row 2 (skip header)
-            
-            # Prepare the row data
-            row_data = [
-                problem.id,
-                problem.title,
-                problem.difficulty,
-                problem.topic,
-                problem.url
-            ]
-            
-            # Append the row
-            body = {
-                'values': [row_data]
-            }
-            
-            self.service.spreadsheets().values().update(
-                spreadsheetId=self.sheet_id,
-                range=f'Sheet1!A{next_row}:E{next_row}',
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-            
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise Exception(f"Google Sheets call {func.__name__} timed out after {self.timeout}s")
+    
+    async def _append(self, problems: List[Problem]) -> bool:
+        """Append rows on the Sheets executor without the per-call timeout.
+        
+        Appends are not idempotent: a timed-out call keeps running and may
+        still land, so reporting it as failed would invite a retry that writes
+        the rows twice. The API client's own HTTP timeout bounds the call, and
+        if it fails anyway the sheet's tail is checked before giving up.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self.sync.append_problems, problems)
+        except Exception as e:
+            try:
+                landed = await self._run(self.sync.has_problems, problems)
+            except Exception as sync_error:
+                logger.error(f"Could not check the sheet after a failed append: {sync_error}")
+                landed = False
+            if not landed:
+                raise
+            logger.warning(f"Append of {len(problems)} problems reported an error but the rows are in the sheet: {e}")
             return True
-        except HttpError as error:
-            raise Exception(f"Error adding problem to Google Sheets: {error}")
+    
+    async def _get_snapshot(self) -> CatalogSnapshot:
+        """Get the catalog snapshot, loading it off the event loop if needed."""
+        if self.catalog.age() is not None:
+            return self.catalog.get()
+        return await self._load_flight.do_async(lambda: self._run(self.catalog.get))
+    
+    async def get_all_problems(self) -> List[Problem]:
+        """Get all problems without blocking the event loop."""
+        return (await self._get_snapshot()).problems
+    
+    async def get_index(self) -> ProblemIndex:
+        """Get the index of the current catalog snapshot without blocking the event loop."""
+        return (await self._get_snapshot()).index
+    
+    async def get_search_index(self, index: Optional[ProblemIndex] = None) -> SearchIndex:
+        """Get the search index of a snapshot (the current one by default), building it off the event loop if needed."""
+        if index is None:
+            index = await self.get_index()
+        if index.has_search_index():
+            return index.search_index()
+        return await asyncio.get_running_loop().run_in_executor(None, index.search_index)
+    
+    async def get_random_problem(self, difficulty: Optional[str] = None,
+                                 exclude_ids: Optional[Set[str]] = None) -> Optional[Problem]:
+        """Get a random problem without blocking the event loop."""
+        index = await self.get_index()
+        return index.pick(difficulty, exclude_ids=exclude_ids)
+    
+    def fetches_saved(self) -> int:
+        """Sheets reads avoided by coalescing concurrent catalog loads."""
+        return self.catalog.flight.saved + self._load_flight.saved
+    
+    async def add_problem(self, problem: Problem) -> bool:
+        """Queue a problem for the next batched append and wait until it is committed."""
+        return await self.writes.submit(problem)
+    
+    def add_problems(self, problems: List[Problem]) -> List[asyncio.Future]:
+        """Queue many problems for batched appends; returns one future per problem."""
+        return self.writes.submit_many(problems)
+    
+    def shutdown(self) -> None:
+        """Release the worker threads."""
+        self._executor.shutdown(wait=False)
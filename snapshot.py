@@ -0,0 +1,107 @@
+"""Local on-disk copy of the problem catalog."""
+
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from models import Problem
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class StoredCatalog:
+    """Catalog contents and sync position as read from disk."""
+    problems: List[Problem]
+    fetched_at: float
+    synced_rows: int
+    last_row: Optional[list]
+
+
+class CatalogSnapshotFile:
+    """Compact JSON-lines snapshot of the catalog, written atomically.
+
+    The first line is a header with the fetch time and sync position; every
+    following line is one problem as a JSON array. Files are written to a
+    temporary name and renamed into place, so a crash never leaves a torn
+    snapshot behind.
+    """
+
+    def __init__(self, path: str):
+        """Initialize for the given file path."""
+        self.path = path
+        self.saved_at: Optional[float] = None  # Fetch time of the catalog on disk
+
+    def age(self) -> Optional[float]:
+        """Seconds since the catalog on disk was fetched from Sheets, or None."""
+        if self.saved_at is None:
+            return None
+        return time.time() - self.saved_at
+
+    def modified_at(self) -> Optional[float]:
+        """Modification time of the file, or None if it does not exist."""
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def save(self, problems: List[Problem], fetched_at: float, synced_rows: int,
+             last_row: Optional[list]) -> None:
+        """Atomically replace the snapshot file."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        header = {
+            'format': FORMAT_VERSION,
+            'fetched_at': fetched_at,
+            'synced_rows': synced_rows,
+            'last_row': last_row,
+            'count': len(problems),
+        }
+        fd, tmp_path = tempfile.mkstemp(prefix='.catalog-', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header, separators=(',', ':')) + '\n')
+                for p in problems:
+                    f.write(json.dumps([p.id, p.title, p.difficulty, p.topic, p.url],
+                                       ensure_ascii=False, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.saved_at = fetched_at
+
+    def load(self) -> Optional[StoredCatalog]:
+        """Read the snapshot file, or return None if it is missing or unreadable."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+
+        try:
+            with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header = json.loads(data.readline())
+                if header.get('format') != FORMAT_VERSION:
+                    logger.warning(f"Ignoring catalog snapshot {self.path} with unknown format")
+                    return None
+                problems = [
+                    Problem(*json.loads(line))
+                    for line in iter(data.readline, b'')
+                ]
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Could not read catalog snapshot {self.path}: {e}")
+            return None
+
+        if len(problems) != header.get('count'):
+            logger.warning(f"Ignoring truncated catalog snapshot {self.path}")
+            return None
+
+        self.saved_at = header['fetched_at']
+        return StoredCatalog(problems, header['fetched_at'], header['synced_rows'], header['last_row'])
@@ -0,0 +1,536 @@
+"""Persistent storage backends for per-user bot state."""
+
+import json
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import Assignment, UserPrefs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class UserState:
+    """All per-user state held by the handlers."""
+    prefs: Dict[int, UserPrefs] = field(default_factory=dict)
+    completed: Dict[int, Set[str]] = field(default_factory=dict)
+    recent: Dict[int, list] = field(default_factory=dict)
+    conversations: Dict[int, Dict] = field(default_factory=dict)
+    assignments: Dict[int, Assignment] = field(default_factory=dict)
+
+
+class StateStore:
+    """Interface for persisting per-user bot state.
+
+    Handlers keep working on their in-memory dicts and report every change
+    here; backends decide how and when the change reaches durable storage.
+    """
+
+    def load(self, shard_index: int = 0, shard_count: int = 1) -> UserState:
+        """Load stored state for the users owned by one shard.
+
+        Args:
+            shard_index: Shard whose users to load
+            shard_count: Total number of shards (1 loads every user)
+        """
+        raise NotImplementedError
+
+    def save_prefs(self, prefs: UserPrefs) -> None:
+        """Store a user's preferences."""
+        raise NotImplementedError
+
+    def delete_prefs(self, user_id: int) -> None:
+        """Forget a user's (or unsubscribed chat's) preferences."""
+        raise NotImplementedError
+
+    def add_completed(self, user_id: int, problem_id: str) -> None:
+        """Record a problem as done or discarded by a user."""
+        raise NotImplementedError
+
+    def save_recent(self, user_id: int, recent: list) -> None:
+        """Store a user's recently sent problem IDs."""
+        raise NotImplementedError
+
+    def save_conversation(self, user_id: int, data: Optional[Dict]) -> None:
+        """Store a user's in-progress /add data, or delete it when None."""
+        raise NotImplementedError
+
+    def delete_progress(self, user_id: int) -> None:
+        """Forget a user's (or migrated chat's) completed and recent problems and daily pick."""
+        raise NotImplementedError
+
+    def save_assignment(self, user_id: int, assignment: Optional[Assignment]) -> None:
+        """Store a user's precomputed daily pick, or delete it when None."""
+        raise NotImplementedError
+
+    def save_slot(self, user_id: int, slot: int) -> None:
+        """Store the minute-of-day slot a user's daily problem is sent in."""
+        raise NotImplementedError
+
+    def remove_slot(self, user_id: int) -> None:
+        """Stop scheduling daily problems for a user or chat."""
+        raise NotImplementedError
+
+    def has_schedule(self, shard_index: int = 0, shard_count: int = 1) -> bool:
+        """Whether any slots are stored for a shard's users."""
+        raise NotImplementedError
+
+    def due_users(self, slot: int, day: str, shard_index: int = 0, shard_count: int = 1) -> List[int]:
+        """Users in a slot who have not been sent a daily problem on a day.
+
+        Args:
+            slot: Minute-of-day slot
+            day: Local date (YYYY-MM-DD) the slot falls on
+            shard_index: Shard whose users to return
+            shard_count: Total number of shards
+        """
+        raise NotImplementedError
+
+    def mark_delivered(self, user_id: int, day: str) -> None:
+        """Record that a user was sent their daily problem for a day."""
+        raise NotImplementedError
+
+    def load_last_dispatch(self, shard_index: int = 0) -> Optional[float]:
+        """Epoch time of the last slot the shard's dispatcher finished, if any."""
+        raise NotImplementedError
+
+    def save_last_dispatch(self, shard_index: int, slot_time: float) -> None:
+        """Store the epoch time of the last slot the dispatcher finished."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write out any pending changes."""
+
+    def close(self) -> None:
+        """Flush pending changes and release resources."""
+        self.flush()
+
+
+class MemoryStateStore(StateStore):
+    """State store that keeps everything in process memory (for tests and local runs)."""
+
+    def __init__(self):
+        """Initialize empty in-memory state."""
+        self.state = UserState()
+        self.slots: Dict[int, Set[int]] = {}
+        self.user_slots: Dict[int, int] = {}
+        self.delivered: Dict[int, str] = {}
+        self.last_dispatch: Dict[int, float] = {}
+
+    def load(self, shard_index: int = 0, shard_count: int = 1) -> UserState:
+        """Return copies of the stored state."""
+        def owned(user_id: int) -> bool:
+            return abs(user_id) % shard_count == shard_index
+
+        return UserState(
+            prefs={user_id: UserPrefs(p.user_id, p.difficulty, p.schedule_time, p.topic)
+                   for user_id, p in self.state.prefs.items() if owned(user_id)},
+            completed={user_id: set(ids) for user_id, ids in self.state.completed.items() if owned(user_id)},
+            recent={user_id: list(ids) for user_id, ids in self.state.recent.items() if owned(user_id)},
+            conversations={user_id: dict(data)
+                           for user_id, data in self.state.conversations.items() if owned(user_id)},
+            assignments={user_id: Assignment(a.problem_id, a.difficulty, a.topic, a.bucket)
+                         for user_id, a in self.state.assignments.items() if owned(user_id)},
+        )
+
+    def save_prefs(self, prefs: UserPrefs) -> None:
+        self.state.prefs[prefs.user_id] = UserPrefs(prefs.user_id, prefs.difficulty, prefs.schedule_time, prefs.topic)
+
+    def delete_prefs(self, user_id: int) -> None:
+        self.state.prefs.pop(user_id, None)
+
+    def add_completed(self, user_id: int, problem_id: str) -> None:
+        self.state.completed.setdefault(user_id, set()).add(problem_id)
+
+    def save_recent(self, user_id: int, recent: list) -> None:
+        self.state.recent[user_id] = list(recent)
+
+    def delete_progress(self, user_id: int) -> None:
+        self.state.completed.pop(user_id, None)
+        self.state.recent.pop(user_id, None)
+        self.state.assignments.pop(user_id, None)
+
+    def save_conversation(self, user_id: int, data: Optional[Dict]) -> None:
+        if data is None:
+            self.state.conversations.pop(user_id, None)
+        else:
+            self.state.conversations[user_id] = dict(data)
+
+    def save_assignment(self, user_id: int, assignment: Optional[Assignment]) -> None:
+        if assignment is None:
+            self.state.assignments.pop(user_id, None)
+        else:
+            self.state.assignments[user_id] = Assignment(
+                assignment.problem_id, assignment.difficulty, assignment.topic, assignment.bucket
+            )
+
+    def save_slot(self, user_id: int, slot: int) -> None:
+        old_slot = self.user_slots.get(user_id)
+        if old_slot is not None:
+            self.slots[old_slot].discard(user_id)
+        self.slots.setdefault(slot, set()).add(user_id)
+        self.user_slots[user_id] = slot
+
+    def remove_slot(self, user_id: int) -> None:
+        old_slot = self.user_slots.pop(user_id, None)
+        if old_slot is not None:
+            self.slots[old_slot].discard(user_id)
+
+    def has_schedule(self, shard_index: int = 0, shard_count: int = 1) -> bool:
+        return any(abs(user_id) % shard_count == shard_index for user_id in self.user_slots)
+
+    def due_users(self, slot: int, day: str, shard_index: int = 0, shard_count: int = 1) -> List[int]:
+        return [user_id for user_id in self.slots.get(slot, ())
+                if self.delivered.get(user_id) != day and abs(user_id) % shard_count == shard_index]
+
+    def mark_delivered(self, user_id: int, day: str) -> None:
+        self.delivered[user_id] = day
+
+    def load_last_dispatch(self, shard_index: int = 0) -> Optional[float]:
+        return self.last_dispatch.get(shard_index)
+
+    def save_last_dispatch(self, shard_index: int, slot_time: float) -> None:
+        self.last_dispatch[shard_index] = slot_time
+
+
+class SQLiteStateStore(StateStore):
+    """State store backed by a local SQLite database in WAL mode.
+
+    Writes are queued in memory (coalesced per user where only the latest
+    value matters) and flushed in batched transactions by a background
+    writer thread, so handlers never wait on disk I/O.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS user_prefs (
+            user_id INTEGER PRIMARY KEY,
+            difficulty TEXT,
+            schedule_time TEXT,
+            topic TEXT
+        );
+        CREATE TABLE IF NOT EXISTS completed_problems (
+            user_id INTEGER NOT NULL,
+            problem_id TEXT NOT NULL,
+            PRIMARY KEY (user_id, problem_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS recent_problems (
+            user_id INTEGER PRIMARY KEY,
+            problem_ids TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS assignments (
+            user_id INTEGER PRIMARY KEY,
+            problem_id TEXT NOT NULL,
+            difficulty TEXT,
+            topic TEXT,
+            bucket TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS schedule (
+            user_id INTEGER PRIMARY KEY,
+            slot INTEGER NOT NULL,
+            delivered_on TEXT
+        );
+        CREATE INDEX IF NOT EXISTS schedule_slot ON schedule (slot);
+        CREATE TABLE IF NOT EXISTS scheduler_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    # Seconds to wait for another process's write lock
+    BUSY_TIMEOUT = 30
+    # Write queues in the order flush() takes them
+    _QUEUES = ('_prefs', '_completed', '_recent', '_conversations', '_assignments', '_slots',
+               '_delivered', '_scheduler_state', '_cleared')
+    
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        """Open (or create) the database and start the writer thread.
+
+        Args:
+            path: SQLite database file
+            flush_interval: Seconds between batched flushes
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        # Sharded workers share the database, so wait out other writers' locks
+        self._conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._prefs: Dict[int, Optional[Tuple[Optional[str], Optional[str], Optional[str]]]] = {}
+        self._completed: List[Tuple[int, str]] = []
+        self._recent: Dict[int, Optional[str]] = {}
+        self._conversations: Dict[int, Optional[str]] = {}
+        self._assignments: Dict[int, Optional[Tuple[str, Optional[str], Optional[str], str]]] = {}
+        self._slots: Dict[int, Optional[int]] = {}
+        self._delivered: Dict[int, str] = {}
+        self._scheduler_state: Dict[str, str] = {}
+        self._cleared: Set[int] = set()  # Users whose completed rows are deleted
+
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._run_writer, name='state-writer', daemon=True)
+        self._writer.start()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database was created."""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(user_prefs)")}
+        if 'topic' not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE user_prefs ADD COLUMN topic TEXT")
+
+    def load(self, shard_index: int = 0, shard_count: int = 1) -> UserState:
+        """Bulk-load stored state for the users owned by one shard."""
+        state = UserState()
+        shard = (shard_count, shard_index)
+        with self._db_lock:
+            for user_id, difficulty, schedule_time, topic in self._conn.execute(
+                "SELECT user_id, difficulty, schedule_time, topic FROM user_prefs WHERE abs(user_id) % ? = ?", shard
+            ):
+                state.prefs[user_id] = UserPrefs(user_id, difficulty, schedule_time, topic)
+            for user_id, problem_id in self._conn.execute(
+                "SELECT user_id, problem_id FROM completed_problems WHERE abs(user_id) % ? = ?", shard
+            ):
+                state.completed.setdefault(user_id, set()).add(problem_id)
+            for user_id, problem_ids in self._conn.execute(
+                "SELECT user_id, problem_ids FROM recent_problems WHERE abs(user_id) % ? = ?", shard
+            ):
+                state.recent[user_id] = json.loads(problem_ids)
+            for user_id, data in self._conn.execute(
+                "SELECT user_id, data FROM conversations WHERE abs(user_id) % ? = ?", shard
+            ):
+                state.conversations[user_id] = json.loads(data)
+            for user_id, problem_id, difficulty, topic, bucket in self._conn.execute(
+                "SELECT user_id, problem_id, difficulty, topic, bucket FROM assignments WHERE abs(user_id) % ? = ?",
+                shard
+            ):
+                state.assignments[user_id] = Assignment(problem_id, difficulty, topic, bucket)
+
+        logger.info(f"Loaded state for {len(state.prefs)} users from {self.path}")
+        return state
+
+    def save_prefs(self, prefs: UserPrefs) -> None:
+        with self._lock:
+            self._prefs[prefs.user_id] = (prefs.difficulty, prefs.schedule_time, prefs.topic)
+
+    def delete_prefs(self, user_id: int) -> None:
+        with self._lock:
+            self._prefs[user_id] = None
+
+    def add_completed(self, user_id: int, problem_id: str) -> None:
+        with self._lock:
+            self._completed.append((user_id, problem_id))
+
+    def save_recent(self, user_id: int, recent: list) -> None:
+        with self._lock:
+            self._recent[user_id] = json.dumps(list(recent))
+
+    def delete_progress(self, user_id: int) -> None:
+        with self._lock:
+            # Completed rows queued earlier would otherwise be written after the delete
+            self._completed = [entry for entry in self._completed if entry[0] != user_id]
+            self._cleared.add(user_id)
+            self._recent[user_id] = None
+            self._assignments[user_id] = None
+
+    def save_conversation(self, user_id: int, data: Optional[Dict]) -> None:
+        with self._lock:
+            self._conversations[user_id] = json.dumps(data) if data is not None else None
+
+    def save_assignment(self, user_id: int, assignment: Optional[Assignment]) -> None:
+        with self._lock:
+            self._assignments[user_id] = (
+                (assignment.problem_id, assignment.difficulty, assignment.topic, assignment.bucket)
+                if assignment is not None else None
+            )
+
+    def save_slot(self, user_id: int, slot: int) -> None:
+        with self._lock:
+            self._slots[user_id] = slot
+
+    def remove_slot(self, user_id: int) -> None:
+        with self._lock:
+            self._slots[user_id] = None
+
+    def has_schedule(self, shard_index: int = 0, shard_count: int = 1) -> bool:
+        with self._lock:
+            if any(slot is not None and abs(user_id) % shard_count == shard_index
+                   for user_id, slot in self._slots.items()):
+                return True
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM schedule WHERE abs(user_id) % ? = ? LIMIT 1", (shard_count, shard_index)
+            ).fetchone()
+        return row is not None
+
+    def due_users(self, slot: int, day: str, shard_index: int = 0, shard_count: int = 1) -> List[int]:
+        """Query a slot's undelivered users (flushes queued writes first, so call it off the event loop)."""
+        self.flush()
+        with self._db_lock:
+            return [user_id for user_id, in self._conn.execute(
+                "SELECT user_id FROM schedule WHERE slot = ? AND (delivered_on IS NULL OR delivered_on <> ?)"
+                " AND abs(user_id) % ? = ?",
+                (slot, day, shard_count, shard_index)
+            )]
+
+    def mark_delivered(self, user_id: int, day: str) -> None:
+        with self._lock:
+            self._delivered[user_id] = day
+
+    def load_last_dispatch(self, shard_index: int = 0) -> Optional[float]:
+        key = f"last_dispatch:{shard_index}"
+        with self._lock:
+            if key in self._scheduler_state:
+                return float(self._scheduler_state[key])
+        with self._db_lock:
+            row = self._conn.execute("SELECT value FROM scheduler_state WHERE key = ?", (key,)).fetchone()
+        return float(row[0]) if row else None
+
+    def save_last_dispatch(self, shard_index: int, slot_time: float) -> None:
+        with self._lock:
+            self._scheduler_state[f"last_dispatch:{shard_index}"] = str(slot_time)
+
+    def flush(self) -> None:
+        """Write all queued changes in a single transaction.
+
+        Flushes are serialized, so a batch that fails and is requeued can
+        never overwrite a newer batch that was written in the meantime.
+        """
+        with self._db_lock:
+            with self._lock:
+                prefs, self._prefs = self._prefs, {}
+                completed, self._completed = self._completed, []
+                recent, self._recent = self._recent, {}
+                conversations, self._conversations = self._conversations, {}
+                assignments, self._assignments = self._assignments, {}
+                slots, self._slots = self._slots, {}
+                delivered, self._delivered = self._delivered, {}
+                scheduler_state, self._scheduler_state = self._scheduler_state, {}
+                cleared, self._cleared = self._cleared, set()
+
+            batch = (prefs, completed, recent, conversations, assignments, slots, delivered, scheduler_state, cleared)
+            if not any(batch):
+                return
+
+            try:
+                with self._conn:
+                    if prefs:
+                        self._conn.executemany(
+                            "DELETE FROM user_prefs WHERE user_id = ?",
+                            [(user_id,) for user_id, values in prefs.items() if values is None]
+                        )
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO user_prefs (user_id, difficulty, schedule_time, topic) VALUES (?, ?, ?, ?)",
+                            [(user_id, *values) for user_id, values in prefs.items() if values is not None]
+                        )
+                    if cleared:
+                        self._conn.executemany(
+                            "DELETE FROM completed_problems WHERE user_id = ?",
+                            [(user_id,) for user_id in cleared]
+                        )
+                    if completed:
+                        self._conn.executemany(
+                            "INSERT OR IGNORE INTO completed_problems (user_id, problem_id) VALUES (?, ?)",
+                            completed
+                        )
+                    if recent:
+                        self._conn.executemany(
+                            "DELETE FROM recent_problems WHERE user_id = ?",
+                            [(user_id,) for user_id, ids in recent.items() if ids is None]
+                        )
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO recent_problems (user_id, problem_ids) VALUES (?, ?)",
+                            [(user_id, ids) for user_id, ids in recent.items() if ids is not None]
+                        )
+                    if conversations:
+                        self._conn.executemany(
+                            "DELETE FROM conversations WHERE user_id = ?",
+                            [(user_id,) for user_id, data in conversations.items() if data is None]
+                        )
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO conversations (user_id, data) VALUES (?, ?)",
+                            [(user_id, data) for user_id, data in conversations.items() if data is not None]
+                        )
+                    if assignments:
+                        self._conn.executemany(
+                            "DELETE FROM assignments WHERE user_id = ?",
+                            [(user_id,) for user_id, values in assignments.items() if values is None]
+                        )
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO assignments (user_id, problem_id, difficulty, topic, bucket)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            [(user_id, *values) for user_id, values in assignments.items() if values is not None]
+                        )
+                    if slots:
+                        self._conn.executemany(
+                            "DELETE FROM schedule WHERE user_id = ?",
+                            [(user_id,) for user_id, slot in slots.items() if slot is None]
+                        )
+                        self._conn.executemany(
+                            "INSERT INTO schedule (user_id, slot) VALUES (?, ?)"
+                            " ON CONFLICT (user_id) DO UPDATE SET slot = excluded.slot",
+                            [(user_id, slot) for user_id, slot in slots.items() if slot is not None]
+                        )
+                    if delivered:
+                        self._conn.executemany(
+                            "UPDATE schedule SET delivered_on = ? WHERE user_id = ?",
+                            [(day, user_id) for user_id, day in delivered.items()]
+                        )
+                    if scheduler_state:
+                        self._conn.executemany(
+                            "INSERT OR REPLACE INTO scheduler_state (key, value) VALUES (?, ?)",
+                            list(scheduler_state.items())
+                        )
+            except Exception:
+                self._requeue(batch)
+                raise
+
+    def _requeue(self, batch: tuple) -> None:
+        """Put a batch that failed to write back in the queues for the next flush.
+
+        Changes queued since the batch was taken are newer, so they win.
+        """
+        with self._lock:
+            if self._cleared:
+                # Rows queued before a newer delete must not come back with the batch
+                batch[1][:] = [entry for entry in batch[1] if entry[0] not in self._cleared]
+            for name, values in zip(self._QUEUES, batch):
+                pending = getattr(self, name)
+                if isinstance(values, list):
+                    values.extend(pending)
+                else:
+                    values.update(pending)
+                setattr(self, name, values)
+
+    def _run_writer(self) -> None:
+        """Background loop that flushes queued writes on an interval."""
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing user state to {self.path}, retrying next tick: {e}")
+
+    def close(self) -> None:
+        """Stop the writer thread, flush remaining changes and close the database."""
+        self._stop.set()
+        self._writer.join()
+        self.flush()
+        self._conn.close()
+
+
+def create_state_store(backend: str, path: str, flush_interval: float) -> StateStore:
+    """Create the state store selected by configuration."""
+    if backend == 'memory':
+        return MemoryStateStore()
+    if backend == 'sqlite':
+        return SQLiteStateStore(path, flush_interval)
+    raise ValueError(f"Unknown STATE_BACKEND: {backend}")
@@ -0,0 +1,93 @@
+"""Tests for the lazy per-user decks in deck.py."""
+
+import pytest
+
+from deck import UserDecks, permute
+from models import Problem
+from problem_index import ProblemIndex
+
+
+def make_problems(start: int, count: int):
+    return [
+        Problem(f"p{i}", f"Problem {i}", ('easy', 'medium', 'hard')[i % 3], 'Arrays', f"https://example.com/{i}")
+        for i in range(start, start + count)
+    ]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16, 17, 100, 257, 1000])
+@pytest.mark.parametrize('key', [0, 1, 0xDEADBEEF, 2**64 - 1])
+def test_permute_is_a_bijection(size, key):
+    assert sorted(permute(i, size, key) for i in range(size)) == list(range(size))
+
+
+def test_permute_depends_on_key():
+    orders = {tuple(permute(i, 50, key) for i in range(50)) for key in range(5)}
+    assert len(orders) == 5
+
+
+def test_draw_never_repeats_within_a_round():
+    index = ProblemIndex(make_problems(0, 90))
+    decks = UserDecks(1)
+    drawn = [decks.draw(index, None, (), ()).id for _ in range(90)]
+    assert len(set(drawn)) == 90
+    assert decks.decks[UserDecks.ALL].round == 1
+
+
+def test_draw_is_deterministic_per_user():
+    index = ProblemIndex(make_problems(0, 50))
+    first = [UserDecks(7).draw(index, None, (), ()).id for _ in range(10)]
+    again = [UserDecks(7).draw(index, None, (), ()).id for _ in range(10)]
+    assert first == again
+
+
+def test_draw_skips_completed_and_recent():
+    index = ProblemIndex(make_problems(0, 30))
+    completed = {f"p{i}" for i in range(0, 30, 2)}
+    recent = ['p1', 'p3']
+    decks = UserDecks(2)
+    drawn = {decks.draw(index, None, completed, recent).id for _ in range(13)}
+    assert drawn == {f"p{i}" for i in range(5, 30, 2)}
+
+
+def test_added_problems_join_the_current_round():
+    index = ProblemIndex(make_problems(0, 40))
+    decks = UserDecks(3)
+    drawn = [decks.draw(index, None, (), ()).id for _ in range(20)]
+
+    # /add appends rows: same lineage, so the deck keeps its place
+    index = index.extended(make_problems(40, 20))
+    drawn += [decks.draw(index, None, (), ()).id for _ in range(40)]
+
+    assert len(set(drawn)) == 60
+    assert decks.decks[UserDecks.ALL].round == 1
+
+
+def test_exhausted_bucket_falls_back_and_peek_does_not_restart_round():
+    index = ProblemIndex(make_problems(0, 9))
+    easy = [p.id for p in index.problems if p.difficulty == 'easy']
+    decks = UserDecks(4)
+
+    completed = set(easy)
+    problem = decks.draw(index, 'easy', completed, ())
+    assert problem is not None and problem.difficulty != 'easy'
+    deck = decks.decks['easy']
+    assert deck.exhausted is not None
+
+    # A finished round is only restarted by a real draw
+    other = UserDecks(5)
+    for _ in range(len(easy)):
+        other.draw(index, 'easy', (), ())
+    rounds = other.decks['easy'].round
+    assert other.peek(index, 'easy', (), ()) is None
+    assert other.decks['easy'].round == rounds
+    assert other.draw(index, 'easy', (), ()).difficulty == 'easy'
+    assert other.decks['easy'].round == rounds + 1
+
+
+def test_peek_then_commit_deals_the_peeked_problem():
+    index = ProblemIndex(make_problems(0, 30))
+    decks = UserDecks(6)
+    key, peeked = decks.peek(index, 'medium', (), ())
+    assert decks.peek(index, 'medium', (), ())[1] == peeked
+    assert decks.commit(index, key, peeked.id)
+    assert decks.draw(index, 'medium', (), ()).id != peeked.id
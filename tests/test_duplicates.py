@@ -0,0 +1,28 @@
+"""Tests for URL normalization in duplicates.py."""
+
+from duplicates import url_key
+
+
+def test_url_key_keeps_path_and_query_case():
+    assert url_key('https://example.com/Problems/Two-Sum?Lang=Py') == 'example.com/Problems/Two-Sum?Lang=Py'
+    assert url_key('https://example.com/a/B') != url_key('https://example.com/a/b')
+    assert url_key('https://example.com/p?id=A') != url_key('https://example.com/p?id=a')
+
+
+def test_url_key_folds_host_case():
+    assert url_key('https://Example.COM/Path') == url_key('http://example.com/Path')
+
+
+def test_url_key_folds_case_on_case_insensitive_hosts():
+    assert url_key('https://leetcode.com/problems/Two-Sum') == url_key('https://leetcode.com/problems/two-sum')
+
+
+def test_url_key_drops_scheme_www_tabs_and_tracking():
+    plain = url_key('http://www.LeetCode.com/problems/two-sum')
+    assert plain == 'leetcode.com/problems/two-sum'
+    assert url_key('https://leetcode.com/problems/two-sum/description/?envType=study-plan&utm_source=x#top') == plain
+    assert url_key('https://leetcode.com/problems/two-sum/') == plain
+
+
+def test_url_key_sorts_remaining_query_params():
+    assert url_key('https://example.com/p?b=2&a=1&ref=feed') == 'example.com/p?a=1&b=2'
@@ -0,0 +1,99 @@
+"""Tests for the write-behind SQLite state store in storage.py."""
+
+import sqlite3
+
+import pytest
+
+from models import UserPrefs
+from storage import SQLiteStateStore
+
+
+class FailingConnection:
+    """Connection stand-in whose writes fail, like a locked database."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError('database is locked')
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+@pytest.fixture
+def store(tmp_path):
+    # A long interval keeps the writer thread out of the way; the tests flush by hand
+    store = SQLiteStateStore(str(tmp_path / 'state.db'), flush_interval=3600)
+    yield store
+    store._stop.set()
+
+
+def reopen(store: SQLiteStateStore) -> SQLiteStateStore:
+    store.close()
+    return SQLiteStateStore(store.path, flush_interval=3600)
+
+
+def test_flush_survives_a_reopen(store):
+    store.save_prefs(UserPrefs(1, 'easy', '09:00', 'Arrays'))
+    store.add_completed(1, 'p1')
+    store.save_recent(1, ['p1', 'p2'])
+
+    store = reopen(store)
+    state = store.load()
+    store.close()
+
+    assert state.prefs[1].difficulty == 'easy'
+    assert state.prefs[1].schedule_time == '09:00'
+    assert state.prefs[1].topic == 'Arrays'
+    assert state.completed[1] == {'p1'}
+    assert state.recent[1] == ['p1', 'p2']
+
+
+def test_failed_flush_is_requeued(store):
+    conn = store._conn
+    store.save_prefs(UserPrefs(1, 'easy', None, None))
+    store.save_prefs(UserPrefs(2, 'hard', None, None))
+    store.add_completed(1, 'p1')
+
+    store._conn = FailingConnection(conn)
+    with pytest.raises(sqlite3.OperationalError):
+        store.flush()
+    assert set(store._prefs) == {1, 2}
+    assert store._completed == [(1, 'p1')]
+
+    # Changes queued after the failure are newer than the requeued batch
+    store.save_prefs(UserPrefs(1, 'medium', None, None))
+    store._conn = conn
+    store.flush()
+
+    store = reopen(store)
+    state = store.load()
+    store.close()
+
+    assert state.prefs[1].difficulty == 'medium'
+    assert state.prefs[2].difficulty == 'hard'
+    assert state.completed[1] == {'p1'}
+
+
+def test_delete_progress_clears_rows(store):
+    store.add_completed(1, 'p1')
+    store.save_recent(1, ['p1'])
+    store.flush()
+
+    store.add_completed(1, 'p2')
+    store.delete_progress(1)
+    store.add_completed(1, 'p3')
+
+    store = reopen(store)
+    state = store.load()
+    store.close()
+
+    assert state.completed[1] == {'p3'}
+    assert 1 not in state.recent
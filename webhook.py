@@ -0,0 +1,365 @@
+"""Embedded HTTP server that receives Telegram updates via webhook."""
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import zlib
+from http import HTTPStatus
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram import Update
+from telegram.ext import Application
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+
+class UpdateQueue:
+    """Bounded queue of updates processed by a pool of workers.
+
+    Each update goes to the worker owning its chat, so one user's updates
+    are still handled in order while different users are handled
+    concurrently.
+    """
+
+    # Seconds to finish queued updates when stopping
+    DRAIN_TIMEOUT = 10
+    # Share of the total capacity queued before the instance reports not ready
+    READY_THRESHOLD = 0.9
+
+    def __init__(self, application: Application, queue_size: Optional[int] = None,
+                 workers: Optional[int] = None):
+        """Initialize the queue.
+
+        Args:
+            application: PTB application that processes updates
+            queue_size: Updates held across all workers
+            workers: Number of concurrent update workers
+        """
+        self.application = application
+        self.workers = workers or Config.WEBHOOK_WORKERS
+        queue_size = queue_size or Config.WEBHOOK_QUEUE_SIZE
+        per_worker = max(1, queue_size // self.workers)
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._tasks: List[asyncio.Task] = []
+
+        # Counters
+        self.received = 0
+        self.processed = 0
+        self.overloaded = 0  # Updates refused because the queue was full
+
+    @property
+    def capacity(self) -> int:
+        return sum(queue.maxsize for queue in self._queues)
+
+    def queued(self) -> int:
+        """Updates waiting for a worker."""
+        return sum(queue.qsize() for queue in self._queues)
+
+    def backed_up(self) -> bool:
+        """Whether the updates queued across all workers near the total capacity.
+
+        One busy chat filling its own worker queue only gets that chat's
+        updates refused; it doesn't take the whole instance out of service.
+        """
+        return self.queued() >= self.capacity * self.READY_THRESHOLD
+
+    async def start(self) -> None:
+        """Start the workers."""
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self) -> None:
+        """Finish queued updates and stop the workers."""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), self.DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queued()} queued updates on shutdown")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def parse(self, data: Dict) -> Update:
+        """Turn a raw update into an Update, raising ValueError if malformed."""
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (TypeError, KeyError) as e:
+            raise ValueError(str(e)) from e
+        if update is None:
+            raise ValueError("Empty update")
+        return update
+
+    def submit(self, data: Dict) -> bool:
+        """Queue a raw update without waiting; False when the queue is full."""
+        update = self.parse(data)
+        try:
+            self._queue_for(update).put_nowait(update)
+        except asyncio.QueueFull:
+            self.overloaded += 1
+            return False
+        self.received += 1
+        return True
+
+    async def put(self, data: Dict) -> None:
+        """Queue a raw update, waiting for room if the queue is full."""
+        update = self.parse(data)
+        await self._queue_for(update).put(update)
+        self.received += 1
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            try:
+                await self.application.process_update(update)
+            except Exception as e:
+                logger.error(f"Error processing update {update.update_id}: {e}")
+            finally:
+                self.processed += 1
+                queue.task_done()
+
+    def _queue_for(self, update: Update) -> asyncio.Queue:
+        """Pick the worker queue that owns the update's chat (or user)."""
+        if update.effective_chat:
+            key = update.effective_chat.id
+        elif update.effective_user:
+            key = update.effective_user.id
+        else:
+            key = update.update_id
+        return self._queues[zlib.crc32(str(key).encode()) % len(self._queues)]
+
+
+class WebhookServer:
+    """Minimal asyncio HTTP/1.1 server receiving Telegram webhook updates.
+
+    Updates are acknowledged as soon as they are handed to the submit
+    callable (an UpdateQueue, or the shard router in sharded mode). When it
+    refuses an update the server answers 503 and Telegram redelivers it later.
+
+    Besides the webhook path the server answers GET /healthz (process is up)
+    and GET /readyz (ready to take traffic) for systemd and load balancers.
+    """
+
+    # Largest request body accepted (Telegram updates are a few KiB)
+    MAX_BODY_BYTES = 1024 * 1024
+    # Seconds an idle keep-alive connection is held open
+    IDLE_TIMEOUT = 60
+
+    def __init__(self, submit: Callable[[Dict], bool], readiness: Callable[[], bool],
+                 path: Optional[str] = None, secret_token: Optional[str] = None,
+                 listen: Optional[str] = None, port: Optional[int] = None):
+        """Initialize the server.
+
+        Args:
+            submit: Takes a raw update; returns False when overloaded and
+                raises ValueError when the update is malformed
+            readiness: Check answering /readyz
+            path: URL path Telegram posts updates to
+            secret_token: Expected X-Telegram-Bot-Api-Secret-Token header value
+            listen: Interface to bind
+            port: Port to bind
+        """
+        self.submit = submit
+        self.readiness = readiness
+        self.path = path or Config.WEBHOOK_PATH
+        self.secret_token = secret_token if secret_token is not None else Config.WEBHOOK_SECRET_TOKEN
+        self.listen = listen or Config.WEBHOOK_LISTEN
+        self.port = port if port is not None else Config.WEBHOOK_PORT
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        # Counters
+        self.received = 0
+        self.rejected = 0  # Bad secret or malformed body
+        self.overloaded = 0  # Answered 503
+
+    def is_ready(self) -> bool:
+        """Whether the server should receive traffic."""
+        return self._server is not None and self.readiness()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'overloaded': self.overloaded,
+        }
+
+    async def start(self) -> None:
+        """Begin accepting connections."""
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        """Stop accepting connections."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _accept_update(self, headers: Dict[str, str], body: bytes) -> HTTPStatus:
+        if self.secret_token and not hmac.compare_digest(
+            headers.get(SECRET_HEADER, '').encode(), self.secret_token.encode()
+        ):
+            self.rejected += 1
+            return HTTPStatus.FORBIDDEN
+
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError("Update is not a JSON object")
+            accepted = self.submit(data)
+        except ValueError as e:
+            logger.warning(f"Rejecting malformed webhook update: {e}")
+            self.rejected += 1
+            return HTTPStatus.BAD_REQUEST
+
+        if not accepted:
+            self.overloaded += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE
+        self.received += 1
+        return HTTPStatus.OK
+
+    def _route(self, method: str, path: str, headers: Dict[str, str],
+               body: bytes) -> Tuple[HTTPStatus, Dict[str, object]]:
+        path = path.split('?', 1)[0]
+        if path == self.path:
+            if method != 'POST':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {}
+            status = self._accept_update(headers, body)
+            return status, {}
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {}
+        if path == '/healthz':
+            return HTTPStatus.OK, {'status': 'ok'}
+        if path == '/readyz':
+            ready = self.is_ready()
+            return HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE, {'ready': ready}
+        return HTTPStatus.NOT_FOUND, {}
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        """Read one request, or return None when the client closed the connection."""
+        request_line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', '0'))
+        if length > self.MAX_BODY_BYTES:
+            raise ValueError(f"Request body of {length} bytes is too large")
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ValueError as e:
+                    logger.warning(f"Rejecting webhook request: {e}")
+                    self._write_response(writer, HTTPStatus.BAD_REQUEST, {}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, payload = self._route(method, path, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: HTTPStatus,
+                        payload: Dict[str, object], keep_alive: bool) -> None:
+        body = json.dumps(payload or {'status': status.phrase}).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode() + body
+        )
+
+
+async def serve_application(application: Application, services: Sequence,
+                            on_started: Optional[Callable[[], Awaitable[None]]] = None) -> None:
+    """Run the application with the given services until SIGINT/SIGTERM.
+
+    Mirrors the lifecycle of Application.run_polling: post_init runs after
+    initialize and post_stop after stop. Services (objects with async start
+    and stop) are started in order and stopped in reverse.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    started = []
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        for service in services:
+            await service.start()
+            started.append(service)
+        if on_started:
+            await on_started()
+        await application.start()
+        await stop.wait()
+        logger.info("Received stop signal, shutting down")
+    finally:
+        for service in reversed(started):
+            await service.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, readiness: Optional[Callable[[], bool]] = None,
+                allowed_updates: Optional[Sequence[str]] = None) -> None:
+    """Serve the application over webhook using the Config settings."""
+    async def main() -> None:
+        updates = UpdateQueue(application)
+        server = WebhookServer(
+            updates.submit,
+            lambda: application.running and not updates.backed_up() and (readiness() if readiness else True)
+        )
+        url = Config.WEBHOOK_URL + Config.WEBHOOK_PATH
+
+        async def set_webhook() -> None:
+            await application.bot.set_webhook(
+                url=url,
+                secret_token=server.secret_token or None,
+                allowed_updates=allowed_updates,
+                max_connections=Config.WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"Webhook set to {url}")
+
+        await serve_application(application, [updates, server], set_webhook)
+
+    asyncio.run(main())